@@ -0,0 +1,791 @@
+#!/usr/bin/python
+"""
+Contains micro-benchmarks for the performance-sensitive parts of the World code.
+
+Each benchmark is a function named ``bench_*`` which builds whatever worlds it
+needs, times the operation in question, and prints a small table of results.
+They are meant to be run by hand when changing the code they exercise, so that
+the effect of a change on large maps can be seen directly. To run one::
+
+    python benchmarks.py navigate_to
+
+Running the module with no arguments lists the available benchmarks.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from cPickle import dumps
+from random import Random
+import world_utils as wu
+import world_paths
+import world_snapshot
+import world_state
+import world_vision
+
+
+def timed(func, *args, **kwargs):
+    """Return the result of calling ``func`` and the number of seconds it took."""
+    start = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - start
+
+
+def best_time(trials, func, *args, **kwargs):
+    """Return the fastest of ``trials`` calls to ``func``, in seconds."""
+    return min(timed(func, *args, **kwargs)[1] for _ in range(trials))
+
+
+def print_table(headers, rows):
+    """Print rows of values as a simple fixed-width table."""
+    widths = [max(len(str(h)), max([len(str(r[i])) for r in rows] + [0]))
+              for i, h in enumerate(headers)]
+    print(" | ".join("{:>{w}}".format(h, w=w) for h, w in zip(headers, widths)))
+    print("-+-".join("-" * w for w in widths))
+    for row in rows:
+        print(" | ".join("{:>{w}}".format(v, w=w) for v, w in zip(row, widths)))
+
+
+def make_walled_map(dim, wallDensity=0.2, seed=0):
+    """
+    Return an ``Agent`` at (0, 0) whose map is filled with random walls.
+
+    The corners (0, 0) and ``(dim-1, dim-1)`` are always left free so that they
+    can be used as the ends of a path.
+    """
+    rand = Random(seed)
+    agent = wu.Agent("bench", (0, 0), dim)
+    corner = (dim - 1, dim - 1)
+    for x in range(dim):
+        for y in range(dim):
+            if (x, y) in [(0, 0), corner]:
+                continue
+            if rand.random() < wallDensity:
+                agent.map.place_object(wu.WALL, (x, y))
+    return agent
+
+
+def bench_navigate_to(sizes=(10, 25, 50, 100, 250, 500), trials=3):
+    """Time ``WorldMap.navigate_to`` corner to corner on random walled maps."""
+    rows = []
+    for dim in sizes:
+        agent = make_walled_map(dim)
+        dest = (dim - 1, dim - 1)
+        path, _ = timed(agent.map.navigate_to, agent.at, dest)
+        runTrials = trials if dim <= 100 else 1
+        secs = best_time(runTrials, agent.map.navigate_to, agent.at, dest)
+        steps = len(path) - 1 if path else None
+        rows.append((dim, steps, "{:.4f}".format(secs)))
+    print_table(("dim", "steps", "seconds"), rows)
+
+
+def make_serpentine_map(dim, spacing=4):
+    """
+    Return an ``Agent`` at (0, 0) whose map is a serpentine maze.
+
+    Every ``spacing`` columns there is a wall with a single gap, alternating
+    between the bottom and the top of the map, so the path from (0, 0) to the
+    far corner winds back and forth across the whole map.
+    """
+    agent = wu.Agent("bench", (0, 0), dim)
+    for i, x in enumerate(range(spacing, dim - 1, spacing)):
+        gap = dim - 1 if i % 2 == 0 else 0
+        for y in range(dim):
+            if y != gap:
+                agent.map.place_object(wu.WALL, (x, y))
+    return agent
+
+
+def bench_replanning(sizes=(40, 80, 120), cycles=150, vision=3, seed=1):
+    """
+    Compare replanning from scratch with incremental replanning.
+
+    An agent walks through a serpentine maze towards the far corner. Each
+    cycle, one tile within ``vision`` of the agent gains or loses a wall (as
+    when the agent sees something new), then the agent asks for a new path and
+    takes one step along it. This is done once with plain A* replanning and
+    once with the map in incremental mode.
+    """
+    rows = []
+    for dim in sizes:
+        for incremental in (False, True):
+            rand = Random(seed)
+            agent = make_serpentine_map(dim)
+            agent.map.incremental = incremental
+            dest = (dim - 1, dim - 1)
+            planSecs = 0.0
+            cycle = 0
+            while agent.at != dest and cycle < cycles:
+                cycle += 1
+                x = min(max(agent.at[0] + rand.randint(-vision, vision), 0), dim - 1)
+                y = min(max(agent.at[1] + rand.randint(-vision, vision), 0), dim - 1)
+                if (x, y) in agent.map.floor:
+                    agent.map.remove_object_at(wu.WALL, (x, y))
+                elif (x, y) != agent.at:
+                    agent.map.place_object(wu.WALL, (x, y))
+                path, secs = timed(agent.map.navigate_to, agent.at, dest)
+                planSecs += secs
+                if not path:
+                    break
+                agent.move(path[1])
+            mode = "incremental" if incremental else "A*"
+            rows.append((dim, mode, cycle, "{:.2f}".format(1000 * planSecs / cycle)))
+    print_table(("dim", "mode", "cycles", "ms/cycle"), rows)
+
+
+def bench_distance_field(sizes=(50, 100, 200), goals=20, seed=2):
+    """
+    Compare ranking goals with one ``navigate_to`` call each to ranking them
+    with a single ``WorldMap.distance_field``.
+    """
+    rows = []
+    for dim in sizes:
+        agent = make_walled_map(dim)
+        rand = Random(seed)
+        dests = [(rand.randrange(dim), rand.randrange(dim)) for _ in range(goals)]
+
+        def rank_by_paths():
+            agent.map.clear_path_cache()
+            paths = [agent.map.navigate_to(agent.at, dest) for dest in dests]
+            return [len(p) - 1 if p else None for p in paths]
+
+        def rank_by_field():
+            agent.map.distanceFields = {}
+            field = agent.map.distance_field(agent.at)
+            return [field.get(dest) for dest in dests]
+
+        assert rank_by_paths() == rank_by_field()
+        pathSecs = best_time(3, rank_by_paths)
+        fieldSecs = best_time(3, rank_by_field)
+        rows.append((dim, goals, "{:.4f}".format(pathSecs), "{:.4f}".format(fieldSecs)))
+    print_table(("dim", "goals", "navigate_to", "distance_field"), rows)
+
+
+def bench_reachable(sizes=(50, 100, 200), queries=50, seed=3):
+    """
+    Compare answering reachability with ``navigate_to`` to ``reachable``.
+
+    Half of the destinations are sealed off by walls, which is the slowest
+    case for a search. The time for ``reachable`` includes building the
+    component labelling once.
+    """
+    rows = []
+    for dim in sizes:
+        agent = make_walled_map(dim, wallDensity=0.1)
+        rand = Random(seed)
+        dests = []
+        for i in range(queries):
+            dest = (rand.randrange(2, dim - 2), rand.randrange(2, dim - 2))
+            if i % 2:
+                for _, dx, dy in world_paths.MOVES:
+                    agent.map.place_object(wu.WALL, (dest[0] + dx, dest[1] + dy))
+            dests.append(dest)
+        dests = [dest for dest in dests if not agent.map.tile_blocked(dest)]
+
+        def by_search():
+            agent.map.clear_path_cache()
+            return [agent.map.navigate_to(agent.at, dest) is not None for dest in dests]
+
+        def by_components():
+            agent.map.components[False].stale = True
+            return [agent.map.reachable(agent.at, dest) for dest in dests]
+
+        assert by_search() == by_components()
+        searchSecs = best_time(3, by_search)
+        componentSecs = best_time(3, by_components)
+        rows.append((dim, len(dests), "{:.4f}".format(searchSecs), "{:.4f}".format(componentSecs)))
+    print_table(("dim", "queries", "navigate_to", "reachable"), rows)
+
+
+def bench_blast(sizes=(25, 50, 100), civiDensity=0.05, seed=4):
+    """
+    Compare counting the civilians in a bomb blast by looking around each tile
+    with reading the count from the civilian grid, over every tile of the map.
+    """
+    rows = []
+    for dim in sizes:
+        rand = Random(seed)
+        world = wu.World(dim)
+        for x in range(dim):
+            for y in range(dim):
+                if rand.random() < civiDensity:
+                    world.add_object(wu.Npc((x, y), civi=True))
+        tiles = [(x, y) for x in range(dim) for y in range(dim)]
+
+        def by_looking():
+            counts = []
+            for loc in tiles:
+                objs = world.get_objects_around(loc, world.bombRange, makeCopy=False)
+                counts.append(sum(1 for l in objs for obj in objs[l]
+                                  if obj.objType == wu.NPC and obj.civi and obj.alive))
+            return counts
+
+        def by_grid():
+            world.civilianGrid.stale = True
+            return [world.civilians_in_blast(loc) for loc in tiles]
+
+        assert by_looking() == by_grid()
+        rows.append((dim, "{:.4f}".format(best_time(3, by_looking)),
+                     "{:.4f}".format(best_time(3, by_grid))))
+    print_table(("dim", "get_objects_around", "civilians_in_blast"), rows)
+
+
+def eval_filter_objects(objects, **kwargs):
+    """The original, ``eval``-based ``filter_objects``, for comparison."""
+    filteredObjs = []
+    for obj in objects:
+        for attrib in kwargs:
+            try:
+                valid = eval("obj.{}".format(attrib)) == kwargs[attrib]
+            except AttributeError:
+                valid = False
+            if not valid:
+                break
+        if valid:
+            filteredObjs.append(obj)
+    return filteredObjs
+
+
+def bench_filter_objects(count=10000, seed=5):
+    """
+    Compare the original ``filter_objects`` with the indexed one on a world
+    holding ``count`` objects, for the queries the server and modules make.
+    """
+    rand = Random(seed)
+    dim = int((count * 2) ** 0.5) + 1
+    world = wu.World(dim)
+    tiles = [(x, y) for x in range(dim) for y in range(dim)]
+    rand.shuffle(tiles)
+    for loc in tiles[:count]:
+        roll = rand.random()
+        if roll < 0.3:
+            world.add_object(wu.Npc(loc, civi=rand.random() < 0.5, living=rand.random() < 0.8))
+        elif roll < 0.8:
+            world.add_object(wu.Wall(loc))
+        else:
+            world.add_object(wu.Door(loc))
+    objects = world.objects
+    queries = [{'civi': False, 'alive': False},
+               {'civi': True, 'alive': True},
+               {'objType': wu.NPC, 'civi': False},
+               {'objType': wu.DOOR},
+               {'passable': True}]
+    rows = []
+    for query in queries:
+        expected = eval_filter_objects(objects, **query)
+        assert sorted(map(repr, world.filter_objects(**query))) == sorted(map(repr, expected))
+        evalSecs = best_time(3, eval_filter_objects, objects, **query)
+        newSecs = best_time(3, world.filter_objects, **query)
+        firstSecs = best_time(3, lambda: next(world.iter_objects(**query), None))
+        rows.append((", ".join("{}={}".format(k, query[k]) for k in sorted(query)), len(expected),
+                     "{:.5f}".format(evalSecs), "{:.5f}".format(newSecs),
+                     "{:.5f}".format(firstSecs)))
+    print_table(("filters", "matches", "eval", "filter_objects", "first match"), rows)
+
+
+def bench_user_at(userCounts=(1, 10, 100, 200), dim=100, seed=6):
+    """
+    Time ``check_passable`` over every tile of a map as the number of users
+    on it grows, compared with finding users by looking at each one in turn.
+    """
+    rows = []
+    for count in userCounts:
+        rand = Random(seed)
+        world = wu.World(dim)
+        while len(world.users) < count:
+            loc = (rand.randrange(dim), rand.randrange(dim))
+            if not world.user_at(loc):
+                world.add_user("u{}".format(len(world.users)), loc, 2, wu.AGENT)
+        tiles = world.all_locations
+
+        def by_scanning():
+            return [any(user.at == loc for user in world.all_users) for loc in tiles]
+
+        def by_index():
+            return [world.check_passable(loc) for loc in tiles]
+
+        assert sum(by_scanning()) == count
+        rows.append((count, "{:.4f}".format(best_time(3, by_scanning)),
+                     "{:.4f}".format(best_time(3, by_index))))
+    print_table(("users", "scan users", "check_passable"), rows)
+
+
+def object_size(obj):
+    """Return the bytes used by ``obj`` itself and its ``__dict__``, if it has one."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def make_random_world(dim, density, seed):
+    """
+    Return a ``World`` where a fraction ``density`` of the tiles hold a random
+    wall, NPC, coin, door or key. Each key unlocks the last door placed.
+    """
+    rand = Random(seed)
+    world = wu.World(dim)
+    door = None
+    for x in range(dim):
+        for y in range(dim):
+            roll = rand.random()
+            if roll >= density:
+                continue
+            loc = (x, y)
+            if roll < density * 0.6:
+                world.add_object(wu.Wall(loc))
+            elif roll < density * 0.8:
+                world.add_object(wu.Npc(loc, civi=rand.random() < 0.5))
+            elif roll < density * 0.9:
+                world.add_object(wu.Coin(loc, 1))
+            elif roll < density * 0.95 or door is None:
+                door = wu.Door(loc)
+                world.add_object(door)
+            else:
+                world.add_object(wu.Key(loc, door))
+    return world
+
+
+def bench_memory(dim=500, density=0.3, seed=7):
+    """
+    Report the memory used per object, by type, on a ``dim`` x ``dim`` world
+    where a fraction ``density`` of the tiles hold a random object.
+
+    Only the objects themselves are counted (not their locations, which are
+    shared with the floor's keys), so the numbers show the cost of each
+    object's layout.
+    """
+    world = make_random_world(dim, density, seed)
+    sizes = {}
+    for obj in world.objects:
+        sizes.setdefault(obj.objType, []).append(object_size(obj))
+    rows = []
+    total = 0
+    for objType in sorted(sizes):
+        typeSizes = sizes[objType]
+        total += sum(typeSizes)
+        rows.append((objType, len(typeSizes), sum(typeSizes) / len(typeSizes),
+                     "{:.1f}".format(sum(typeSizes) / 1e6)))
+    rows.append(("total", sum(len(v) for v in sizes.values()), "",
+                 "{:.1f}".format(total / 1e6)))
+    print_table(("type", "objects", "bytes/object", "MB"), rows)
+
+
+def bench_copy(sizes=(50, 100, 200), density=0.3, seed=8):
+    """
+    Time copying a world through its ``repr`` against ``World.copy``, with and
+    without copy-on-write, and a copy-on-write copy followed by a bomb (which
+    changes a handful of tiles).
+    """
+    rows = []
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        world.add_user("a", (0, 0), 2, wu.AGENT)
+        assert repr(world.copy()) == repr(world)
+
+        def bomb_copy():
+            copied = world.copy(copyOnWrite=True)
+            copied.bombed_at((dim // 2, dim // 2))
+            return copied
+
+        assert repr(bomb_copy()) != repr(world) == repr(wu.build_World_from_str(repr(world)))
+        rows.append((dim, len(world.objects),
+                     "{:.4f}".format(best_time(3, lambda: wu.build_World_from_str(repr(world)))),
+                     "{:.4f}".format(best_time(3, world.copy)),
+                     "{:.4f}".format(best_time(3, world.copy, copyOnWrite=True)),
+                     "{:.4f}".format(best_time(3, bomb_copy))))
+    print_table(("dim", "objects", "repr round-trip", "copy", "copy-on-write",
+                 "copy-on-write + bomb"), rows)
+
+
+def bench_load(sizes=(100, 200, 300, 500), density=0.3, seed=9):
+    """
+    Time loading worlds of 3k to 75k objects from a string and from a
+    ``.dng`` file, which is read a line at a time.
+    """
+    rows = []
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        worldStr = repr(world)
+        dngFile = tempfile.NamedTemporaryFile(suffix='.dng')
+        dngFile.write(worldStr)
+        dngFile.flush()
+        assert repr(wu.build_World_from_file(dngFile.name)) == worldStr
+        rows.append((dim, len(world.objects),
+                     "{:.3f}".format(best_time(3, wu.build_World_from_str, worldStr)),
+                     "{:.3f}".format(best_time(3, wu.build_World_from_file, dngFile.name))))
+        dngFile.close()
+    print_table(("dim", "objects", "from str", "from file"), rows)
+
+
+def make_occupied_world():
+    """
+    Return a small ``World`` whose users stand on objects, which ``add_user``
+    alone wouldn't allow: an agent on a trap and an operator on a dead NPC.
+    """
+    world = wu.World(5)
+    world.add_user('a', (1, 0), 2, wu.AGENT)
+    world.add_user('o', (3, 3), 2, wu.OPERATOR)
+    world.add_object(wu.Trap((1, 0), 2))
+    world.add_object(wu.Npc((3, 3), civi=True, living=False))
+    world.add_object(wu.Wall((2, 2)))
+    return world
+
+
+def bench_snapshot(sizes=(100, 200, 300, 500), density=0.3, seed=9):
+    """
+    Compare loading worlds from ``.dng`` files with loading them from ``.dngb``
+    snapshots, and with just opening the snapshots.
+    """
+    rows = []
+    tempDir = tempfile.mkdtemp()
+    world = make_occupied_world()
+    dngbName = os.path.join(tempDir, "occupied.dngb")
+    world_snapshot.save_snapshot(world, dngbName)
+    assert repr(world_snapshot.load_snapshot(dngbName)) == repr(world)
+    with open(world_snapshot.dngb_to_dng(dngbName)) as dngFile:
+        assert dngFile.read() == repr(world)
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        dngName = os.path.join(tempDir, "bench{}.dng".format(dim))
+        with open(dngName, 'w') as dngFile:
+            dngFile.write(repr(world))
+        dngbName = world_snapshot.dng_to_dngb(dngName)
+        assert repr(world_snapshot.load_snapshot(dngbName)) == repr(world)
+
+        def open_only():
+            world_snapshot.open_snapshot(dngbName).close()
+
+        rows.append((dim, len(world.objects),
+                     "{:.1f}".format(os.path.getsize(dngName) / 1e6),
+                     "{:.1f}".format(os.path.getsize(dngbName) / 1e6),
+                     "{:.3f}".format(best_time(3, wu.build_World_from_file, dngName)),
+                     "{:.3f}".format(best_time(3, world_snapshot.load_snapshot, dngbName)),
+                     "{:.5f}".format(best_time(3, open_only))))
+    shutil.rmtree(tempDir)
+    print_table(("dim", "objects", ".dng MB", ".dngb MB", "load .dng", "load .dngb",
+                 "open .dngb"), rows)
+
+
+def bench_equality(sizes=(50, 100, 200), density=0.3, seed=10):
+    """
+    Time comparing two equal worlds by ``repr`` against comparing them by
+    fingerprint, and ``diff`` after a bomb kills an NPC in one. The bombed
+    world is either a copy, which is diffed through the change journals, or
+    loaded from a ``repr``, which is diffed through the fingerprints.
+    """
+    rows = []
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        world.add_user("a", (0, 0), 2, wu.AGENT)
+        other = world.copy()
+        assert world == other and world.fingerprint == other.fingerprint
+        target = world.get_npcs(alive=True)[0].location
+        bombed = world.copy(copyOnWrite=True)
+        bombed.bombed_at(target)
+        loaded = wu.build_World_from_str(repr(world))
+        loaded.bombed_at(target)
+        assert world != bombed and world.diff(bombed) == world.diff(loaded)
+        rows.append((dim, len(world.objects),
+                     "{:.5f}".format(best_time(3, lambda: repr(world) == repr(other))),
+                     "{:.6f}".format(best_time(3, lambda: world == other)),
+                     "{:.6f}".format(best_time(3, world.diff, bombed)),
+                     "{:.5f}".format(best_time(3, world.diff, loaded))))
+    print_table(("dim", "objects", "repr ==", "fingerprint ==", "diff (journal)",
+                 "diff (fingerprint)"), rows)
+
+
+def bench_midca_state(sizes=(25, 50, 100, 200), density=0.3, seed=11):
+    """
+    Time building a world's MIDCA state for the first time at a dimension
+    (which builds the cached tile declarations and adjacencies), again, and
+    writing it to a file without building the string.
+    """
+    rows = []
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        world.add_user("a", next(loc for loc in world.all_locations if world.loc_is_free(loc)), 2, wu.AGENT)
+        world_state.STATIC_BLOCKS.pop(dim, None)
+        stateStr, first = timed(world.midca_state_str)
+        stateFile = tempfile.TemporaryFile()
+        world.write_midca_state(stateFile)
+        stateFile.seek(0)
+        assert stateFile.read() == stateStr
+
+        def write_state():
+            stateFile.seek(0)
+            world.write_midca_state(stateFile)
+
+        rows.append((dim, stateStr.count("\n"), "{:.4f}".format(first),
+                     "{:.4f}".format(best_time(3, world.midca_state_str)),
+                     "{:.4f}".format(best_time(3, write_state))))
+        stateFile.close()
+    print_table(("dim", "lines", "first", "cached", "write to file"), rows)
+
+
+def bench_predicate_delta(sizes=(50, 100, 200), density=0.3, seed=12, ticks=20):
+    """
+    Time keeping a MIDCA state up to date over ``ticks`` ticks, in each of
+    which an agent moves and a bomb goes off, by generating the whole state
+    each tick against taking the predicate delta from a feed.
+    """
+    rows = []
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        rand = Random(seed)
+        world.add_user("a", next(loc for loc in world.all_locations if world.loc_is_free(loc)), 2, wu.AGENT)
+        feed = world.predicate_feed()
+        fullTime = deltaTime = 0.0
+        changed = 0
+        for _ in range(ticks):
+            agent = world.users["a"]
+            agent.at = world.random_loc()
+            world.user_moved(agent)
+            world.bombed_at((rand.randrange(dim), rand.randrange(dim)))
+            fullTime += timed(world.midca_state_str)[1]
+            (added, deleted), seconds = timed(feed.delta)
+            deltaTime += seconds
+            changed += len(added) + len(deleted)
+        assert feed.consistent()
+        rows.append((dim, len(world.objects), changed // ticks,
+                     "{:.5f}".format(fullTime / ticks), "{:.5f}".format(deltaTime / ticks)))
+    print_table(("dim", "objects", "changes/tick", "full state", "delta"), rows)
+
+
+def count_near_by_tile(world, loc, radius):
+    """Return the enemies and occupied tiles within ``radius`` of ``loc``, tile by tile."""
+    enemies = occupied = 0
+    for x in range(loc[0] - radius, loc[0] + radius + 1):
+        for y in range(loc[1] - radius, loc[1] + radius + 1):
+            contents = world.floor.get((x, y))
+            if contents:
+                occupied += 1
+                enemies += sum(1 for obj in contents
+                               if obj.objType == wu.NPC and obj.alive and not obj.civi)
+    return enemies, occupied
+
+
+def bench_occupancy(sizes=(50, 100, 200), density=0.3, seed=13, trials=3):
+    """
+    Time the passability of every tile, tile by tile against from the
+    occupancy grid, and counting the enemies and objects around a batch of
+    random tiles, tile by tile against from the grid.
+    """
+    rows = []
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        rand = Random(seed)
+        centres = [(rand.randrange(dim), rand.randrange(dim)) for _ in range(200)]
+        loopTime = best_time(trials, lambda: [world.check_passable(loc) for loc in world.all_locations])
+        world.passable_mask()
+        maskTime = best_time(trials, world.passable_mask)
+        oldTime = best_time(trials, lambda: [count_near_by_tile(world, loc, 3) for loc in centres])
+        newTime = best_time(trials, lambda: [(world.count_near('enemies', loc, 3),
+                                              len(world.occupied_tiles_near(loc, 3)))
+                                             for loc in centres])
+        rows.append((dim, "{:.5f}".format(loopTime), "{:.5f}".format(maskTime),
+                     "{:.5f}".format(oldTime), "{:.5f}".format(newTime)))
+    print_table(("dim", "per-tile passable", "mask", "per-tile counts", "grid counts"), rows)
+
+
+def bench_blast_preview(sizes=(50, 100, 200), density=0.3, seed=14, candidates=500):
+    """
+    Time previewing the kills and civilian casualties of bombs at a batch of
+    candidate tiles, by looking around each tile against from the occupancy
+    grid in one pass, and time setting off bombs the old way against with the
+    grid already built.
+    """
+    rows = []
+    for dim in sizes:
+        world = make_random_world(dim, density, seed)
+        rand = Random(seed)
+        centres = [(rand.randrange(dim), rand.randrange(dim)) for _ in range(candidates)]
+
+        def by_looking():
+            kills = []
+            civilians = []
+            for loc in centres:
+                objs = world.get_objects_around(loc, world.bombRange, makeCopy=False)
+                npcs = [obj for l in objs for obj in objs[l] if obj.objType == wu.NPC and obj.alive]
+                kills.append(len(npcs))
+                civilians.append(sum(1 for obj in npcs if obj.civi))
+            return kills, civilians
+
+        kills, civilians = world.blast_preview(centres)
+        assert by_looking() == (kills.tolist(), civilians.tolist())
+        lookTime = best_time(3, by_looking)
+        gridTime = best_time(3, world.blast_preview, centres)
+
+        def bomb_by_looking(world):
+            for target in centres[:50]:
+                objs = world.get_objects_around(target, world.bombRange, makeCopy=False)
+                for loc in objs:
+                    world.own_tile(loc)
+                    for obj in world.floor[loc]:
+                        if obj.objType == wu.NPC and obj.alive:
+                            obj.alive = False
+                            obj.passable = True
+                            world.tile_changed(loc)
+
+        def bomb_by_grid(world):
+            for target in centres[:50]:
+                world.bombed_at(target)
+
+        oldBombTime = timed(bomb_by_looking, world.copy())[1]
+        bombed = world.copy()
+        bombed.blast_preview(centres[:1])
+        newBombTime = timed(bomb_by_grid, bombed)[1]
+        rows.append((dim, "{:.5f}".format(lookTime), "{:.5f}".format(gridTime),
+                     "{:.5f}".format(oldBombTime), "{:.5f}".format(newBombTime)))
+    print_table(("dim", "preview by looking", "preview by grid",
+                 "50 bombs by looking", "50 bombs by grid"), rows)
+
+
+def bench_view(visions=range(1, 11), dim=100, density=0.3, seed=15, views=50):
+    """
+    Time an agent viewing the world, with the objects it sees deep-copied (as
+    ``Agent.view`` used to do) against shared until changed, at each vision.
+    """
+    world = make_random_world(dim, density, seed)
+    rand = Random(seed)
+    world.add_user("a", next(loc for loc in world.all_locations if world.loc_is_free(loc)), 1, wu.AGENT)
+    agent = world.users["a"]
+    spots = [(rand.randrange(dim), rand.randrange(dim)) for _ in range(views)]
+
+    def deep_copied():
+        for loc in spots:
+            agent.at = loc
+            viewedObjs = world.get_objects_around(agent.at, agent.vision)
+            agent.map.update_map(viewedObjs, world.all_users, agent.at, agent.vision, operator=True)
+
+    def shared():
+        for loc in spots:
+            agent.at = loc
+            agent.view(world)
+
+    rows = []
+    for vision in visions:
+        agent.vision = vision
+        seen = sum(len(world.get_objects_around(loc, vision, makeCopy=False)) for loc in spots)
+        copyTime = best_time(3, deep_copied)
+        shareTime = best_time(3, shared)
+        rows.append((vision, seen // views, "{:.6f}".format(copyTime / views),
+                     "{:.6f}".format(shareTime / views)))
+    print_table(("vision", "tiles seen", "deepcopy view", "shared view"), rows)
+
+
+def bench_vision_pass(agentCounts=(5, 20, 50), dim=100, density=0.3, seed=16, ticks=10,
+                      requests=3):
+    """
+    Time answering ``requests`` state requests from every agent in each of
+    ``ticks`` ticks, in which one agent moves, with each request viewing the
+    world afresh against through a :py:class:`~world_vision.VisionPass`.
+    """
+    rows = []
+    for agentCount in agentCounts:
+        world = make_random_world(dim, density, seed)
+        rand = Random(seed)
+        free = [loc for loc in world.all_locations if world.loc_is_free(loc)]
+        for i, loc in enumerate(rand.sample(free, agentCount)):
+            world.add_user("a{}".format(i), loc, 4, wu.OPERATOR if i % 10 == 0 else wu.AGENT)
+        agents = [world.users[name] for name in sorted(world.users)]
+        moves = [(rand.choice(agents).id, rand.choice("nsew")) for _ in range(ticks)]
+
+        def run(world, serve):
+            for userID, moveDir in moves:
+                world.move_agent(moveDir, userID)
+                for _ in range(requests):
+                    for user in world.users.values():
+                        serve(user)
+
+        fresh = world.copy()
+        freshTime = timed(run, fresh, lambda user: user.view(fresh))[1]
+        cached = world.copy()
+        vision = world_vision.VisionPass(cached)
+        passTime = timed(run, cached, vision.view)[1]
+        perTick = float(ticks * requests * agentCount)
+        rows.append((agentCount, "{:.6f}".format(freshTime / perTick),
+                     "{:.6f}".format(passTime / perTick), vision.sweeps))
+    print_table(("agents", "fresh view/request", "vision pass/request", "sweeps"), rows)
+
+
+def make_rooms_world(dim, roomSize, density, seed):
+    """
+    Return a ``World`` divided into square rooms of ``roomSize`` by walls with
+    a gap in the middle of each side, whose other tiles hold random objects
+    as in :py:func:`make_random_world`.
+    """
+    world = make_random_world(dim, density, seed)
+    for x in range(dim):
+        for y in range(dim):
+            onWall = x % roomSize == 0 or y % roomSize == 0
+            inGap = x % roomSize == roomSize // 2 or y % roomSize == roomSize // 2
+            if onWall and not inGap and world.loc_is_free((x, y)):
+                world.add_object(wu.Wall((x, y)))
+    return world
+
+
+def bench_line_of_sight(visions=(3, 6, 10), dim=100, roomSize=8, density=0.15, seed=17,
+                        views=100):
+    """
+    Compare agents viewing a world divided into rooms with square vision and
+    in line-of-sight mode, by the time per view (with the fields of view
+    cached and not) and by the number of tiles and bytes of map sent.
+    """
+    rows = []
+    for vision in visions:
+        world = make_rooms_world(dim, roomSize, density, seed)
+        rand = Random(seed)
+        free = [loc for loc in world.all_locations if world.loc_is_free(loc)]
+        spots = [rand.choice(free) for _ in range(views // 4)] * 4
+        world.add_user("a", spots[0], vision, wu.AGENT)
+        agent = world.users["a"]
+
+        def run(world):
+            sent = 0
+            for loc in spots:
+                agent.at = loc
+                agent.map = wu.WorldMap(dim, world.bombRange, agent)
+                agent.view(world)
+                sent += len(dumps(agent.map, 2))
+            return sent
+
+        squareSent, squareTime = timed(run, world)
+        world.lineOfSight = True
+        world.fieldOfView.maxFields = 0
+        _, coldTime = timed(run, world)
+        world.fieldOfView.maxFields = world_vision.MAX_FIELDS
+        losSent, warmTime = timed(run, world)
+        rows.append((vision, "{:.6f}".format(squareTime / views), "{:.6f}".format(coldTime / views),
+                     "{:.6f}".format(warmTime / views), squareSent // views, losSent // views))
+    print_table(("vision", "square view", "sight view", "cached sight view",
+                 "square bytes", "sight bytes"), rows)
+
+
+BENCHMARKS = {"navigate_to": bench_navigate_to,
+              "replanning": bench_replanning,
+              "distance_field": bench_distance_field,
+              "reachable": bench_reachable,
+              "blast": bench_blast,
+              "filter_objects": bench_filter_objects,
+              "user_at": bench_user_at,
+              "memory": bench_memory,
+              "copy": bench_copy,
+              "load": bench_load,
+              "snapshot": bench_snapshot,
+              "equality": bench_equality,
+              "midca_state": bench_midca_state,
+              "predicate_delta": bench_predicate_delta,
+              "occupancy": bench_occupancy,
+              "blast_preview": bench_blast_preview,
+              "view": bench_view,
+              "vision_pass": bench_vision_pass,
+              "line_of_sight": bench_line_of_sight}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Available benchmarks: {}".format(", ".join(sorted(BENCHMARKS))))
+    else:
+        BENCHMARKS[sys.argv[1]]()
@@ -378,14 +378,23 @@ class HandleRebellion(base.BaseModule, object):
         return goalKey
 
     def gen_alt_goals(self, oldGoal, reason, verbose):
-        """Create and return possible alternate goals to a rejected goal."""
+        """
+        Create and return possible alternate goals to a rejected goal.
+
+        Enemies the agent can't get next to are skipped before the more
+        expensive goal validity check is made.
+        """
         altGoals = []
         if reason == 'civi-in-AOE':
-            for enemy in self.agent.filter_objects(objType='NPC', civi=False, alive=True):
+            agent = self.agent
+            for enemy in agent.filter_objects(objType='NPC', civi=False, alive=True):
+                if not agent.can_reach(enemy.location, adjacent=True):
+                    self.logger.info('\tSkipped unreachable enemy {}'.format(enemy.id))
+                    continue
                 altGoal = goals.Goal(enemy.id, predicate='killed', user=oldGoal['user'])
                 if verbose >= 2:
                     print 'Generated single alt goal {} from enemy id {}'.format(altGoal, enemy.id)
-                if self.agent.valid_goal(altGoal)[0]:
+                if agent.valid_goal(altGoal)[0]:
                     altGoals.append(altGoal)
 
         altGoals.append(oldGoal)
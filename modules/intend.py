@@ -23,13 +23,19 @@ class QuickIntend(base.BaseModule, object):
         Find the goal with the shortest estimated plan.
 
         This doesn't actually form a plan for each possible goal, but uses a
-        heuristic to estimate how long the plan will be.
+        heuristic to estimate how long the plan will be. Walking distances come
+        from a single distance field around the agent, so every goal is ranked
+        by how far the agent really has to go. A goal the agent can't currently
+        walk to falls back on the straight-line estimate, but is ranked after
+        every goal it can walk to.
         """
         self.logger.info("Considering potential goals")
         state = self.mem.get(self.mem.STATE)
         if not state:
             raise Exception("No previous state")
 
+        field = state.map.distance_field(state.at)
+        unreachablePenalty = state.map.dim ** 2  # longer than any real walk
         bestScore = float("inf")  # lower scores are preferable
         bestGoal = []
         for goal in goalList:
@@ -37,9 +43,12 @@ class QuickIntend(base.BaseModule, object):
 
             if goal.kwargs['predicate'] == 'agent-at':
                 dest = goal.args[0]
-                linPath = state.map.get_path_to(state.at, dest)
-                obstacles = state.map.obstacles_in(linPath)
-                goalScore = len(linPath) + 3 * obstacles
+                if dest in field:
+                    goalScore = field[dest]
+                else:
+                    linPath = state.map.get_path_to(state.at, dest)
+                    obstacles = state.map.obstacles_in(linPath)
+                    goalScore = len(linPath) + 3 * obstacles + unreachablePenalty
             else:
                 goalScore = 5
                 # TODO: Make heuristic function for open goal and killed goal.
@@ -80,12 +80,17 @@ class RemoteObserver(base.BaseModule, object):
     Unlike the non-remote version, the world given to this module should be
     an instance of MIDCAClient, and is an intermediary. The observer does not
     have direct access to the world.
+
+    If ``incrementalPaths`` is True, the agent's map is put in incremental
+    pathfinding mode (see :py:meth:`~world_utils.WorldMap.incremental_path`),
+    so that paths are repaired rather than recomputed as the map fills in.
     """
 
-    def __init__(self, logger=logging.getLogger("dummy")):
+    def __init__(self, logger=logging.getLogger("dummy"), incrementalPaths=False):
         """Instantiate a ``RemoteObserver`` module; with a logger if desired."""
         super(RemoteObserver, self).__init__()
         self.logger = logger
+        self.incrementalPaths = incrementalPaths
 
     def init(self, world, mem):
         """Give module access to critical MIDCA information."""
@@ -103,6 +108,11 @@ class RemoteObserver(base.BaseModule, object):
 
         self.observe()
         currAgent = self.client.agent()
+        prevAgent = self.mem.get(self.mem.STATE)
+        if prevAgent is not None:
+            currAgent.map.adopt_path_cache(prevAgent.map)
+            self.logger.info("Reused path cache: {}".format(currAgent.map.path_cache_stats))
+        currAgent.map.incremental = self.incrementalPaths
         agentCopy = copy.deepcopy(currAgent)
         self.mem.add(self.mem.STATES, agentCopy)
         self.mem.set(self.mem.STATE, currAgent)
@@ -5,6 +5,7 @@ import logging
 import traceback
 from midca import base, goals, plans
 from midca.modules import _plan
+import world_paths
 
 def worldPlanValidator(state, plan):
     """
@@ -99,8 +100,10 @@ class OperatorPlanGoals(base.BaseModule, object):
         """
         Return the enemy closest to the agent given.
 
-        Distance is calculated using the Pythagorean theorem, meaning it does not
-        factor in the actual number of tiles which need to be traversed.
+        Enemies are ranked by how many steps the agent must walk to get next to
+        them, using one distance field around the agent on the operator's map.
+        Ties, and enemies the agent can't currently walk to, are ranked by
+        straight-line distance.
 
         Arguments:
 
@@ -111,16 +114,20 @@ class OperatorPlanGoals(base.BaseModule, object):
             A list of ``Npc`` objects which are potential targets.
 
         ``returns``, *Npc*:
-            The closest enemy to the given agent, as the crow flies.
+            The closest enemy to the given agent, by walking distance.
         """
         self.logger.info('Getting closest enemy to {}'.format(agt))
-        agentObj = self.client.operator().map.get_user(agt)
-        closestVal = float('inf')
+        optrMap = self.client.operator().map
+        agentObj = optrMap.get_user(agt)
+        field = optrMap.distance_field(agentObj.at)
+        closestVal = (float('inf'), float('inf'))
         closest = None
         for enemy in enemies:
             if not self.check_enemy_valid(agentObj, enemy):
                 continue
-            dist = math.sqrt((agentObj.at[0] - enemy.location[0]) ** 2 + (agentObj.at[1] - enemy.location[1]) ** 2)
+            walkDist = world_paths.adjacent_distance(field, enemy.location)
+            crowDist = math.sqrt((agentObj.at[0] - enemy.location[0]) ** 2 + (agentObj.at[1] - enemy.location[1]) ** 2)
+            dist = (walkDist, crowDist)
             if dist < closestVal:
                 closestVal = dist
                 closest = enemy
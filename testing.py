@@ -497,7 +497,8 @@ class Test(object):
 
         The function creates a list of separate``World`` objects, each of which
         will be simulated once. If a ``World`` was passed in the creation of the
-        ``Test``, it will be ``deepcopy``d the appropriate number of times. If
+        ``Test``, it will be copied (see ``World.copy``) the appropriate number
+        of times. If
         the agents and operators should be moved, each will do so. If no ``World``
         was passed in, then the appropriate number of ``World`` objects will be
         generated randomly with the parameters passed to the ``Test`` object.
@@ -568,6 +569,7 @@ class Test(object):
         assert isinstance(world, wu.World), 'run_test input must be World, is {}'.format(world)
         results = {'initWorld': None,
                    'score': None,
+                   'scoreSeries': None,
                    'eventLog': None,
                    'rebelList': None,
                    'startTime': None
@@ -11,6 +11,7 @@ import logging
 from midca import base
 from midca.modules import planning
 import world_utils
+import world_vision
 import world_operators as d_ops
 import world_methods as d_mthds
 from modules import perceive, interpret, evaluate, intend, act, plan
@@ -132,7 +133,7 @@ class WorldServer(SS.TCPServer):
             msgData = self.data[2:] if len(self.data) >= 3 else None
             if msgType == WORLD_STATE_REQ:
                 user = dng.get_user(userID)
-                user.view(dng)
+                self.server.vision.view(user)
                 pickledMap = dumps(user.map)
                 self.send_data(pickledMap)
                 self.display()
@@ -150,7 +151,8 @@ class WorldServer(SS.TCPServer):
                     else:
                         log.info('\\Failed to applied action')
                         msgs[userID] = [('Action success', userID)]
-                if self.server.score[0] == 1.0:
+                score = dng.record_score()
+                if score[0] == 1.0:
                     log.info('Shutting down server, all enemies dead')
                     self.server.record_results()
                     self.server.server_close()
@@ -238,10 +240,22 @@ class WorldServer(SS.TCPServer):
                 raise NotImplementedError('Message type {}'.format(msgType))
             return
 
-    def __init__(self, server_address, world, resultsObj, limit=None, logFile='logs/worldServer.log'):
-        """Create server class."""
+    def __init__(self, server_address, world, resultsObj, limit=None, logFile='logs/worldServer.log',
+                 eventFile=None):
+        """
+        Create server class.
+
+        If ``eventFile`` is given, the world's event log spills its events to
+        that file when its buffer fills, rather than dropping the oldest.
+        Requests for the world state are answered through a
+        :py:class:`~world_vision.VisionPass`, so what the users see is only
+        worked out again after the world changes.
+        """
         SS.TCPServer.__init__(self, server_address, WorldServer.HandlerClass, bind_and_activate=True)
         self.world = world
+        self.vision = world_vision.VisionPass(world)
+        if eventFile is not None:
+            world.events.spillFilename = eventFile
         self.queuedGoals = {}
         self.messages = {}
         self.timeLimit = limit
@@ -270,8 +284,10 @@ class WorldServer(SS.TCPServer):
     def record_results(self):
         """Record the result information of the run in the results dict."""
         self.resultsObj['score'] = self.score
-        self.resultsObj['eventLog'] = self.world.eventLog
-        print self.world.eventLog
+        self.resultsObj['scoreSeries'] = list(self.world.scoreSeries)
+        eventLog = self.world.events.text()
+        self.resultsObj['eventLog'] = eventLog
+        print eventLog
 
 
 class Client(object):
@@ -0,0 +1,173 @@
+"""
+Contains the event log kept by every ``World``.
+
+The ``World`` used to log events by appending lines of text to a string, which
+grows (and is copied) with every move of a long run. The log is now a bounded
+buffer of :py:data:`Event` records, each of which holds the tick, the user, the
+action, its target and its outcome:
+
+============  =================  =====================================
+action        target             outcome
+============  =================  =====================================
+``move``      the direction      the location moved to
+``teleport``  the location       True
+``arm``       None               the agent's new ``armed`` state
+``bomb``      the location       the number of NPCs killed
+``kill``      the bomb location  the ``repr`` of the NPC killed
+============  =================  =====================================
+
+A ``kill`` has no user, since ``World.bombed_at`` doesn't know who set off the
+bomb; it is followed by the ``bomb`` event of the agent which did.
+
+When the buffer is full, its oldest events are dropped, or, if the log has a
+spill file, the whole buffer is appended to the file and emptied. The events
+can be read back (see :py:meth:`EventLog.events`), queried by action, and
+rendered as the text the ``World`` used to keep (see :py:meth:`EventLog.text`).
+"""
+
+from ast import literal_eval
+from collections import deque, namedtuple
+from itertools import islice
+
+#: One logged event
+Event = namedtuple('Event', ['tick', 'user', 'action', 'target', 'outcome'])
+
+#: How many events a log keeps in memory by default
+MAX_EVENTS = 10000
+
+#: The actions which are logged
+MOVE = 'move'
+TELEPORT = 'teleport'
+ARM = 'arm'
+BOMB = 'bomb'
+KILL = 'kill'
+
+#: The text of each kind of event, as the ``World`` used to log it
+TEMPLATES = {MOVE: "Agent {user} moved {target} to {outcome}\n",
+             TELEPORT: "Teleported agent {user} to {target}\n",
+             ARM: "Agent {user} armed to {outcome}\n",
+             BOMB: "Agent {user} bombed {target}, killing {outcome}\n",
+             KILL: "\tBomb at {target} killed {outcome}\n"}
+
+
+def render(event):
+    """Return the line of text which describes ``event``."""
+    return TEMPLATES[event.action].format(**event._asdict())
+
+
+def event_line(event):
+    """Return the line which stores ``event`` in a spill file."""
+    return "\t".join(repr(field) for field in event) + "\n"
+
+
+def event_from_line(line):
+    """Return the ``Event`` stored in a line of a spill file."""
+    return Event(*[literal_eval(field) for field in line.rstrip("\n").split("\t")])
+
+
+def read_spill_file(filename):
+    """Yield the events stored in the spill file ``filename``, oldest first."""
+    with open(filename) as spillFile:
+        for line in spillFile:
+            yield event_from_line(line)
+
+
+class EventLog(object):
+    """
+    A bounded log of the events in a ``World``.
+
+    ``buffer`` holds the most recent events, at most ``maxEvents`` of them.
+    If ``spillFilename`` is given, a full buffer is appended to that file
+    rather than having its oldest events dropped; otherwise ``dropped`` counts
+    the events which have been dropped. The first ``spilled`` events of the
+    log are the first ``spilled`` lines of ``spilledFile``.
+
+    Instantiation::
+
+        events = EventLog([maxEvents][, spillFilename])
+    """
+
+    def __init__(self, maxEvents=MAX_EVENTS, spillFilename=None):
+        """Create an empty log."""
+        self.maxEvents = maxEvents
+        self.spillFilename = spillFilename
+        self.buffer = deque(maxlen=maxEvents)
+        self.dropped = 0
+        self.spilled = 0
+        self.spilledFile = None
+
+    def __len__(self):
+        return self.spilled + len(self.buffer)
+
+    def copy(self):
+        """
+        Return a copy of the log.
+
+        The copy reads the events spilled so far from the same file, but
+        doesn't spill any more to it, so it drops its oldest events instead.
+        """
+        new = EventLog(self.maxEvents)
+        new.buffer.extend(self.buffer)
+        new.dropped = self.dropped
+        new.spilled = self.spilled
+        new.spilledFile = self.spilledFile
+        return new
+
+    def record(self, tick, user, action, target=None, outcome=None):
+        """
+        Add an event to the log.
+
+        Arguments:
+            ``tick``, *int*:
+                The ``World``'s tick when the event happened.
+
+            ``user``, *str*:
+                The ID of the user which caused the event, or None.
+
+            ``action``, *str*:
+                What happened, e.g. :py:data:`MOVE`.
+
+            ``target``:
+                What the action was done to (see the table above).
+
+            ``outcome``:
+                What the action did (see the table above).
+        """
+        if len(self.buffer) == self.maxEvents:
+            if self.spillFilename is not None:
+                self.spill()
+            else:
+                self.dropped += 1
+        self.buffer.append(Event(tick, user, action, target, outcome))
+
+    def spill(self):
+        """
+        Append the buffered events to the spill file and empty the buffer.
+
+        The file is overwritten by the log's first spill.
+        """
+        with open(self.spillFilename, 'a' if self.spilled else 'w') as spillFile:
+            spillFile.writelines(event_line(event) for event in self.buffer)
+        self.spilledFile = self.spillFilename
+        self.spilled += len(self.buffer)
+        self.buffer.clear()
+
+    def events(self):
+        """Yield every event which hasn't been dropped, oldest first."""
+        if self.spilled:
+            for event in islice(read_spill_file(self.spilledFile), self.spilled):
+                yield event
+        for event in self.buffer:
+            yield event
+
+    def of_type(self, action):
+        """Return a list of the events whose action is ``action``."""
+        return [event for event in self.events() if event.action == action]
+
+    def by_user(self, user):
+        """Return a list of the events caused by the user with the ID ``user``."""
+        return [event for event in self.events() if event.user == user]
+
+    def text(self):
+        """Return the events rendered as text, one line each (see :py:func:`render`)."""
+        return "".join(render(event) for event in self.events())
@@ -0,0 +1,375 @@
+"""
+Contains NumPy-backed grids which summarise the contents of a ``World``.
+
+Some questions about the world are asked about many tiles at once, e.g. "where
+could an agent bomb without hurting a civilian?". Answering them by walking the
+floor dict around each tile is slow, so this module keeps the answers in arrays
+the size of the map, indexed ``[x, y]``, and updates them as tiles change.
+:py:class:`CivilianGrid` answers questions about bomb blasts, and
+:py:class:`OccupancyGrid` holds layers of what is on each tile (walls, doors,
+NPCs, obstacles) for masks and counts over whole regions of the map.
+
+Both grids are among the indexes a ``World`` keeps up to date as it changes
+(see :py:meth:`~world_utils.World.tile_changed`).
+"""
+
+import numpy as np
+from world_types import NPC, WALL, DOOR, KEY, COIN
+
+#: The layers of an :py:class:`OccupancyGrid`, and their types
+LAYERS = (('objects', np.int16), ('walls', np.bool_), ('doors', np.bool_),
+          ('civilians', np.int16), ('enemies', np.int16), ('occupied', np.bool_),
+          ('blocked', np.bool_), ('blockedOpen', np.bool_), ('opaque', np.bool_))
+
+
+def living_civilians(contents):
+    """Return the number of living civilians in a list of objects."""
+    count = 0
+    for obj in contents:
+        if obj.objType == NPC and obj.civi and obj.alive:
+            count += 1
+    return count
+
+
+def summed_area(counts):
+    """
+    Return the summed-area table (2D prefix sums) of ``counts``.
+
+    Entry ``[i, j]`` of the table is the sum of ``counts[:i, :j]``, so the
+    table has one more row and column than ``counts``.
+    """
+    dim = counts.shape[0]
+    table = np.zeros((dim + 1, dim + 1), dtype=counts.dtype)
+    table[1:, 1:] = counts.cumsum(0).cumsum(1)
+    return table
+
+
+def box_sums(counts, radius):
+    """
+    Return the sum of ``counts`` in the square of ``radius`` around every tile.
+
+    The sums are read from a summed-area table (2D prefix sums) of ``counts``,
+    so the cost doesn't depend on ``radius``. Squares are clipped to the map.
+
+    Arguments:
+        ``counts``, *numpy.ndarray*:
+            A square array of per-tile counts.
+
+        ``radius``, *int*:
+            How far the square extends from its centre in each direction.
+
+        ``return``, *numpy.ndarray*:
+            An array the same shape as ``counts``, where each entry is the sum
+            of the counts within ``radius`` (in both x and y) of that tile.
+    """
+    dim = counts.shape[0]
+    table = summed_area(counts)
+    idx = np.arange(dim)
+    low = np.clip(idx - radius, 0, dim)
+    high = np.clip(idx + radius + 1, 0, dim)
+    return (table[np.ix_(high, high)] - table[np.ix_(low, high)]
+            - table[np.ix_(high, low)] + table[np.ix_(low, low)])
+
+
+def window_sums(counts, centres, radius):
+    """
+    Return the sum of ``counts`` in the square of ``radius`` around each of ``centres``.
+
+    This is :py:func:`box_sums` for a list of tiles rather than for every
+    tile: the summed-area table is built once and each sum is four lookups
+    into it, all done as array operations.
+
+    Arguments:
+        ``counts``, *numpy.ndarray*:
+            A square array of per-tile counts.
+
+        ``centres``, *list*:
+            The tiles to sum around, as ``(x, y)`` tuples on the map.
+
+        ``radius``, *int*:
+            How far each square extends from its centre in each direction.
+
+        ``return``, *numpy.ndarray*:
+            A 1D array of the sums, in the order of ``centres``.
+    """
+    dim = counts.shape[0]
+    if not len(centres):
+        return np.zeros(0, dtype=counts.dtype)
+    table = summed_area(counts)
+    xs, ys = np.asarray(centres).T
+    lowX = np.clip(xs - radius, 0, dim)
+    highX = np.clip(xs + radius + 1, 0, dim)
+    lowY = np.clip(ys - radius, 0, dim)
+    highY = np.clip(ys + radius + 1, 0, dim)
+    return table[highX, highY] - table[lowX, highY] - table[highX, lowY] + table[lowX, lowY]
+
+
+class CivilianGrid(object):
+    """
+    Counts of the living civilians which a bomb on each tile would kill.
+
+    ``counts`` holds the number of living civilians on each tile, ``blast`` the
+    number within ``bombRange`` of each tile (i.e. inside the blast of a bomb
+    set off there), and ``safe`` is a boolean mask of the tiles where ``blast``
+    is zero. When the number of civilians on a tile changes (one is placed or
+    removed, or dies in a blast), only the square of tiles whose blast covers
+    it is updated.
+
+    Instantiation::
+
+        grid = CivilianGrid(dim, bombRange)
+    """
+
+    def __init__(self, dim, bombRange):
+        """Create an (as yet unbuilt) grid for a ``dim`` x ``dim`` world."""
+        self.dim = dim
+        self.bombRange = bombRange
+        self.counts = None
+        self.blast = None
+        self.safe = None
+        self.stale = True
+
+    def __getstate__(self):
+        return {'dim': self.dim, 'bombRange': self.bombRange, 'counts': None,
+                'blast': None, 'safe': None, 'stale': True}
+
+    def rebuild(self, floor):
+        """Count the civilians on every tile of ``floor`` from scratch."""
+        self.counts = np.zeros((self.dim, self.dim), dtype=np.int32)
+        for loc, contents in floor.items():
+            self.counts[loc] = living_civilians(contents)
+        self.blast = box_sums(self.counts, self.bombRange)
+        self.safe = self.blast == 0
+        self.stale = False
+
+    def blast_area(self, loc):
+        """Return the slices of the grid covered by a bomb at ``loc``."""
+        x, y = loc
+        r = self.bombRange
+        return slice(max(x - r, 0), x + r + 1), slice(max(y - r, 0), y + r + 1)
+
+    def tile_changed(self, loc, contents):
+        """
+        Update the grid after the contents of ``loc`` changed.
+
+        Arguments:
+            ``loc``, *tuple*:
+                The tile which changed.
+
+            ``contents``, *list*:
+                The objects now on ``loc``.
+        """
+        if self.stale:
+            return
+        delta = living_civilians(contents) - self.counts[loc]
+        if not delta:
+            return
+        self.counts[loc] += delta
+        # The tiles whose blast covers loc are the ones within range of it
+        area = self.blast_area(loc)
+        self.blast[area] += delta
+        self.safe[area] = self.blast[area] == 0
+
+    def civilians_in_blast(self, floor, loc):
+        """Return the number of living civilians a bomb at ``loc`` would kill."""
+        if self.stale:
+            self.rebuild(floor)
+        return int(self.blast[loc])
+
+    def safe_tiles(self, floor):
+        """Return the mask of tiles where a bomb wouldn't kill a civilian."""
+        if self.stale:
+            self.rebuild(floor)
+        return self.safe
+
+
+def tile_layers(contents):
+    """
+    Return the value of each layer of an :py:class:`OccupancyGrid` for a tile.
+
+    The values are returned in the order of :py:data:`LAYERS`: the number of
+    objects, whether there is a wall, whether there is a locked door, the
+    numbers of living civilians and enemies, whether there is an object other
+    than a key or coin (see ``World.loc_is_free``), and whether something
+    impassable is there with the doors closed and with them open (see
+    ``World.tile_blocked``), and whether the tile blocks line of sight (it
+    holds a wall or a closed door).
+    """
+    walls = doors = occupied = blocked = blockedOpen = opaque = False
+    civilians = enemies = 0
+    for obj in contents:
+        objType = obj.objType
+        if objType == WALL:
+            walls = opaque = True
+        elif objType == DOOR:
+            doors = doors or obj.locked
+            opaque = opaque or not obj.passable
+        elif objType == NPC and obj.alive:
+            if obj.civi:
+                civilians += 1
+            else:
+                enemies += 1
+        if objType != KEY and objType != COIN:
+            occupied = True
+        if not obj.passable and not blocked:
+            # As in World.tile_blocked, the first impassable object decides
+            blocked = True
+            blockedOpen = objType != DOOR
+    return (len(contents), walls, doors, civilians, enemies, occupied, blocked, blockedOpen,
+            opaque)
+
+
+class OccupancyGrid(object):
+    """
+    Dense arrays describing what is on every tile of a ``World``.
+
+    The grid has one ``dim`` x ``dim`` array, indexed ``[x, y]``, for each of
+    the layers in :py:data:`LAYERS` (see :py:func:`tile_layers`), held as
+    attributes of the same names. Questions about whole regions of the map,
+    such as "which tiles can be walked on?" or "which tiles in this window hold
+    objects?", are then answered with array operations rather than
+    by walking the floor dict tile by tile.
+
+    Users aren't part of the grid, since a user can be shared by several maps
+    and moved without them all being told. The few tiles with users on them
+    are instead marked when a mask which depends on them is made (see
+    :py:meth:`passable`).
+
+    ``sightVersion`` counts the changes to the ``opaque`` layer (and the
+    rebuilds of the grid), so that fields of view worked out from it can be
+    cached until it changes (see :py:class:`~world_vision.FieldOfView`).
+
+    Instantiation::
+
+        grid = OccupancyGrid(dim)
+    """
+
+    def __init__(self, dim):
+        """Create an (as yet unbuilt) grid for a ``dim`` x ``dim`` world."""
+        self.dim = dim
+        for name, _ in LAYERS:
+            setattr(self, name, None)
+        self.sightVersion = 0
+        self.stale = True
+
+    def __getstate__(self):
+        state = {'dim': self.dim, 'sightVersion': 0, 'stale': True}
+        for name, _ in LAYERS:
+            state[name] = None
+        return state
+
+    def rebuild(self, floor):
+        """Fill in every layer from ``floor`` from scratch."""
+        layers = [np.zeros((self.dim, self.dim), dtype=dtype) for _, dtype in LAYERS]
+        for loc, contents in floor.items():
+            for layer, value in zip(layers, tile_layers(contents)):
+                layer[loc] = value
+        for (name, _), layer in zip(LAYERS, layers):
+            setattr(self, name, layer)
+        self.sightVersion += 1
+        self.stale = False
+
+    def tile_changed(self, loc, contents):
+        """
+        Update the grid after the contents of ``loc`` changed.
+
+        Arguments:
+            ``loc``, *tuple*:
+                The tile which changed.
+
+            ``contents``, *list*:
+                The objects now on ``loc``.
+        """
+        if self.stale:
+            return
+        values = tile_layers(contents)
+        if values[-1] != self.opaque[loc]:
+            self.sightVersion += 1
+        for (name, _), value in zip(LAYERS, values):
+            getattr(self, name)[loc] = value
+
+    def layers(self, floor):
+        """Return the grid itself, after building it if it is stale."""
+        if self.stale:
+            self.rebuild(floor)
+        return self
+
+    def window(self, loc, radius):
+        """Return the slices of the grid within ``radius`` of ``loc``, clipped to the map."""
+        x, y = loc
+        return (slice(max(x - radius, 0), min(x + radius + 1, self.dim)),
+                slice(max(y - radius, 0), min(y + radius + 1, self.dim)))
+
+    def passable(self, floor, userTiles, doorsOpen=False):
+        """
+        Return a mask of the passable tiles, as ``World.check_passable`` sees them.
+
+        Arguments:
+            ``floor``, *dict*:
+                The floor the grid describes.
+
+            ``userTiles``, *iterable*:
+                The tiles with users on them, which are always passable.
+
+            ``doorsOpen``, *bool*:
+                If True, doors are not treated as obstacles.
+
+            ``return``, *numpy.ndarray*:
+                A new ``dim`` x ``dim`` boolean array.
+        """
+        self.layers(floor)
+        mask = ~(self.blockedOpen if doorsOpen else self.blocked)
+        for loc in userTiles:
+            mask[loc] = True
+        return mask
+
+    def tiles_in(self, floor, layer, loc, radius):
+        """Return a list of the tiles within ``radius`` of ``loc`` where ``layer`` is non-zero."""
+        self.layers(floor)
+        xs, ys = self.window(loc, radius)
+        found = np.nonzero(getattr(self, layer)[xs, ys])
+        return zip((found[0] + xs.start).tolist(), (found[1] + ys.start).tolist())
+
+    def occupied_tiles(self, floor, loc, radius):
+        """Return a list of the tiles within ``radius`` of ``loc`` which hold objects."""
+        return self.tiles_in(floor, 'objects', loc, radius)
+
+    def npc_tiles(self, floor, loc, radius):
+        """Return a list of the tiles within ``radius`` of ``loc`` with living NPCs on them."""
+        self.layers(floor)
+        xs, ys = self.window(loc, radius)
+        found = np.nonzero(self.civilians[xs, ys] + self.enemies[xs, ys])
+        return zip((found[0] + xs.start).tolist(), (found[1] + ys.start).tolist())
+
+    def count_in(self, floor, layer, loc, radius):
+        """Return the sum of ``layer`` (e.g. ``'enemies'``) within ``radius`` of ``loc``."""
+        self.layers(floor)
+        return int(getattr(self, layer)[self.window(loc, radius)].sum())
+
+    def blast_counts(self, floor, radius, centres=None):
+        """
+        Return how many NPCs, and how many civilians, bombs would kill.
+
+        Arguments:
+            ``floor``, *dict*:
+                The floor the grid describes.
+
+            ``radius``, *int*:
+                The range of a bomb.
+
+            ``centres``, *list*:
+                The tiles to consider setting a bomb off on, or None for every
+                tile of the map.
+
+            ``return``, *tuple*:
+                A pair of arrays, ``(kills, civilians)``, of the number of
+                living NPCs and of living civilians within ``radius`` of each
+                centre: 1D arrays in the order of ``centres``, or ``dim`` x
+                ``dim`` arrays indexed ``[x, y]`` if ``centres`` is None.
+        """
+        self.layers(floor)
+        civilians = self.civilians.astype(np.int32)
+        npcs = civilians + self.enemies
+        if centres is None:
+            return box_sums(npcs, radius), box_sums(civilians, radius)
+        return window_sums(npcs, centres, radius), window_sums(civilians, centres, radius)
@@ -0,0 +1,167 @@
+"""
+Contains the Zobrist-style fingerprint kept by every ``World``.
+
+Two ``World`` objects are equal when their ``repr`` strings are, but building
+and comparing those strings takes time proportional to the size of the world.
+Instead, each ``World`` keeps a 64-bit fingerprint: every object and user gets
+a pseudo-random 64-bit key derived from its ``repr``, and the fingerprint is
+the XOR of all of the keys. Because XOR is its own inverse, a change to a tile
+only needs the keys of the tile's old and new contents, so the fingerprint is
+kept up to date in constant time per change, and worlds (or plans, or cached
+results keyed on a world's state) can be compared by fingerprint in O(1).
+
+The fingerprint also keeps the XOR of each tile's keys, so two worlds can be
+compared tile by tile without looking at the tiles whose keys agree (see
+:py:meth:`~world_utils.World.diff`).
+
+The fingerprint is one of the indexes a ``World`` keeps up to date as it
+changes (see :py:meth:`~world_utils.World.tile_changed`).
+"""
+
+from world_types import KEY
+
+#: Keys are reduced to this many bits
+MASK = (1 << 64) - 1
+
+
+def mix64(value):
+    """
+    Scramble an integer into a 64-bit key.
+
+    This is the finalizer of the SplitMix64 generator, which turns similar
+    inputs (such as the hashes of similar strings) into keys whose bits are
+    uncorrelated, so that XORing keys together rarely cancels out by chance.
+    """
+    z = (value + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+def object_state(obj):
+    """
+    Return a hashable summary of everything ``repr(obj)`` shows about ``obj``.
+
+    This is the ``repr`` itself, except for keys: a key's ``repr`` includes
+    the ``repr`` of the door or chest it unlocks, which changes when that is
+    unlocked, without the key's tile changing. A key's state therefore refers
+    to what it unlocks by serial, and the state of the door or chest is
+    covered by its own key in the fingerprint.
+    """
+    if obj.objType == KEY and obj.unlocks is not None:
+        return (obj.serial, obj.location, obj.taken, obj.unlocks.serial)
+    return repr(obj)
+
+
+def object_key(obj):
+    """Return the 64-bit key of an object in its current state."""
+    return mix64(hash(object_state(obj)))
+
+
+def user_key(user):
+    """Return the 64-bit key of a user at its current location."""
+    return mix64(hash(('user', repr(user))))
+
+
+def tile_key(contents):
+    """Return the XOR of the keys of a list of objects (0 if it is empty)."""
+    key = 0
+    for obj in contents:
+        key ^= object_key(obj)
+    return key
+
+
+class ZobristHash(object):
+    """
+    The fingerprint of the objects and users in a ``World``.
+
+    ``tiles`` maps each non-empty tile to the XOR of the keys of the objects on
+    it, ``users`` maps each user's ID to the location it was keyed at and its
+    key, and ``value`` is the XOR of all of the keys, which is the fingerprint.
+
+    A user can be shared by several maps (an agent's map holds the users it
+    has seen), and only the ``World`` which moved it is told, so before the
+    fingerprint is returned, any user which isn't where it was keyed is keyed
+    again. There are only ever a few users, so this check is cheap.
+
+    Instantiation::
+
+        zobrist = ZobristHash()
+    """
+
+    def __init__(self):
+        """Create an (as yet unbuilt) fingerprint."""
+        self.tiles = {}
+        self.users = {}
+        self.value = 0
+        self.stale = True
+
+    def __getstate__(self):
+        return {'tiles': {}, 'users': {}, 'value': 0, 'stale': True}
+
+    def rebuild(self, floor, users):
+        """Work out the keys of every tile on ``floor`` and every user from scratch."""
+        self.tiles = {}
+        self.users = {}
+        self.value = 0
+        for loc, contents in floor.items():
+            key = tile_key(contents)
+            if key:
+                self.tiles[loc] = key
+                self.value ^= key
+        self.stale = False
+        for user in users.values():
+            self.user_moved(user)
+
+    def tile_changed(self, loc, contents):
+        """
+        Update the fingerprint after the contents of ``loc`` changed.
+
+        Arguments:
+            ``loc``, *tuple*:
+                The tile which changed.
+
+            ``contents``, *list*:
+                The objects now on ``loc``.
+        """
+        if self.stale:
+            return
+        key = tile_key(contents)
+        oldKey = self.tiles.pop(loc, 0)
+        if key:
+            self.tiles[loc] = key
+        self.value ^= oldKey ^ key
+
+    def user_moved(self, user):
+        """Update the fingerprint after ``user`` was added or moved."""
+        if self.stale:
+            return
+        key = user_key(user)
+        oldKey = self.users.get(user.id, (None, 0))[1]
+        self.users[user.id] = (user.at, key)
+        self.value ^= oldKey ^ key
+
+    def sync_users(self, users):
+        """Key again any of ``users`` which moved, or was removed, unnoticed."""
+        for user in users.values():
+            entry = self.users.get(user.id)
+            if entry is None or entry[0] != user.at:
+                self.user_moved(user)
+        if len(self.users) != len(users):
+            for userID in list(self.users):
+                if userID not in users:
+                    self.value ^= self.users.pop(userID)[1]
+
+    def fingerprint(self, floor, users):
+        """Return the fingerprint of ``floor`` and ``users``."""
+        if self.stale:
+            self.rebuild(floor, users)
+        else:
+            self.sync_users(users)
+        return self.value
+
+    def tile_keys(self, floor, users):
+        """Return the dict of tile keys for ``floor`` (see the class description)."""
+        if self.stale:
+            self.rebuild(floor, users)
+        return self.tiles
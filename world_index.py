@@ -0,0 +1,261 @@
+"""
+Contains the object index kept by every ``World``.
+
+The objects in a ``World`` live in its floor dict, keyed by location, which is
+the right shape for "what is on this tile?" but the wrong one for questions
+like "which enemies are still alive?" or "which object has this ID?". This
+module indexes the objects by type, by ID and (for NPCs) by civilian and living
+status, so those questions don't need a scan of the whole floor.
+
+The index is one of those a ``World`` keeps up to date as it changes (see
+:py:meth:`~world_utils.World.tile_changed`).
+"""
+
+from operator import attrgetter
+from world_types import NPC
+
+
+def npc_status(obj):
+    """Return the ``(civi, alive)`` pair of an NPC, or None for other objects."""
+    if obj.objType != NPC:
+        return None
+    return (obj.civi, obj.alive)
+
+
+def compile_filter(filters):
+    """
+    Turn a dict of attribute filters into a predicate on objects.
+
+    The predicate is true for an object iff, for every ``attrib: value`` pair
+    in ``filters``, the object has the attribute ``attrib`` and it equals
+    ``value``. All of the attributes are fetched by one ``attrgetter`` and
+    compared in one go, so building the predicate is the only per-query cost.
+
+    Arguments:
+        ``filters``, *dict*:
+            The attribute names and the values they must have.
+
+        ``return``, *function*:
+            A function which takes an object and returns a bool.
+    """
+    if not filters:
+        return lambda obj: True
+    names = tuple(filters)
+    getter = attrgetter(*names)
+    if len(names) == 1:
+        wanted = filters[names[0]]
+    else:
+        wanted = tuple(filters[name] for name in names)
+
+    def predicate(obj):
+        try:
+            return getter(obj) == wanted
+        except AttributeError:
+            return False
+    return predicate
+
+
+class ObjectIndex(object):
+    """
+    The objects on a floor, indexed by type, by ID, by ``repr`` and by status.
+
+    Objects are stored by identity. Their IDs don't change, but their ``repr``
+    and status do, e.g. when an NPC dies, so for each tile the index remembers
+    which objects it last saw there and under which keys. When a tile changes,
+    its old entries are removed before its current contents are added again.
+
+    An ID belongs to one object and the copies of it, and no more than one
+    copy should be on a floor, but ``byID`` and ``byRepr`` map to dicts of
+    objects like the other indexes so that a stray copy can't corrupt them.
+
+    Instantiation::
+
+        index = ObjectIndex()
+    """
+
+    def __init__(self):
+        """Create an (as yet unbuilt) index."""
+        self.tiles = {}
+        self.byType = {}
+        self.byID = {}
+        self.byRepr = {}
+        self.byStatus = {}
+        self.stale = True
+
+    def __getstate__(self):
+        return {'tiles': {}, 'byType': {}, 'byID': {}, 'byRepr': {},
+                'byStatus': {}, 'stale': True}
+
+    def rebuild(self, floor):
+        """Index every object on ``floor`` from scratch."""
+        self.tiles = {}
+        self.byType = {}
+        self.byID = {}
+        self.byRepr = {}
+        self.byStatus = {}
+        self.stale = False
+        for loc in floor:
+            self.add_tile(loc, floor[loc])
+
+    def add_tile(self, loc, contents):
+        """Index the objects in ``contents``, which are on ``loc``."""
+        entries = []
+        for obj in contents:
+            key = id(obj)
+            objRepr = repr(obj)
+            objID = obj.id
+            status = npc_status(obj)
+            self.byType.setdefault(obj.objType, {})[key] = obj
+            self.byID.setdefault(objID, {})[key] = obj
+            self.byRepr.setdefault(objRepr, {})[key] = obj
+            if status is not None:
+                self.byStatus.setdefault(status, {})[key] = obj
+            entries.append((obj, objRepr, objID, status))
+        if entries:
+            self.tiles[loc] = entries
+
+    def remove_tile(self, loc):
+        """Remove the objects last seen on ``loc`` from the index."""
+        for obj, objRepr, objID, status in self.tiles.pop(loc, []):
+            key = id(obj)
+            self.discard(self.byType, obj.objType, key)
+            self.discard(self.byID, objID, key)
+            self.discard(self.byRepr, objRepr, key)
+            if status is not None:
+                self.discard(self.byStatus, status, key)
+
+    def discard(self, index, indexKey, key):
+        """Remove ``key`` from the bucket ``index[indexKey]``, dropping it if empty."""
+        bucket = index[indexKey]
+        del bucket[key]
+        if not bucket:
+            del index[indexKey]
+
+    def tile_changed(self, loc, contents):
+        """
+        Update the index after the contents of ``loc`` changed.
+
+        Arguments:
+            ``loc``, *tuple*:
+                The tile which changed.
+
+            ``contents``, *list*:
+                The objects now on ``loc``.
+        """
+        if self.stale:
+            return
+        self.remove_tile(loc)
+        self.add_tile(loc, contents)
+
+    def objects(self, floor):
+        """Return a list of every object on ``floor``."""
+        if self.stale:
+            self.rebuild(floor)
+        objects = []
+        for bucket in self.byType.values():
+            objects.extend(bucket.values())
+        return objects
+
+    def of_type(self, floor, objType):
+        """Return a list of the objects of type ``objType`` on ``floor``."""
+        if self.stale:
+            self.rebuild(floor)
+        return self.byType.get(objType, {}).values()
+
+    def with_id(self, floor, objID):
+        """Return an object with the ID ``objID``, or None if there isn't one."""
+        if self.stale:
+            self.rebuild(floor)
+        for obj in self.byID.get(objID, {}).values():
+            return obj
+        return None
+
+    def with_repr(self, floor, objRepr):
+        """Return an object whose ``repr`` is ``objRepr``, or None."""
+        if self.stale:
+            self.rebuild(floor)
+        for obj in self.byRepr.get(objRepr, {}).values():
+            return obj
+        return None
+
+    def query(self, floor, filters):
+        """
+        Yield the objects on ``floor`` whose attributes match ``filters``.
+
+        The candidates are taken from the narrowest index which applies:
+        filters on ``civi`` or ``alive`` (which only NPCs have) use the status
+        index, and otherwise a filter on ``objType`` uses the type index. Any
+        filters not answered by the index are checked with a predicate from
+        :py:func:`compile_filter`.
+
+        Arguments:
+            ``floor``, *dict*:
+                The floor being indexed.
+
+            ``filters``, *dict*:
+                The attribute names and the values they must have.
+
+            ``return``, *generator*:
+                The matching objects, produced lazily.
+        """
+        remaining = dict(filters)
+        status = {}
+        for attrib in ('civi', 'alive'):
+            if remaining.get(attrib) is not None:
+                status[attrib] = remaining.pop(attrib)
+        if status:
+            candidates = self.npcs(floor, status.get('civi'), status.get('alive'))
+        elif 'objType' in remaining:
+            candidates = self.of_type(floor, remaining.pop('objType'))
+        else:
+            candidates = self.objects(floor)
+        predicate = compile_filter(remaining)
+        for obj in candidates:
+            if predicate(obj):
+                yield obj
+
+    def count_npcs(self, floor, civi=None, alive=None):
+        """
+        Return the number of NPCs on ``floor`` with the given status.
+
+        This takes the same arguments as :py:meth:`npcs`, but only adds up the
+        sizes of (at most four) status buckets, so it takes constant time.
+        """
+        if self.stale:
+            self.rebuild(floor)
+        count = 0
+        for status, bucket in self.byStatus.items():
+            if civi is not None and status[0] != civi:
+                continue
+            if alive is not None and status[1] != alive:
+                continue
+            count += len(bucket)
+        return count
+
+    def npcs(self, floor, civi=None, alive=None):
+        """
+        Return a list of the NPCs on ``floor`` with the given status.
+
+        Arguments:
+            ``floor``, *dict*:
+                The floor being indexed.
+
+            ``civi``, *bool*:
+                If given, only civilians (True) or only enemies (False).
+
+            ``alive``, *bool*:
+                If given, only living (True) or only dead (False) NPCs.
+
+            ``return``, *list*:
+                The matching ``Npc`` objects.
+        """
+        if self.stale:
+            self.rebuild(floor)
+        npcs = []
+        for status, bucket in self.byStatus.items():
+            if civi is not None and status[0] != civi:
+                continue
+            if alive is not None and status[1] != alive:
+                continue
+            npcs.extend(bucket.values())
+        return npcs
@@ -0,0 +1,167 @@
+"""
+Contains the change journal kept by every ``World``.
+
+Comparing two worlds, or working out what an agent saw change since its last
+observation, used to mean looking at every tile. The journal instead records
+each change to a tile as it happens: which tile, what was on it before and
+after, the version of the ``World`` after the change and the tick (the number
+of scores recorded so far) at which it happened. ``changes_since(version)``
+then returns only the changes made after ``version``, so the cost of a diff is
+proportional to what changed rather than to the size of the world.
+
+The state of a tile is recorded as a tuple of the ``repr`` and passability of
+each of its objects (``World.unlock`` can make a door passable without
+changing its ``repr``), which doesn't change when the objects do. Every
+method which changes a tile calls :py:meth:`~world_utils.World.own_tile`
+first, which lets the journal note the tile's state before the change, and
+:py:meth:`~world_utils.World.tile_changed` afterwards, which records the
+change. A "change" which leaves the tile as it was isn't recorded.
+
+Only the last ``maxEntries`` changes are kept. A copy of a ``World`` starts
+with an empty journal which remembers that it was forked from the original's
+at the original's current version, so that a world and its copy can be
+diffed from their journals (see :py:meth:`ChangeJournal.tiles_differing`).
+"""
+
+from collections import deque, namedtuple
+from random import getrandbits
+
+#: One recorded change to a tile
+Change = namedtuple('Change', ['version', 'tile', 'before', 'after', 'tick'])
+
+#: How many changes a journal keeps by default
+MAX_ENTRIES = 10000
+
+
+def tile_state(contents):
+    """Return the state of a tile holding ``contents``, as ``(repr, passable)`` pairs."""
+    return tuple((repr(obj), obj.passable) for obj in contents)
+
+
+class ChangeJournal(object):
+    """
+    The recent changes to the tiles of a ``World``.
+
+    ``entries`` holds the last ``maxEntries`` :py:data:`Change` records, oldest
+    first, and ``version`` is the version of the last one (0 before any
+    change). ``states`` remembers the last known state of each tile which has
+    been touched, so that the "before" of a change is known. ``token``
+    identifies the journal, and ``parent`` is the ``(token, version)`` of the
+    journal it was forked from, if any. Nothing is recorded while
+    ``recording`` is False, e.g. while a ``World`` is being loaded.
+
+    Instantiation::
+
+        journal = ChangeJournal()
+    """
+
+    def __init__(self, maxEntries=MAX_ENTRIES, version=0, parent=None):
+        """Create an empty journal which starts at ``version``."""
+        self.maxEntries = maxEntries
+        self.entries = deque(maxlen=maxEntries)
+        self.version = version
+        self.states = {}
+        self.token = getrandbits(64)
+        self.parent = parent
+        self.recording = True
+
+    def __getstate__(self):
+        return self.fork().__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def fork(self):
+        """Return an empty journal for a copy of the ``World``, made now."""
+        return ChangeJournal(self.maxEntries, self.version, (self.token, self.version))
+
+    def clear(self):
+        """Forget every recorded change and tile state, keeping the version."""
+        self.entries.clear()
+        self.states = {}
+
+    def tile_touched(self, loc, contents):
+        """Note the state of ``loc``, which holds ``contents`` and is about to change."""
+        if self.recording and loc not in self.states:
+            self.states[loc] = tile_state(contents)
+
+    def tile_changed(self, loc, contents, tick):
+        """
+        Record a change to ``loc``, unless it holds what it held before.
+
+        Arguments:
+            ``loc``, *tuple*:
+                The tile which changed.
+
+            ``contents``, *list*:
+                The objects now on ``loc``.
+
+            ``tick``, *int*:
+                The ``World``'s tick at the time of the change.
+
+            ``return``, *Change*:
+                The record of the change, or None if nothing changed.
+        """
+        if not self.recording:
+            return None
+        after = tile_state(contents)
+        before = self.states.get(loc)
+        if before == after:
+            return None
+        self.states[loc] = after
+        self.version += 1
+        change = Change(self.version, loc, before, after, tick)
+        self.entries.append(change)
+        return change
+
+    @property
+    def oldest(self):
+        """Return the oldest version which :py:meth:`changes_since` can answer for."""
+        return self.version - len(self.entries)
+
+    def changes_since(self, version):
+        """
+        Return a list of the changes made after ``version``, oldest first.
+
+        Returns None if some of those changes are no longer kept, in which case
+        the caller has to compare the whole world instead.
+        """
+        if version < self.oldest:
+            return None
+        changes = []
+        for change in reversed(self.entries):
+            if change.version <= version:
+                break
+            changes.append(change)
+        changes.reverse()
+        return changes
+
+    def tiles_changed_since(self, version):
+        """Return the set of tiles changed after ``version`` (see :py:meth:`changes_since`)."""
+        changes = self.changes_since(version)
+        if changes is None:
+            return None
+        return set(change.tile for change in changes)
+
+    def tiles_differing(self, other):
+        """
+        Return a set of the tiles which may differ between two related worlds.
+
+        If one journal was forked from the other, any tile which differs
+        between the two worlds changed in one of them after the fork, so only
+        those tiles are returned. Returns None if the journals aren't related
+        in that way, or no longer go back to the fork.
+        """
+        if self is other:
+            return set()
+        if other.parent is not None and other.parent[0] == self.token:
+            fork = other.parent[1]
+        elif self.parent is not None and self.parent[0] == other.token:
+            fork = self.parent[1]
+        else:
+            return None
+        ours = self.tiles_changed_since(fork)
+        theirs = other.tiles_changed_since(fork)
+        if ours is None or theirs is None:
+            return None
+        return ours | theirs
@@ -0,0 +1,619 @@
+"""
+Contains the pathfinding code used by ``WorldMap`` objects.
+
+Agents plan every movement through :py:meth:`~world_utils.WorldMap.navigate_to`,
+so the search behind it has to stay fast even on large maps. This module holds
+that search, along with the small helpers it needs. Paths are returned in the
+same format the rest of the code expects: a string which begins with ``'o'``
+(the origin) followed by one direction character (``'n'``, ``'s'``, ``'e'`` or
+``'w'``) per step, e.g. ``'oeens'``.
+"""
+
+from collections import deque
+from heapq import heappush, heappop
+
+INF = float('inf')
+
+#: The four cardinal moves, as (direction character, x offset, y offset)
+MOVES = (('n', 0, -1),
+         ('s', 0, 1),
+         ('e', 1, 0),
+         ('w', -1, 0))
+
+
+def manhattan(loc1, loc2):
+    """Return the number of orthogonal steps between two locations."""
+    return abs(loc1[0] - loc2[0]) + abs(loc1[1] - loc2[1])
+
+
+def step(loc, moveDir):
+    """Return the location reached by moving one tile from ``loc`` in ``moveDir``."""
+    for char, dx, dy in MOVES:
+        if char == moveDir:
+            return (loc[0] + dx, loc[1] + dy)
+    raise ValueError("{} is not a valid movement direction".format(moveDir))
+
+
+def path_tiles(origin, path):
+    """
+    Return the list of tiles visited by a path string, excluding the origin.
+
+    Arguments:
+        ``origin``, *tuple*:
+            The location the path starts from.
+
+        ``path``, *str*:
+            A path as returned by :py:func:`astar_path`.
+
+        ``return``, *list*:
+            The locations stepped on by the path, in order.
+    """
+    tiles = []
+    loc = origin
+    for moveDir in path[1:]:
+        loc = step(loc, moveDir)
+        tiles.append(loc)
+    return tiles
+
+
+def astar_path(world, origin, dest, doorsOpen=False):
+    """
+    Return the shortest path from ``origin`` to ``dest`` in the given world.
+
+    This is a standard A* search over the 4-connected tile grid. The frontier is
+    a binary heap ordered by ``f = g + h``, where ``g`` is the number of steps
+    taken so far and ``h`` is the Manhattan distance to ``dest``. Since every
+    step costs one, the Manhattan distance is both admissible and consistent,
+    so a tile never needs to be expanded twice and the closed set can be a plain
+    ``set``. Ties in ``f`` are broken in favour of the tile closest to ``dest``
+    (which keeps the search moving towards the goal instead of fanning out), and
+    then in insertion order so results are deterministic.
+
+    A tile may be stepped on iff ``world.check_passable(tile, doorsOpen)`` is
+    true. The origin itself is never checked, as the agent is already standing
+    there.
+
+    Arguments:
+        ``world``, *World*:
+            The ``World`` or ``WorldMap`` to search.
+
+        ``origin``, *tuple*:
+            The location to start from.
+
+        ``dest``, *tuple*:
+            The location to reach.
+
+        ``doorsOpen``, *bool*:
+            If true, doors are not treated as obstacles.
+
+        ``return``, *str*:
+            A path string such as ``'oeens'``, or ``None`` if ``dest`` cannot
+            be reached.
+    """
+    if origin == dest:
+        return 'o'
+
+    dim = world.dim
+    destX, destY = dest
+    check_passable = world.check_passable
+
+    gScore = {origin: 0}
+    cameFrom = {}
+    closed = set()
+    counter = 0
+    frontier = [(manhattan(origin, dest), manhattan(origin, dest), counter, origin)]
+
+    while frontier:
+        _, _, _, currTile = heappop(frontier)
+        if currTile in closed:
+            continue
+        if currTile == dest:
+            return _rebuild_path(cameFrom, origin, dest)
+        closed.add(currTile)
+
+        nborG = gScore[currTile] + 1
+        currX, currY = currTile
+        for moveDir, dx, dy in MOVES:
+            nX = currX + dx
+            nY = currY + dy
+            if not (0 <= nX < dim and 0 <= nY < dim):
+                continue
+            nbor = (nX, nY)
+            if nbor in closed:
+                continue
+            if nborG >= gScore.get(nbor, nborG + 1):
+                continue
+            if not check_passable(nbor, doorsOpen):
+                closed.add(nbor)
+                continue
+            gScore[nbor] = nborG
+            cameFrom[nbor] = (currTile, moveDir)
+            h = abs(nX - destX) + abs(nY - destY)
+            counter += 1
+            heappush(frontier, (nborG + h, h, counter, nbor))
+
+    return None
+
+
+def _rebuild_path(cameFrom, origin, dest):
+    """Walk back from ``dest`` to ``origin`` and return the path string."""
+    moves = []
+    tile = dest
+    while tile != origin:
+        tile, moveDir = cameFrom[tile]
+        moves.append(moveDir)
+    moves.append('o')
+    return ''.join(reversed(moves))
+
+
+class DStarLite(object):
+    """
+    Incrementally maintained shortest paths to a single destination.
+
+    This is an implementation of D* Lite (Koenig & Likhachev, 2002) on the
+    4-connected tile grid. The search runs backwards from ``dest``, so the
+    origin of the path can move between queries, and after some tiles change
+    passability only the part of the search tree those tiles affect is
+    repaired, instead of searching again from scratch. This suits agents, which
+    keep heading for the same destination while their view of the map changes
+    a few tiles at a time.
+
+    The planner does not keep a reference to the map it plans over. Instead,
+    the map is passed to :py:meth:`path`, and the map reports passability
+    changes through :py:meth:`tile_changed`. This lets a planner outlive the
+    ``WorldMap`` it was created with, as long as every change between the old
+    map and the new one is reported.
+
+    Instantiation::
+
+        planner = DStarLite(dest, dim[, doorsOpen=bool])
+    """
+
+    def __init__(self, dest, dim, doorsOpen=False):
+        """Create a planner for paths to ``dest`` in a ``dim`` x ``dim`` world."""
+        self.dest = dest
+        self.dim = dim
+        self.doorsOpen = doorsOpen
+        self.start = None
+        self.km = 0
+        self.g = {}
+        self.rhs = {dest: 0}
+        self.queue = []
+        self.queued = {}
+        self.counter = 0
+        self.changed = set()
+        self.expansions = 0
+        self.lastPath = None
+        self.lastTiles = {}
+        self.push(dest, (0, 0))
+
+    def tile_changed(self, loc):
+        """Note that the passability of ``loc`` changed since the last query."""
+        self.changed.add(loc)
+
+    def path(self, world, start):
+        """
+        Return the shortest path from ``start`` to the planner's destination.
+
+        Arguments:
+            ``world``, *World*:
+                The ``World`` or ``WorldMap`` being planned over. Tiles are
+                passable iff ``world.check_passable(tile, doorsOpen)`` is true.
+
+            ``start``, *tuple*:
+                The location the path should start from.
+
+            ``return``, *str*:
+                A path string as returned by :py:func:`astar_path`, or ``None``
+                if there is no path.
+        """
+        if start == self.dest:
+            return 'o'
+        if self.start is None:
+            self.start = start
+        self.km += manhattan(self.start, start)
+        self.start = start
+
+        passable = self.passable_func(world)
+        changed = self.changed
+        for loc in changed:
+            for nbor in self.neighbours(loc):
+                self.update_tile(nbor, passable)
+        self.changed = set()
+        expansions = self.expansions
+        self.compute_shortest_path(passable)
+
+        # If the repair didn't touch any costs, and nothing on the remainder
+        # of the last path changed, that remainder is still a shortest path.
+        if expansions == self.expansions and start in self.lastTiles:
+            index = self.lastTiles[start]
+            if not any(self.lastTiles.get(loc, -1) > index for loc in changed):
+                return 'o' + self.lastPath[index + 1:]
+
+        self.lastPath = None
+        self.lastTiles = {}
+        if self.g.get(start, INF) == INF:
+            return None
+        moves = ['o']
+        loc = start
+        while loc != self.dest:
+            bestDir, bestLoc, bestCost = None, None, INF
+            for moveDir, dx, dy in MOVES:
+                nbor = (loc[0] + dx, loc[1] + dy)
+                if not self.in_bounds(nbor) or not passable(nbor):
+                    continue
+                cost = 1 + self.g.get(nbor, INF)
+                if cost < bestCost:
+                    bestDir, bestLoc, bestCost = moveDir, nbor, cost
+            if bestDir is None or len(moves) > self.dim * self.dim:
+                return None
+            moves.append(bestDir)
+            loc = bestLoc
+        self.lastPath = ''.join(moves)
+        self.lastTiles = dict((tile, index + 1) for index, tile
+                              in enumerate(path_tiles(start, self.lastPath)))
+        self.lastTiles[start] = 0
+        return self.lastPath
+
+    def passable_func(self, world):
+        """
+        Return a function indicating whether a tile of ``world`` is passable.
+
+        Passability can't change during a query, so the answers are memoized;
+        D* Lite asks about the same tiles many times while repairing.
+        """
+        known = {}
+        check_passable = world.check_passable
+        doorsOpen = self.doorsOpen
+
+        def passable(loc):
+            if loc not in known:
+                known[loc] = check_passable(loc, doorsOpen)
+            return known[loc]
+        return passable
+
+    def in_bounds(self, loc):
+        """Indicate whether ``loc`` is inside the world."""
+        return 0 <= loc[0] < self.dim and 0 <= loc[1] < self.dim
+
+    def neighbours(self, loc):
+        """Return the in-bounds tiles adjacent to ``loc``."""
+        x, y = loc
+        dim = self.dim
+        return [(x + dx, y + dy) for _, dx, dy in MOVES
+                if 0 <= x + dx < dim and 0 <= y + dy < dim]
+
+    def calc_key(self, loc):
+        """Return the priority of ``loc`` in the search queue."""
+        best = min(self.g.get(loc, INF), self.rhs.get(loc, INF))
+        return (best + manhattan(self.start, loc) + self.km, best)
+
+    def push(self, loc, key):
+        """Put ``loc`` on the queue with the given key, replacing any older entry."""
+        self.queued[loc] = key
+        self.counter += 1
+        heappush(self.queue, (key, self.counter, loc))
+
+    def top(self):
+        """Return the smallest live ``(key, loc)`` pair in the queue, or ``None``."""
+        while self.queue:
+            key, _, loc = self.queue[0]
+            if self.queued.get(loc) == key:
+                return key, loc
+            heappop(self.queue)
+        return None
+
+    def update_tile(self, loc, passable):
+        """Recompute the one-step lookahead cost of ``loc`` and requeue it if needed."""
+        g = self.g
+        if loc == self.dest:
+            best = 0
+        else:
+            best = INF
+            for nbor in self.neighbours(loc):
+                if passable(nbor):
+                    cost = g.get(nbor, INF) + 1
+                    if cost < best:
+                        best = cost
+            self.rhs[loc] = best
+        self.queued.pop(loc, None)
+        if g.get(loc, INF) != best:
+            self.push(loc, self.calc_key(loc))
+
+    def compute_shortest_path(self, passable):
+        """Expand tiles until the start's cost is correct and settled."""
+        start = self.start
+        while True:
+            top = self.top()
+            if top is None:
+                break
+            startKey = self.calc_key(start)
+            startG = self.g.get(start, INF)
+            if top[0] >= startKey and self.rhs.get(start, INF) == startG:
+                break
+            oldKey, loc = top
+            heappop(self.queue)
+            del self.queued[loc]
+            self.expansions += 1
+
+            newKey = self.calc_key(loc)
+            if oldKey < newKey:
+                self.push(loc, newKey)
+            elif self.g.get(loc, INF) > self.rhs.get(loc, INF):
+                self.g[loc] = self.rhs[loc]
+                for nbor in self.neighbours(loc):
+                    self.update_tile(nbor, passable)
+            else:
+                self.g[loc] = INF
+                self.update_tile(loc, passable)
+                for nbor in self.neighbours(loc):
+                    self.update_tile(nbor, passable)
+
+
+def distance_field(world, origin, doorsOpen=False):
+    """
+    Return the walking distance from ``origin`` to every tile it can reach.
+
+    This is a breadth-first search over the whole reachable area, so it costs
+    about as much as a single unlucky :py:func:`astar_path` call, but answers
+    the distance question for every tile at once. Passability is judged the
+    same way as in :py:func:`astar_path`.
+
+    Arguments:
+        ``world``, *World*:
+            The ``World`` or ``WorldMap`` to search.
+
+        ``origin``, *tuple*:
+            The location to measure distances from.
+
+        ``doorsOpen``, *bool*:
+            If true, doors are not treated as obstacles.
+
+        ``return``, *dict*:
+            A dict from each reachable location to the number of steps needed
+            to reach it. ``origin`` is included with a distance of 0.
+    """
+    dim = world.dim
+    check_passable = world.check_passable
+    field = {origin: 0}
+    frontier = deque([origin])
+    while frontier:
+        currTile = frontier.popleft()
+        nborDist = field[currTile] + 1
+        currX, currY = currTile
+        for _, dx, dy in MOVES:
+            nX = currX + dx
+            nY = currY + dy
+            if not (0 <= nX < dim and 0 <= nY < dim):
+                continue
+            nbor = (nX, nY)
+            if nbor in field:
+                continue
+            if check_passable(nbor, doorsOpen):
+                field[nbor] = nborDist
+                frontier.append(nbor)
+    return field
+
+
+def adjacent_distance(field, loc):
+    """
+    Return the distance in ``field`` to the closest tile next to ``loc``.
+
+    Targets such as NPCs and locked doors can't be stepped on, so they never
+    appear in a distance field themselves; what matters is how far away the
+    closest tile beside them is. If ``loc`` itself is in the field, its own
+    distance is returned.
+
+    Arguments:
+        ``field``, *dict*:
+            A distance field, as returned by :py:func:`distance_field`.
+
+        ``loc``, *tuple*:
+            The location of the target.
+
+        ``return``, *float*:
+            The number of steps needed to get next to (or onto) ``loc``, or
+            ``float('inf')`` if that isn't possible.
+    """
+    if loc in field:
+        return field[loc]
+    best = INF
+    for _, dx, dy in MOVES:
+        nbor = (loc[0] + dx, loc[1] + dy)
+        if nbor in field and field[nbor] + 1 < best:
+            best = field[nbor] + 1
+    return best
+
+
+#: The eight tiles around a tile, in order around the ring starting from north.
+#: Consecutive entries (including the last and the first) are orthogonal
+#: neighbours of each other, and the even entries are the orthogonal neighbours
+#: of the centre tile.
+RING = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+
+
+class Components(object):
+    """
+    Connected components of the passable tiles of a map, kept up to date.
+
+    Answering "can I get from here to there?" with a search costs as much as
+    finding the path itself, and is slowest exactly when the answer is no. This
+    class labels every passable tile with its connected component instead, so
+    that the question becomes a comparison of two labels.
+
+    The labelling is a union-find forest. When a tile becomes passable, it is
+    joined to the components of its passable neighbours, which is cheap. When a
+    tile becomes impassable, it can only split its component if its passable
+    neighbours aren't connected to each other around the ring of eight tiles
+    around it; if they are, nothing changes. Otherwise the labelling is marked
+    stale and rebuilt by a flood fill the next time it is queried.
+
+    The set of impassable tiles isn't stored here. It is passed in on every
+    call, so that a ``Components`` can be shared between maps, just like a
+    :py:class:`DStarLite` planner. The labelling is dropped when the object is
+    pickled or copied and rebuilt when first needed.
+
+    Instantiation::
+
+        components = Components(dim)
+    """
+
+    def __init__(self, dim):
+        """Create an (as yet unbuilt) labelling for a ``dim`` x ``dim`` world."""
+        self.dim = dim
+        self.node = {}
+        self.parent = []
+        self.stale = True
+        self.rebuilds = 0
+
+    def __getstate__(self):
+        return {'dim': self.dim, 'node': {}, 'parent': [], 'stale': True,
+                'rebuilds': self.rebuilds}
+
+    def in_bounds(self, loc):
+        """Indicate whether ``loc`` is on the map."""
+        return 0 <= loc[0] < self.dim and 0 <= loc[1] < self.dim
+
+    def open_neighbours(self, loc, blocked):
+        """Return the orthogonal neighbours of ``loc`` which are passable."""
+        nbors = []
+        for _, dx, dy in MOVES:
+            nbor = (loc[0] + dx, loc[1] + dy)
+            if self.in_bounds(nbor) and nbor not in blocked:
+                nbors.append(nbor)
+        return nbors
+
+    def find(self, loc):
+        """Return the root label of the component containing ``loc``."""
+        parent = self.parent
+        label = self.node[loc]
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    def union(self, loc1, loc2):
+        """Merge the components containing two tiles."""
+        root1 = self.find(loc1)
+        root2 = self.find(loc2)
+        if root1 != root2:
+            self.parent[max(root1, root2)] = min(root1, root2)
+
+    def rebuild(self, blocked):
+        """Label every passable tile from scratch with a flood fill."""
+        self.node = node = {}
+        self.parent = []
+        dim = self.dim
+        for x in range(dim):
+            for y in range(dim):
+                seed = (x, y)
+                if seed in node or seed in blocked:
+                    continue
+                label = len(self.parent)
+                self.parent.append(label)
+                node[seed] = label
+                frontier = [seed]
+                while frontier:
+                    currX, currY = frontier.pop()
+                    for _, dx, dy in MOVES:
+                        nX = currX + dx
+                        nY = currY + dy
+                        if not (0 <= nX < dim and 0 <= nY < dim):
+                            continue
+                        nbor = (nX, nY)
+                        if nbor not in node and nbor not in blocked:
+                            node[nbor] = label
+                            frontier.append(nbor)
+        self.stale = False
+        self.rebuilds += 1
+
+    def may_split(self, loc, blocked):
+        """
+        Indicate whether blocking ``loc`` might disconnect its neighbours.
+
+        This is false when all of the passable orthogonal neighbours of ``loc``
+        lie on one unbroken run of passable tiles around it, since any path
+        through ``loc`` can then go around it instead.
+        """
+        ring = [self.in_bounds((loc[0] + dx, loc[1] + dy)) and
+                (loc[0] + dx, loc[1] + dy) not in blocked for dx, dy in RING]
+        if all(ring):
+            return False
+        start = ring.index(False)
+        runs = set()
+        run = 0
+        for i in range(start + 1, start + 9):
+            idx = i % 8
+            if ring[idx] and not ring[idx - 1]:
+                run += 1
+            if ring[idx] and idx % 2 == 0:
+                runs.add(run)
+        return len(runs) > 1
+
+    def tile_changed(self, loc, blocked, blockedSet):
+        """
+        Update the labelling after the passability of ``loc`` changed.
+
+        Arguments:
+            ``loc``, *tuple*:
+                The tile which changed.
+
+            ``blocked``, *bool*:
+                Whether ``loc`` is now impassable.
+
+            ``blockedSet``, *set*:
+                Every impassable tile, including ``loc`` if ``blocked``.
+        """
+        if self.stale:
+            return
+        if blocked:
+            self.node.pop(loc, None)
+            if self.may_split(loc, blockedSet):
+                self.stale = True
+        else:
+            self.node[loc] = len(self.parent)
+            self.parent.append(len(self.parent))
+            for nbor in self.open_neighbours(loc, blockedSet):
+                self.union(loc, nbor)
+
+    def connected(self, origin, dest, blocked, adjacent=False):
+        """
+        Indicate whether there is a path from ``origin`` to ``dest``.
+
+        The origin itself doesn't need to be passable, since paths always
+        start by leaving it. This matches :py:func:`astar_path`.
+
+        Arguments:
+            ``origin``, *tuple*:
+                Where the path would start.
+
+            ``dest``, *tuple*:
+                Where the path would end.
+
+            ``blocked``, *set*:
+                Every impassable tile.
+
+            ``adjacent``, *bool*:
+                If True, it is enough to reach a tile next to ``dest``, which
+                itself may be impassable (e.g. an enemy or a locked door).
+
+            ``return``, *bool*:
+                Whether such a path exists.
+        """
+        if origin == dest or (adjacent and manhattan(origin, dest) == 1):
+            return True
+        if not self.in_bounds(dest):
+            return False
+        if adjacent:
+            ends = self.open_neighbours(dest, blocked)
+        elif dest in blocked:
+            return False
+        else:
+            ends = [dest]
+        if self.stale:
+            self.rebuild(blocked)
+        starts = set(self.find(nbor) for nbor in self.open_neighbours(origin, blocked))
+        for end in ends:
+            if self.find(end) in starts:
+                return True
+        return False
@@ -0,0 +1,328 @@
+"""
+Contains the binary ``.dngb`` snapshot format for ``World`` objects.
+
+A ``.dng`` file has to be parsed line by line before any of the world can be
+used, which dominates start-up time for large maps (and for tests which load
+the same map for every run). A ``.dngb`` snapshot holds the same information
+in fixed-width arrays which can be memory-mapped and used as they are:
+
+* a 32 byte header: the magic string ``DNGB``, the format version, the
+  dimension of the world, the number of objects and the length of the users
+  block;
+* ``tileStarts``, an array of ``dim * dim + 1`` int32s. The objects on the
+  tile ``(x, y)`` are the rows ``tileStarts[i]:tileStarts[i + 1]`` of the
+  object table, where ``i = x * dim + y``;
+* the object table, one row (of ``OBJECT_DTYPE``) per object, sorted by tile
+  and then by the order of the objects on the tile;
+* the users block, which holds the ``repr`` of each user, one per line.
+
+Opening a snapshot with :py:func:`open_snapshot` maps the file and reads only
+the header. The objects on one tile can be read without reading the rest
+(see :py:meth:`Snapshot.objects_at`), and a whole ``World`` is only built when
+:py:meth:`Snapshot.world` is called. :py:func:`dng_to_dngb` and
+:py:func:`dngb_to_dng` convert between the two formats.
+"""
+
+import mmap
+import struct
+import numpy as np
+import world_utils as wu
+
+#: The first four bytes of every ``.dngb`` file
+MAGIC = 'DNGB'
+
+#: The version of the format written by :py:func:`save_snapshot`
+VERSION = 1
+
+#: Layout of the header: magic, version, dim, object count, users block length
+HEADER = struct.Struct('<4sHxxIII12x')
+
+#: Layout of a row of the object table
+OBJECT_DTYPE = np.dtype([('serial', '<i4'),
+                         ('type', 'u1'),
+                         ('flags', 'u1'),
+                         ('x', '<u2'),
+                         ('y', '<u2'),
+                         ('value', '<i4'),
+                         ('ref', '<i4')])
+
+#: The object types, in the order of their codes in the ``type`` column
+TYPE_CODES = [wu.WALL, wu.DOOR, wu.CHEST, wu.KEY, wu.COIN, wu.FIRE, wu.TRAP, wu.NPC]
+
+#: Bits of the ``flags`` column
+LOCKED = 1
+ALIVE = 2
+HIDDEN = 4
+CIVI = 8
+
+#: The ``ref`` of an object which doesn't refer to another
+NO_REF = -1
+
+
+def object_row(obj):
+    """
+    Return the row of the object table which encodes ``obj``.
+
+    The row is a tuple of ``(serial, type, flags, x, y, value, ref)``, where
+    ``value`` is a coin's value or a fire's or trap's damage, and ``ref`` is
+    the serial of the object a chest contains or a key unlocks.
+    """
+    flags = 0
+    value = 0
+    ref = None
+    if obj.objType in (wu.DOOR, wu.CHEST):
+        flags |= LOCKED if obj.locked else 0
+    if obj.objType == wu.CHEST:
+        ref = obj.contains
+    elif obj.objType == wu.KEY:
+        ref = obj.unlocks
+    elif obj.objType == wu.COIN:
+        value = obj.value
+    elif obj.objType in (wu.FIRE, wu.TRAP):
+        value = obj.damage
+        if obj.objType == wu.TRAP and obj.hidden:
+            flags |= HIDDEN
+    elif obj.objType == wu.NPC:
+        flags |= (ALIVE if obj.alive else 0) | (CIVI if obj.civi else 0)
+    refSerial = NO_REF if ref is None else ref.serial
+    return (obj.serial, TYPE_CODES.index(obj.objType), flags,
+            obj.location[0], obj.location[1], value, refSerial)
+
+
+def object_from_row(row):
+    """
+    Return a new ``WorldObject`` made from a row of the object table.
+
+    References are not resolved here: the ``contains`` of a chest and the
+    ``unlocks`` of a key are left as None.
+    """
+    serial, typeCode, flags, x, y, value, ref = row
+    objType = TYPE_CODES[typeCode]
+    location = (x, y)
+    if objType == wu.WALL:
+        return wu.Wall(location, serial=serial)
+    elif objType == wu.DOOR:
+        return wu.Door(location, bool(flags & LOCKED), serial=serial)
+    elif objType == wu.CHEST:
+        return wu.Chest(location, locked=bool(flags & LOCKED), serial=serial)
+    elif objType == wu.KEY:
+        return wu.Key(location, serial=serial)
+    elif objType == wu.COIN:
+        return wu.Coin(location, value, serial=serial)
+    elif objType == wu.FIRE:
+        return wu.Fire(location, value, serial=serial)
+    elif objType == wu.TRAP:
+        return wu.Trap(location, value, bool(flags & HIDDEN), serial=serial)
+    return wu.Npc(location, bool(flags & CIVI), bool(flags & ALIVE), serial=serial)
+
+
+def save_snapshot(world, filename):
+    """
+    Write a ``World`` to a ``.dngb`` file.
+
+    Everything which the world's ``repr`` includes is written, so loading the
+    snapshot gives a ``World`` with the same ``repr``.
+
+    Arguments:
+        ``world``, *World*:
+            The world to save.
+
+        ``filename``, *str*:
+            The name of the file to write, including the ``.dngb``.
+    """
+    dim = world.dim
+    counts = np.zeros(dim * dim + 1, dtype='<i4')
+    rows = []
+    for loc in sorted(world.floor):
+        contents = world.floor[loc]
+        counts[loc[0] * dim + loc[1] + 1] = len(contents)
+        rows.extend(object_row(obj) for obj in contents)
+    tileStarts = counts.cumsum().astype('<i4')
+    table = np.array(rows, dtype=OBJECT_DTYPE)
+    users = "".join(repr(world.users[name]) + '\n' for name in sorted(world.users))
+
+    with open(filename, 'wb') as snapFile:
+        snapFile.write(HEADER.pack(MAGIC, VERSION, dim, len(rows), len(users)))
+        snapFile.write(tileStarts.tostring())
+        snapFile.write(table.tostring())
+        snapFile.write(users)
+
+
+class Snapshot(object):
+    """
+    A ``.dngb`` file, mapped into memory.
+
+    ``tileStarts`` and ``table`` are NumPy arrays which read straight from the
+    mapped file, so opening a snapshot costs the same whatever its size.
+    Nothing is copied until objects are asked for.
+
+    Instantiation::
+
+        snapshot = Snapshot(filename)
+    """
+
+    def __init__(self, filename):
+        """Map ``filename`` into memory and read its header."""
+        with open(filename, 'rb') as snapFile:
+            self.buffer = mmap.mmap(snapFile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, dim, count, usersLength = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("{} is not a .dngb file".format(filename))
+        if version != VERSION:
+            raise ValueError("{} has version {} of the .dngb format, not {}".format(
+                filename, version, VERSION))
+        self.dim = dim
+        offset = HEADER.size
+        self.tileStarts = np.frombuffer(self.buffer, dtype='<i4',
+                                        count=dim * dim + 1, offset=offset)
+        offset += self.tileStarts.nbytes
+        self.table = np.frombuffer(self.buffer, dtype=OBJECT_DTYPE, count=count,
+                                   offset=offset)
+        offset += self.table.nbytes
+        self.users = self.buffer[offset:offset + usersLength].splitlines()
+
+    def close(self):
+        """Unmap the file. The snapshot can't be used afterwards."""
+        self.tileStarts = self.table = None
+        self.buffer.close()
+
+    def rows_at(self, loc):
+        """Return the rows of the object table for the objects on ``loc``."""
+        index = loc[0] * self.dim + loc[1]
+        return self.table[self.tileStarts[index]:self.tileStarts[index + 1]]
+
+    def objects_at(self, loc):
+        """
+        Return a list of new objects made from the rows for ``loc``.
+
+        Only that tile is read from the file. The objects' references are
+        resolved against the whole table, so a key on ``loc`` unlocks a new
+        copy of its door (which isn't on any ``World``).
+        """
+        rows = self.rows_at(loc).tolist()
+        objects = [object_from_row(row) for row in rows]
+        for obj, row in zip(objects, rows):
+            ref = row[-1]
+            if ref != NO_REF:
+                matches = np.flatnonzero(self.table['serial'] == ref)
+                if len(matches) == 0:
+                    raise ValueError("{} refers to object {}, which isn't in the snapshot".format(
+                        repr(obj), ref))
+                self.set_ref(obj, object_from_row(self.table[matches[0]].tolist()))
+        return objects
+
+    def set_ref(self, obj, target):
+        """Make ``obj`` (a chest or key) contain or unlock ``target``."""
+        if obj.objType == wu.CHEST:
+            obj.contains = target
+        else:
+            obj.unlocks = target
+
+    def blocked_tiles(self, doorsOpen=False):
+        """
+        Return the set of tiles which hold an impassable object.
+
+        This is worked out from the table with NumPy, without making any
+        objects. It is the same as ``World.blockedTiles[doorsOpen]`` of the
+        ``World`` which :py:meth:`world` would build.
+        """
+        types = self.table['type']
+        flags = self.table['flags']
+        impassable = ((types == TYPE_CODES.index(wu.WALL)) |
+                      (types == TYPE_CODES.index(wu.CHEST)) |
+                      ((types == TYPE_CODES.index(wu.NPC)) & (flags & ALIVE > 0)))
+        if not doorsOpen:
+            impassable |= (types == TYPE_CODES.index(wu.DOOR)) & (flags & LOCKED > 0)
+        xs = self.table['x'][impassable].tolist()
+        ys = self.table['y'][impassable].tolist()
+        return set(zip(xs, ys))
+
+    def world(self):
+        """
+        Build the ``World`` which the snapshot holds.
+
+        The objects are made from the table in one pass and their references
+        resolved by serial. They are then put on the floor directly, rather
+        than one at a time through ``place_object``, and the sets of blocked
+        tiles are read from the table (see :py:meth:`blocked_tiles`). As for
+        any new ``World``, the indexes are built when first needed.
+
+        Raises ``ValueError`` if an object refers to one which isn't there, or
+        a user can't be placed (e.g. because two users have the same name).
+        """
+        world = wu.World(dim=self.dim)
+        rows = self.table.tolist()
+        objects = [object_from_row(row) for row in rows]
+        refs = self.table['ref']
+        referrers = np.flatnonzero(refs != NO_REF).tolist()
+        if referrers:
+            bySerial = dict((obj.serial, obj) for obj in objects)
+            for index in referrers:
+                obj = objects[index]
+                ref = int(refs[index])
+                if ref not in bySerial:
+                    raise ValueError("{} refers to object {}, which isn't in the snapshot".format(
+                        repr(obj), ref))
+                self.set_ref(obj, bySerial[ref])
+
+        # As in the world's repr, the users come first, so add_user doesn't
+        # refuse to put one on a tile with an object on it (such as a trap)
+        for line in self.users:
+            userType = wu.OBJECT_ID_CODES[line[0]]
+            locEnd = line.index(':')
+            location = wu.get_point_from_str(line[line.index('@') + 1:locEnd])
+            vision, name = line[locEnd + 1:].split(':')
+            if not world.add_user(name, location, int(vision), userType):
+                raise ValueError("User {} can't be placed in the world".format(line))
+
+        floor = {}
+        for obj in objects:
+            contents = floor.get(obj.location)
+            if contents is None:
+                floor[obj.location] = [obj]
+            else:
+                contents.append(obj)
+        world.floor = floor
+        world.blockedTiles = {False: self.blocked_tiles(False),
+                              True: self.blocked_tiles(True)}
+        return world
+
+
+def open_snapshot(filename):
+    """Return a :py:class:`Snapshot` of the ``.dngb`` file ``filename``."""
+    return Snapshot(filename)
+
+
+def load_snapshot(filename):
+    """Return the ``World`` held in the ``.dngb`` file ``filename``."""
+    snapshot = Snapshot(filename)
+    world = snapshot.world()
+    snapshot.close()
+    return world
+
+
+def dng_to_dngb(dngFilename, dngbFilename=None):
+    """
+    Convert a ``.dng`` file to a ``.dngb`` snapshot.
+
+    If ``dngbFilename`` isn't given, the snapshot is written next to the
+    ``.dng`` file, with a ``.dngb`` extension. Returns the snapshot's name.
+    """
+    if dngbFilename is None:
+        dngbFilename = dngFilename + 'b' if dngFilename.endswith('.dng') else dngFilename + '.dngb'
+    save_snapshot(wu.build_World_from_file(dngFilename), dngbFilename)
+    return dngbFilename
+
+
+def dngb_to_dng(dngbFilename, dngFilename=None):
+    """
+    Convert a ``.dngb`` snapshot to a ``.dng`` file.
+
+    If ``dngFilename`` isn't given, the file is written next to the snapshot,
+    with a ``.dng`` extension. Returns the file's name.
+    """
+    if dngFilename is None:
+        dngFilename = dngbFilename[:-1] if dngbFilename.endswith('.dngb') else dngbFilename + '.dng'
+    with open(dngFilename, 'w') as dngFile:
+        dngFile.write(repr(load_snapshot(dngbFilename)))
+    return dngFilename
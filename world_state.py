@@ -0,0 +1,316 @@
+"""
+Contains the conversion of a ``World`` to a MIDCA state.
+
+A MIDCA state (see ``world.sim`` for the domain) declares every tile and the
+adjacencies between them, which is most of the state for any sizeable world
+(four directions for each of the ``dim * dim`` tiles), and yet depends only on
+``dim``. Those blocks are therefore built once per dimension and cached (see
+:py:func:`static_blocks`); only the predicates about objects, users and
+passability are generated for each state, from the ``World``'s indexes.
+
+:py:func:`state_chunks` yields the state a piece at a time, so it can be
+written to a file (:py:func:`write_state`) or handed to a consumer without the
+whole state being held as one string. :py:meth:`~world_utils.World.midca_state_str`
+joins the pieces for callers which want the string.
+
+A consumer which keeps its own copy of the state can instead follow a
+:py:class:`PredicateFeed`, which uses the ``World``'s change journal (see
+:py:mod:`world_journal`) to report only the predicates added and deleted
+since it last looked.
+"""
+
+from world_types import OPERATOR
+
+#: The directions, in the order their adjacencies are declared
+DIRECTIONS = (('s', 'south', 0, 1), ('e', 'east', 1, 0),
+              ('w', 'west', -1, 0), ('n', 'north', 0, -1))
+
+#: The cached static blocks for each dimension (see :py:func:`static_blocks`)
+STATIC_BLOCKS = {}
+
+#: The beginnings of the lines of a state which aren't dynamic predicates
+STATIC_PREFIXES = ("#", "DIM(", "TILE(", "adjacent")
+
+
+def tile_name(loc):
+    """Return the name of the tile at ``loc`` in the MIDCA state, e.g. ``Tx1y2``."""
+    return "Tx{}y{}".format(loc[0], loc[1])
+
+
+def static_blocks(dim):
+    """
+    Return the parts of the state of a ``dim`` x ``dim`` world which never change.
+
+    These are returned as a tuple ``(tileNames, tileDecls, adjacencies)``:
+    ``tileNames`` maps each location to its name (see :py:func:`tile_name`),
+    ``tileDecls`` is the block of ``TILE`` declarations and ``adjacencies`` is
+    the block of ``adjacent`` and ``adjacent-<direction>`` predicates. They are
+    built on the first call for each ``dim`` and cached in
+    :py:data:`STATIC_BLOCKS`.
+    """
+    blocks = STATIC_BLOCKS.get(dim)
+    if blocks is not None:
+        return blocks
+    tileNames = {}
+    for x in range(dim):
+        for y in range(dim):
+            tileNames[(x, y)] = tile_name((x, y))
+    tileDecls = []
+    adjacencies = []
+    for x in range(dim):
+        for y in range(dim):
+            name = tileNames[(x, y)]
+            tileDecls.append("TILE({})\n".format(name))
+            for _, fullDir, dx, dy in DIRECTIONS:
+                nborName = tileNames.get((x + dx, y + dy))
+                if nborName is None:
+                    continue
+                adjacencies.append("adjacent-{}({}, {})\n".format(fullDir, name, nborName))
+                adjacencies.append("adjacent({}, {})\n".format(name, nborName))
+    blocks = (tileNames, "".join(tileDecls), "".join(adjacencies))
+    STATIC_BLOCKS[dim] = blocks
+    return blocks
+
+
+def passable_tiles(world):
+    """
+    Return a sorted list of the passable tiles of ``world``.
+
+    A tile is passable if it isn't blocked with the doors closed, or if a user
+    is on it (see ``World.check_passable``). This is worked out from the
+    ``World``'s set of blocked tiles, so only the blocked tiles are looked at
+    one by one.
+    """
+    blocked = set(loc for loc in world.blockedTiles[False] if not world.user_at(loc))
+    return [(x, y) for x in range(world.dim) for y in range(world.dim)
+            if (x, y) not in blocked]
+
+
+def user_predicate(user, tileNames):
+    """Return the ``agent-at`` or ``operator-at`` predicate of ``user``."""
+    usrType = "operator" if user.userType == OPERATOR else "agent"
+    return "{}-at({}:{}, {})\n".format(usrType, user.id, user.vision, tileNames[user.at])
+
+
+def object_location_predicate(obj, tileNames):
+    """Return the ``<type>-at`` predicate of ``obj``."""
+    return "{}-at({}, {})\n".format(obj.objType.lower(), obj.id, tileNames[obj.location])
+
+
+def state_chunks(world):
+    """
+    Yield the MIDCA state of ``world`` as a series of strings.
+
+    The static blocks are yielded whole, from the cache, and the other
+    predicates one line at a time. Users are listed in order of their names
+    and objects in order of their serials, so the state of a given ``World``
+    is always the same.
+
+    Arguments:
+        ``world``, *World*:
+            The world to convert.
+
+        ``return``, *generator*:
+            The pieces of the state, which add up to the whole state when
+            joined.
+    """
+    tileNames, tileDecls, adjacencies = static_blocks(world.dim)
+    users = [world.users[name] for name in sorted(world.users)]
+    objects = sorted(world.objects, key=lambda obj: obj.serial)
+
+    yield "DIM({})\n".format(world.dim)
+
+    yield "\n# User declarations\n"
+    for user in users:
+        if user.userType != OPERATOR:
+            yield "AGENT({}:{})\n".format(user.id, user.vision)
+    for user in users:
+        if user.userType == OPERATOR:
+            yield "OPERATOR({}:{})\n".format(user.id, user.vision)
+
+    yield "\n# Tile declarations\n"
+    yield tileDecls
+
+    yield "\n# Object declarations\n"
+    for obj in objects:
+        yield "{}({})\n".format(obj.objType, obj.id)
+
+    yield "\n# Tile adjacency predicates\n"
+    yield adjacencies
+
+    yield "\n# Object location predicates\n"
+    for obj in objects:
+        yield object_location_predicate(obj, tileNames)
+
+    yield "\n# Tile status predicates\n"
+    for loc in passable_tiles(world):
+        yield "passable({})\n".format(tileNames[loc])
+
+    yield "\n# User predicates\n"
+    for user in users:
+        yield user_predicate(user, tileNames)
+
+    yield "\n# Other object predicates\n"
+    for obj in objects:
+        yield obj.predicates
+
+
+def write_state(world, stateFile):
+    """Write the MIDCA state of ``world`` to the open file ``stateFile``."""
+    stateFile.writelines(state_chunks(world))
+
+
+def dynamic_predicates(world):
+    """
+    Return the set of predicates in the state of ``world`` which can change.
+
+    This is every predicate produced by :py:func:`state_chunks` apart from the
+    static blocks (the dimension, the tiles and their adjacencies), without
+    line endings. :py:class:`PredicateFeed` is checked against it.
+    """
+    predicates = set()
+    for line in "".join(state_chunks(world)).split("\n"):
+        if line and not line.startswith(STATIC_PREFIXES):
+            predicates.add(line)
+    return predicates
+
+
+class PredicateFeed(object):
+    """
+    A feed of the changes to the predicates of a ``World``'s MIDCA state.
+
+    The feed remembers the dynamic predicates (see :py:func:`dynamic_predicates`)
+    of the state as of ``version``, the ``World``'s version when it was last
+    brought up to date. :py:meth:`delta` returns the predicates added and
+    deleted since then, working out only the predicates of the tiles which the
+    ``World``'s change journal says have changed and of the tiles users have
+    moved between (a user makes its tile passable).
+
+    ``tilePreds`` maps a tile to the set of predicates about it and the
+    objects on it. A tile which is empty and passable, and so only has a
+    ``passable`` predicate, is left out. ``userPreds`` maps each user's ID to
+    its predicates and ``userTiles`` to the tile it was on.
+
+    Instantiation::
+
+        feed = PredicateFeed(world)
+    """
+
+    def __init__(self, world):
+        """Create a feed of the changes to ``world``, starting now."""
+        self.world = world
+        self.tileNames = static_blocks(world.dim)[0]
+        self.tilePreds = {}
+        self.userPreds = {}
+        self.userTiles = {}
+        self.version = world.version
+        # Everything is "added" by the first delta, which doesn't need reporting
+        self.delta(full=True)
+
+    def tile_predicates(self, loc):
+        """
+        Return the set of predicates about ``loc`` and the objects on it.
+
+        Returns None for an empty, passable tile.
+        """
+        world = self.world
+        contents = world.floor.get(loc)
+        passable = world.check_passable(loc)
+        if not contents and passable:
+            return None
+        name = self.tileNames[loc]
+        predicates = set()
+        for obj in contents or ():
+            predicates.add("{}({})".format(obj.objType, obj.id))
+            predicates.add(object_location_predicate(obj, self.tileNames)[:-1])
+            predicates.update(line for line in obj.predicates.split("\n") if line)
+        if passable:
+            predicates.add("passable({})".format(name))
+        return predicates
+
+    def user_predicates(self, user):
+        """Return the set of predicates about ``user``."""
+        userType = OPERATOR if user.userType == OPERATOR else "AGENT"
+        return set(["{}({}:{})".format(userType, user.id, user.vision),
+                    user_predicate(user, self.tileNames)[:-1]])
+
+    def default_predicates(self, loc):
+        """Return the predicates of ``loc`` if it is empty and passable."""
+        return set(["passable({})".format(self.tileNames[loc])])
+
+    def delta(self, full=False):
+        """
+        Return the predicates added and deleted since the last call.
+
+        If the journal no longer goes back to the feed's ``version``, or
+        ``full`` is True, every tile is looked at instead.
+
+        Arguments:
+            ``full``, *bool*:
+                Whether to look at every tile.
+
+            ``return``, *tuple*:
+                A pair of sorted lists, ``(added, deleted)``.
+        """
+        world = self.world
+        tiles = None if full else world.journal.tiles_changed_since(self.version)
+        if tiles is None:
+            tiles = set(self.tilePreds)
+            tiles.update(world.floor)
+            tiles.update(world.blockedTiles[False])
+        added = set()
+        deleted = set()
+
+        for userID, user in world.users.items():
+            oldTile = self.userTiles.get(userID)
+            if oldTile != user.at:
+                if oldTile is not None:
+                    tiles.add(oldTile)
+                tiles.add(user.at)
+                self.userTiles[userID] = user.at
+            predicates = self.user_predicates(user)
+            oldPredicates = self.userPreds.get(userID, set())
+            if predicates != oldPredicates:
+                added |= predicates - oldPredicates
+                deleted |= oldPredicates - predicates
+                self.userPreds[userID] = predicates
+        for userID in list(self.userPreds):
+            if userID not in world.users:
+                deleted |= self.userPreds.pop(userID)
+                tiles.add(self.userTiles.pop(userID))
+
+        for loc in tiles:
+            predicates = self.tile_predicates(loc)
+            oldPredicates = self.tilePreds.get(loc)
+            if predicates is None:
+                self.tilePreds.pop(loc, None)
+                predicates = self.default_predicates(loc)
+            else:
+                self.tilePreds[loc] = predicates
+            if oldPredicates is None:
+                oldPredicates = self.default_predicates(loc)
+            added |= predicates - oldPredicates
+            deleted |= oldPredicates - predicates
+
+        self.version = world.version
+        return sorted(added), sorted(deleted)
+
+    def predicates(self):
+        """Return the set of dynamic predicates as of the feed's ``version``."""
+        predicates = set()
+        for loc in self.tileNames:
+            tilePredicates = self.tilePreds.get(loc)
+            predicates |= self.default_predicates(loc) if tilePredicates is None else tilePredicates
+        for userPredicates in self.userPreds.values():
+            predicates |= userPredicates
+        return predicates
+
+    def consistent(self):
+        """
+        Indicate whether the feed agrees with the full state of the ``World``.
+
+        Compares :py:meth:`predicates` with :py:func:`dynamic_predicates`, so
+        it should only be called just after :py:meth:`delta`. This takes time
+        proportional to the size of the ``World``, and is meant for testing.
+        """
+        return self.predicates() == dynamic_predicates(self.world)
@@ -0,0 +1,19 @@
+"""
+Contains the constants which name the types of users and objects in a ``World``.
+
+These are imported by :py:mod:`world_utils`, which is where the rest of the
+code uses them from, and by the modules ``world_utils`` itself imports (the
+indexes, grids, and so on), which can't import ``world_utils`` in turn.
+"""
+
+AGENT = "AGENT"  #: Easily check if an Agent object is an agent
+OPERATOR = "OPERATOR"  #: Easily check if an Agent object is an operator
+
+CHEST = 'CHEST'  #: Easily check if a WorldObject object is a chest
+DOOR = 'DOOR'  #: Easily check if a WorldObject object is a door
+WALL = 'WALL'  #: Easily check if a WorldObject object is a wall
+KEY = 'KEY'  #: Easily check if a WorldObject object is a key
+COIN = 'COIN'  #: Easily check if a WorldObject object is a coin
+FIRE = 'FIRE'  #: Easily check if a WorldObject object is a fire
+TRAP = 'TRAP'  #: Easily check if a WorldObject object is a trap
+NPC = 'NPC'  #: Easily check if a WorldObject object is a NPC
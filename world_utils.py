@@ -8,25 +8,25 @@ three main classes: ``World``, ``WorldObject``, and ``Agent``, as well as
 functions, such as functions which can create worlds or perform helpful conversions.
 """
 
-from copy import deepcopy
+from copy import copy, deepcopy
+from collections import OrderedDict
+from operator import attrgetter
 from random import randint
 import logging
 import os
 import traceback
 import StringIO
 from midca import plans, goals
-
-AGENT = "AGENT"  #: Easily check if an Agent object is an agent
-OPERATOR = "OPERATOR"  #: Easily check if an Agent object is an operator
-
-CHEST = 'CHEST'  #: Easily check if a WorldObject object is a chest
-DOOR = 'DOOR'  #: Easily check if a WorldObject object is a door
-WALL = 'WALL'  #: Easily check if a WorldObject object is a wall
-KEY = 'KEY'  #: Easily check if a WorldObject object is a key
-COIN = 'COIN'  #: Easily check if a WorldObject object is a coin
-FIRE = 'FIRE'  #: Easily check if a WorldObject object is a fire
-TRAP = 'TRAP'  #: Easily check if a WorldObject object is a trap
-NPC = 'NPC'  #: Easily check if a WorldObject object is a NPC
+from world_types import (AGENT, OPERATOR, CHEST, DOOR, WALL, KEY, COIN, FIRE,
+                         TRAP, NPC)
+import world_paths
+import world_grids
+import world_index
+import world_hashing
+import world_journal
+import world_events
+import world_state
+import world_vision
 
 UNARMED = 0  #: Easily check if an agent is unarmed
 ARMING = 1  #: Easily check if an agent is arming
@@ -42,7 +42,9 @@ OBJECT_LIST = [CHEST, DOOR, WALL, KEY, COIN, FIRE, TRAP, NPC, AGENT, OPERATOR]
 
 #: Conversion table from object characters to object strings
 OBJECT_ID_CODES = {"C": CHEST,
+                   "c": CHEST,
                    "D": DOOR,
+                   "d": DOOR,
                    "W": WALL,
                    "k": KEY,
                    "$": COIN,
@@ -64,6 +66,12 @@ OBJECT_CODE_IDS = {CHEST: "C",
                    AGENT: "A",
                    OPERATOR: "O"}
 
+#: Most paths a ``WorldMap`` will cache before it clears its path cache
+PATH_CACHE_SIZE = 1000
+
+#: Most destinations a ``WorldMap`` keeps incremental path planners for
+INCREMENTAL_PLANNERS = 8
+
 #: Conversion table from direction-indicating characters to strings
 DIRECTON_EXPANSIONS = {'n': 'north',
                        's': 'south',
@@ -79,9 +87,8 @@ class WorldObject(object):
 
     ``objType``:
         This is a string which indicates what type of object the object really is.
-        This value should be a member of ``OBJECT_LIST``. This is set automatically
-        when a ``WorldObject`` subclass is instantiated, and should **not** be
-        altered.
+        This value should be a member of ``OBJECT_LIST``. It is a class attribute
+        of each ``WorldObject`` subclass, and should **not** be altered.
 
     ``passable``:
         This is a boolean which indicates whether an ``Agent`` can move through
@@ -95,20 +102,91 @@ class WorldObject(object):
         require for instantiation. Currently this value does not change, but it
         may be altered as a result of agent or operator actions.
 
+    ``serial``:
+        This is an int which identifies the object for as long as it exists. It
+        is allocated from ``WorldObject.serialCount`` when the object is made,
+        is written into the object's ``repr`` and is read back when a ``World``
+        is rebuilt from a string, so copies of an object share its serial. The
+        object's ID, hash and equality are all based on it.
+
     All subclasses also have several properties and magic methods, some of which
     are provides universally by the base class and some of which must be implemented
     in each subclass.
+
+    Worlds can hold tens of thousands of objects, and every agent's map holds
+    copies of the ones it has seen, so objects keep their attributes in
+    ``__slots__`` rather than a ``__dict__``. Each subclass must list the
+    attributes it adds in its own ``__slots__``.
     """
 
-    def __init__(self, location):
+    __slots__ = ('passable', 'location', 'serial')
+    objType = None
+
+    #: The serial which will be given to the next object made
+    serialCount = 0
+
+    def __init__(self, location, serial=None):
         """
         Create object by giving it a location.
 
-        The WorldObject superclass should not be directly instantiated.
+        The WorldObject superclass should not be directly instantiated. If
+        ``serial`` is not given, a new one is allocated.
         """
-        self.objType = None
         self.passable = None
         self.location = location
+        if serial is None:
+            serial = WorldObject.serialCount
+        WorldObject.serialCount = max(WorldObject.serialCount, serial + 1)
+        self.serial = serial
+
+    @classmethod
+    def slot_names(cls):
+        """Return the names of every attribute in the ``__slots__`` of the class."""
+        names = cls.__dict__.get('allSlots')
+        if names is None:
+            names = ()
+            for klass in reversed(cls.__mro__):
+                names += klass.__dict__.get('__slots__', ())
+            cls.allSlots = names
+        return names
+
+    def __getstate__(self):
+        """Return the object's attributes as a dict, for pickling and copying."""
+        return dict((name, getattr(self, name)) for name in self.slot_names())
+
+    def __setstate__(self, state):
+        """Restore the attributes returned by ``__getstate__``."""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def clone(self, memo):
+        """
+        Return a copy of the object, with the same serial.
+
+        Objects which this one refers to (e.g. what a chest contains) are cloned
+        too. ``memo`` maps the ``id`` of each object cloned so far to its clone,
+        so an object referred to from several places is only cloned once, and
+        references between clones mirror those between the originals.
+
+        Arguments:
+            ``memo``, *dict*:
+                The clones made so far, which this one is added to.
+
+            ``return``, *WorldObject*:
+                The clone.
+        """
+        key = id(self)
+        if key in memo:
+            return memo[key]
+        cls = type(self)
+        new = cls.__new__(cls)
+        memo[key] = new
+        for name in self.slot_names():
+            value = getattr(self, name)
+            if isinstance(value, WorldObject):
+                value = value.clone(memo)
+            setattr(new, name, value)
+        return new
 
     @property
     def ascii_rep(self):
@@ -129,15 +207,15 @@ class WorldObject(object):
         Return a unique string ID for the object.
 
         This function provides each object with a unique string by prepending the
-        object code character to the string of ``hash(self)``. This should **not**
-        be overridden by subclasses.
+        object code character to its ``serial``, so the ID does not change when
+        the object's state does. This should **not** be overridden by subclasses.
 
         ``return``:
-            This function returns a six character string such that the first character
-            is a letter in ``OBJECT_ID_CODES.keys()`` and the remaining five are
-            the has value of the object.
+            This function returns a string such that the first character is a
+            letter in ``OBJECT_ID_CODES.keys()`` and the rest is the object's
+            serial.
         """
-        return OBJECT_CODE_IDS[self.objType] + str(hash(self))[:5]
+        return OBJECT_CODE_IDS[self.objType] + str(self.serial)
 
     @property
     def predicates(self):
@@ -186,32 +264,51 @@ class WorldObject(object):
     def __eq__(self, other):
         """Indicate whether this object is equal to the other object.
 
-        This function is used to compare the equality of two objects in the ``World``.
-        Because the string returned by the ``__repr__`` method should encode ALL
-        information about the object in a predicatable way, two objects are equal
-        iff their representations are equal. That principle underlies this function.
+        Two objects are equal iff they have the same ``serial``, i.e. they are
+        the same object or copies of it, whatever state each copy is in. Use
+        :py:meth:`same_state` to ask whether two objects are in the same state.
         This function does not need to be overridden by subclasses.
 
         ``return``:
-            A boolean which is true iff the two objects are equivalent.
+            A boolean which is true iff the two objects are the same object.
         """
-        return repr(self) == repr(other)
+        return isinstance(other, WorldObject) and self.serial == other.serial
+
+    def __ne__(self, other):
+        """Indicate whether this object is not equal to the other object."""
+        return not self == other
 
     def __hash__(self):
         """
         Return an integer unique to this object.
 
-        This function should generate an integer such that no other object which
-        is not equivalent to this one will have the same value for its ``__hash__``
-        function. This is accomplished by calling Python's built-in ``hash`` function
-        on the representation of this object. Since the representation encodes ALL
-        information about this object in a predictable way, the hash value will
-        be unique to objects with exactly the same state as this one.
+        Since ``serial`` never changes, neither does the hash, so objects can be
+        kept in sets and dicts while their state changes.
 
         ``return``:
             An integer unique to this object.
         """
-        return hash(repr(self))
+        return self.serial
+
+    def same_state(self, other):
+        """
+        Indicate whether the other object is of the same type and in the same state.
+
+        This is the structural equality which ``__eq__`` used to provide: every
+        attribute except ``serial`` is compared, so two separately made walls on
+        the same tile are in the same state, and a living NPC and a dead copy of
+        it are not. Objects which an object refers to (e.g. what a chest
+        contains) are compared by ``serial``.
+
+        ``return``:
+            A boolean which is true iff the two objects are equivalent.
+        """
+        if type(self) is not type(other):
+            return False
+        for attrib in self.slot_names():
+            if attrib != 'serial' and getattr(self, attrib) != getattr(other, attrib):
+                return False
+        return True
 
 
 class Wall(WorldObject):
@@ -226,11 +323,13 @@ class Wall(WorldObject):
         wall = Wall((x, y))
     """
 
-    def __init__(self, location):
+    __slots__ = ()
+    objType = WALL
+
+    def __init__(self, location, serial=None):
         """Instantiate a world at ``location``."""
-        super(Wall, self).__init__(location)
+        super(Wall, self).__init__(location, serial)
         self.passable = False
-        self.objType = WALL
 
     @property
     def ascii_rep(self):
@@ -263,7 +362,7 @@ class Wall(WorldObject):
 
     def __repr__(self):
         """Return a concise representation of the wall."""
-        return "W@{}".format(self.location)
+        return "W#{}@{}".format(self.serial, self.location)
 
 
 class Chest(WorldObject):
@@ -283,13 +382,15 @@ class Chest(WorldObject):
         chest = Chest((x,y)[, WorldObject])
     """
 
-    def __init__(self, location, contains=None):
+    __slots__ = ('contains', 'locked')
+    objType = CHEST
+
+    def __init__(self, location, contains=None, locked=True, serial=None):
         """Instantiate a chest at the location, containing the given object."""
-        super(Chest, self).__init__(location)
+        super(Chest, self).__init__(location, serial)
         self.passable = False
-        self.objType = CHEST
         self.contains = contains
-        self.locked = True
+        self.locked = locked
 
     def insert_object(self, obj):
         """
@@ -367,7 +468,8 @@ class Chest(WorldObject):
         what it contains.
         """
         char = "C" if self.locked else "c"
-        return "{}@{}:{}".format(char, self.location, repr(self.contains))
+        return "{}#{}@{}:{}".format(char, self.serial, self.location,
+                                     repr(self.contains))
 
 
 class Door(WorldObject):
@@ -383,11 +485,13 @@ class Door(WorldObject):
         door = Door((x,y)[, locked=bool])
     """
 
-    def __init__(self, location, locked=True):
+    __slots__ = ('locked',)
+    objType = DOOR
+
+    def __init__(self, location, locked=True, serial=None):
         """Instantiate a door at the given location."""
-        super(Door, self).__init__(location)
-        self.passable = False
-        self.objType = DOOR
+        super(Door, self).__init__(location, serial)
+        self.passable = not locked
         self.locked = locked
 
     @property
@@ -410,16 +514,18 @@ class Door(WorldObject):
 
     def __repr__(self):
         char = "D" if self.locked else "d"
-        return "{}@{}".format(char, self.location)
+        return "{}#{}@{}".format(char, self.serial, self.location)
 
 
 class Key(WorldObject):
     """Represents a key in the world. Can unlock a locked item."""
 
-    def __init__(self, location, unlocks=None, inChest=None):
-        super(Key, self).__init__(location)
+    __slots__ = ('unlocks', 'taken', 'inChest')
+    objType = KEY
+
+    def __init__(self, location, unlocks=None, inChest=None, serial=None):
+        super(Key, self).__init__(location, serial)
         self.passable = True
-        self.objType = KEY
         self.unlocks = unlocks
         self.taken = False
         self.inChest = inChest
@@ -450,18 +556,21 @@ class Key(WorldObject):
 
     def __repr__(self):
         if self.taken:
-            return "k@tkn:{}".format(repr(self.unlocks))
+            return "k#{}@tkn:{}".format(self.serial, repr(self.unlocks))
         else:
-            return "k@{}:{}".format(self.location, repr(self.unlocks))
+            return "k#{}@{}:{}".format(self.serial, self.location,
+                                         repr(self.unlocks))
 
 
 class Coin(WorldObject):
     """Represents a coin of some value in the world."""
 
-    def __init__(self, location, value, inChest=None):
-        super(Coin, self).__init__(location)
+    __slots__ = ('value', 'inChest')
+    objType = COIN
+
+    def __init__(self, location, value, inChest=None, serial=None):
+        super(Coin, self).__init__(location, serial)
         self.passable = True
-        self.objType = COIN
         self.value = value
         self.inChest = inChest
 
@@ -480,16 +589,18 @@ class Coin(WorldObject):
         return "Coin @ {} worth {}".format(self.location, self.value)
 
     def __repr__(self):
-        return "$@{}:{}".format(self.location, self.value)
+        return "$#{}@{}:{}".format(self.serial, self.location, self.value)
 
 
 class Fire(WorldObject):
     """Represents a fire in the world, which can deal damage to the agent."""
 
-    def __init__(self, location, damage):
-        super(Fire, self).__init__(location)
+    __slots__ = ('damage',)
+    objType = FIRE
+
+    def __init__(self, location, damage, serial=None):
+        super(Fire, self).__init__(location, serial)
         self.passable = True
-        self.objType = FIRE
         self.damage = 1
 
     @property
@@ -505,18 +616,20 @@ class Fire(WorldObject):
         return "Fire @ {} which deals {} damage".format(self.location, self.damage)
 
     def __repr__(self):
-        return "*@{}:{}".format(self.location, self.damage)
+        return "*#{}@{}:{}".format(self.serial, self.location, self.damage)
 
 
 class Trap(WorldObject):
     """Represents a trap in the world, which is hidden until it activates."""
 
-    def __init__(self, location, damage):
-        super(Trap, self).__init__(location)
+    __slots__ = ('damage', 'hidden')
+    objType = TRAP
+
+    def __init__(self, location, damage, hidden=True, serial=None):
+        super(Trap, self).__init__(location, serial)
         self.passable = True
-        self.objType = TRAP
         self.damage = 1
-        self.hidden = True
+        self.hidden = hidden
 
     @property
     def ascii_rep(self):
@@ -536,16 +649,19 @@ class Trap(WorldObject):
 
     def __repr__(self):
         char = "h" if self.hidden else "s"
-        return "^{}@{}:{}".format(char, self.location, self.damage)
+        return "^{}#{}@{}:{}".format(char, self.serial, self.location,
+                                     self.damage)
 
 
 class Npc(WorldObject):
     """Used to represent enemies and civilians in the world."""
 
-    def __init__(self, location, civi=False, living=True):
-        super(Npc, self).__init__(location)
-        self.passable = False
-        self.objType = NPC
+    __slots__ = ('civi', 'alive')
+    objType = NPC
+
+    def __init__(self, location, civi=False, living=True, serial=None):
+        super(Npc, self).__init__(location, serial)
+        self.passable = not living
         self.civi = civi
         self.alive = living
 
@@ -575,7 +691,8 @@ class Npc(WorldObject):
     def __repr__(self):
         char = "C" if self.civi else "E"
         status = "L" if self.alive else "D"
-        return "&{}@{}:{}".format(char, self.location, status)
+        return "&{}#{}@{}:{}".format(char, self.serial, self.location,
+                                     status)
 
 
 class World(object):
@@ -595,8 +712,23 @@ class World(object):
         self.bombRange = bombRange
         self.floor = {}
         self.users = {}
+        self.userLocs = {}
+        self.userTiles = {}
         self.log = log
-        self.eventLog = ""
+        self.events = world_events.EventLog()
+        self.blockedTiles = {False: set(), True: set()}
+        self.passVersion = 0
+        self.components = {False: world_paths.Components(dim),
+                           True: world_paths.Components(dim)}
+        self.civilianGrid = world_grids.CivilianGrid(dim, bombRange)
+        self.occupancy = world_grids.OccupancyGrid(dim)
+        self.lineOfSight = False
+        self.fieldOfView = world_vision.FieldOfView()
+        self.objectIndex = world_index.ObjectIndex()
+        self.zobrist = world_hashing.ZobristHash()
+        self.journal = world_journal.ChangeJournal()
+        self.scoreSeries = []
+        self.sharedTiles = set()
         self.log.info("\n\n")
         self.log.info("New world made")
         Agent.agentCount = 0
@@ -638,20 +770,48 @@ class World(object):
     @property
     def objects(self):
         """Return a list of all objects in the ``World``."""
-        objects = []
-        for loc in self.floor:
-            objects += self.floor[loc]
-        return objects
+        return self.objectIndex.objects(self.floor)
 
     @property
     def enemies(self):
         """Return a list of all of the ``Npc`` objects marked as enemies."""
-        return self.filter_objects(objType=NPC, civi=False)
+        return self.get_npcs(civi=False)
 
     @property
     def civilians(self):
         """Return a list of all of the ``Npc`` objects labeled as civilians."""
-        return self.filter_objects(objType=NPC, civi=True)
+        return self.get_npcs(civi=True)
+
+    def get_objects_of_type(self, objType):
+        """Return a list of all objects of the given type in the ``World``."""
+        return self.objectIndex.of_type(self.floor, objType)
+
+    def count_npcs(self, civi=None, alive=None):
+        """
+        Return the number of ``Npc`` objects with the given status.
+
+        This takes the same arguments as ``get_npcs``, but takes constant time.
+        """
+        return self.objectIndex.count_npcs(self.floor, civi, alive)
+
+    def get_npcs(self, civi=None, alive=None):
+        """
+        Return a list of the ``Npc`` objects with the given status.
+
+        These are looked up in the ``World``'s object index (see
+        :py:class:`~world_index.ObjectIndex`) rather than found by a search.
+
+        Arguments:
+            ``civi``, *bool*:
+                If given, return only civilians (True) or only enemies (False).
+
+            ``alive``, *bool*:
+                If given, return only living (True) or only dead (False) NPCs.
+
+            ``return``, *list*:
+                The matching ``Npc`` objects.
+        """
+        return self.objectIndex.npcs(self.floor, civi, alive)
 
     @property
     def score(self):
@@ -666,13 +826,63 @@ class World(object):
             ``return``, *tuple*:
                 A pair of floats reflecting the percentage of enemies killed and
                 percentage of civilians still alive.
+
+        The counts behind the score are kept up to date by the object index as
+        NPCs are placed, removed and killed, so this takes constant time.
         """
-        enemiesDead = len(self.filter_objects(civi=False, alive=False))
-        civisAlive = len(self.filter_objects(civi=True, alive=True))
-        enemyKillRatio = float(enemiesDead)/len(self.enemies)
-        civiLiveRatio = float(civisAlive)/len(self.civilians)
+        enemiesDead = self.count_npcs(civi=False, alive=False)
+        civisAlive = self.count_npcs(civi=True, alive=True)
+        enemyKillRatio = float(enemiesDead)/self.count_npcs(civi=False)
+        civiLiveRatio = float(civisAlive)/self.count_npcs(civi=True)
         return (enemyKillRatio, civiLiveRatio)
 
+    def record_score(self):
+        """
+        Append the current score to ``scoreSeries`` and return it.
+
+        ``scoreSeries`` is a list with one score pair (see ``score``) per call,
+        so calling this once per tick (e.g. per action applied) gives the score
+        over time, which can be stored with the rest of a run's results.
+        """
+        score = self.score
+        self.scoreSeries.append(score)
+        return score
+
+    @property
+    def tick(self):
+        """Return the number of ticks so far, i.e. the length of ``scoreSeries``."""
+        return len(self.scoreSeries)
+
+    @property
+    def version(self):
+        """
+        Return the version of the ``World``, which goes up by one per change.
+
+        The version counts the changes to tiles recorded in the ``World``'s
+        journal (see :py:mod:`world_journal`), and can be passed to
+        :py:meth:`changes_since` later to find out what changed in between.
+        """
+        return self.journal.version
+
+    def changes_since(self, version):
+        """
+        Return a list of the changes to tiles made after ``version``.
+
+        Each change is a :py:data:`~world_journal.Change` record of the tile,
+        its state before and after (see :py:func:`~world_journal.tile_state`),
+        the version after the change and the tick at which it happened. If the
+        journal no longer goes back as far as ``version``, None is returned
+        instead.
+
+        Arguments:
+            ``version``, *int*:
+                A version returned by :py:attr:`version` earlier.
+
+            ``return``, *list*:
+                The changes, oldest first, or None.
+        """
+        return self.journal.changes_since(version)
+
     def filter_objects(self, **kwargs):
         """
         Return a list of known objects whose attributes fit the filters.
@@ -698,19 +908,19 @@ class World(object):
                 A list of ``WorldObject`` subclasses which match the filter kwargs
                 given.
         """
-        knownObjs = self.objects
-        filteredObjs = []
-        for obj in knownObjs:
-            for attrib in kwargs:
-                try:
-                    valid = eval("obj.{}".format(attrib)) == kwargs[attrib]
-                except AttributeError:
-                    valid = False
-                if not valid:
-                    break
-            if valid:
-                filteredObjs.append(obj)
-        return filteredObjs
+        return list(self.iter_objects(**kwargs))
+
+    def iter_objects(self, **kwargs):
+        """
+        Yield the objects whose attributes fit the filters, one at a time.
+
+        This takes the same filters as ``filter_objects``, but produces the
+        matching objects lazily instead of building a list, which is cheaper
+        when only the first few matches (or just whether there are any) are
+        needed. The filters are answered from the ``World``'s object index
+        where possible (see :py:meth:`~world_index.ObjectIndex.query`).
+        """
+        return self.objectIndex.query(self.floor, kwargs)
 
     def add_user(self, name, location, vision, userType):
         """
@@ -757,6 +967,7 @@ class World(object):
             return False
         newUser = Agent(name, location, self.dim, vision, userType, self.bombRange)
         self.users[name] = newUser
+        self.user_moved(newUser)
         return newUser
 
     def get_user(self, userID):
@@ -780,22 +991,52 @@ class World(object):
 
     def user_at(self, loc):
         """Indicate whether there is a user at the location."""
-        for user in self.all_users:
-            if user.at == loc:
-                return True
-        return False
+        return self.get_user_at(loc) is not None
 
     def get_user_at(self, loc):
         """Return the user at the location, of None if there isn't one."""
-        if not self.user_at(loc):
-            return None
-
-        for user in self.all_users:
-            if user.at == loc:
+        for userID in self.userLocs.get(loc, ()):
+            user = self.users.get(userID)
+            if user is not None and user.at == loc:
                 return user
+        return None
+
+    def user_moved(self, user):
+        """
+        Record that `user` was added to the ``World`` or changed location.
+
+        ``userLocs`` maps each location to the IDs of the users on it, so that
+        ``user_at`` and ``get_user_at`` don't have to look at every user, and
+        ``userTiles`` remembers where each user was last recorded. Anything
+        which adds a user or changes a user's ``at`` must call this (the
+        ``World`` methods and ``Agent.move`` do). Lookups also check that the
+        user is really still there, so a stale entry is never returned. The
+        user's new location is also folded into the ``World``'s
+        :py:attr:`fingerprint`.
+
+        Arguments:
+            ``user``, *Agent*:
+                The user (agent or operator) which was added or moved.
+        """
+        oldLoc = self.userTiles.get(user.id)
+        if oldLoc is not None:
+            userIDs = self.userLocs.get(oldLoc, [])
+            if user.id in userIDs:
+                userIDs.remove(user.id)
+            if not userIDs:
+                self.userLocs.pop(oldLoc, None)
+        self.userLocs.setdefault(user.at, []).append(user.id)
+        self.userTiles[user.id] = user.at
+        self.zobrist.user_moved(user)
 
     def place_object(self, objType, location, **kwargs):
-        """Place a new object of the given type at the location, if possible."""
+        """
+        Place a new object of the given type at the location, if possible.
+
+        The keyword arguments are passed to :py:func:`make_object`. In
+        particular, a ``serial`` may be passed to give the new object an
+        existing serial; otherwise a new one is allocated.
+        """
         if not self.loc_valid(location):
             raise Exception("{} is not a valid place for {}".format(location, objType))
 
@@ -804,63 +1045,65 @@ class World(object):
                 # print("{} is already occupied by a large object".format(location))
                 return False
 
-        if objType == WALL:
-            obj = Wall(location)
-        elif objType == CHEST:
-            if 'contains' in kwargs:
-                contains = kwargs['contains']
-                obj = Chest(location, contains)
-            else:
-                obj = Chest(location)
-        elif objType == DOOR:
-            obj = Door(location)
-        elif objType == KEY:
-            if 'unlocks' in kwargs:
-                unlocks = kwargs['unlocks']
-                obj = Key(location, unlocks)
-            else:
-                obj = Key(location)
-        elif objType == COIN:
-            value = kwargs['value']
-            obj = Coin(location, value)
-        elif objType == FIRE:
-            damage = kwargs['damage']
-            obj = Fire(location, damage)
-        elif objType == TRAP:
-            damage = kwargs['damage']
-            obj = Trap(location, damage)
-        elif objType == NPC:
-            civi = kwargs['civi']
-            obj = Npc(location, civi)
-        else:
-            raise NotImplementedError(objType)
+        return self.put_object(make_object(objType, location, **kwargs))
+
+    def put_object(self, obj):
+        """
+        Put an object which has already been made on its tile, if possible.
+
+        This follows the same rules as :py:meth:`place_object`: only one large
+        object (anything but a key or coin) may be on a tile, and False is
+        returned if there is already one there.
+        """
+        location = obj.location
+        if not self.loc_valid(location):
+            raise Exception("{} is not a valid place for {}".format(location, obj.objType))
+
+        if obj.objType in [CHEST, DOOR, WALL, TRAP, FIRE, NPC]:
+            if not self.loc_is_free(location):
+                return False
 
+        self.own_tile(location)
         if location in self.floor:
             self.floor[location].append(obj)
         else:
             self.floor[location] = [obj]
+        self.tile_changed(location)
 
         self.log.info("Placed object {}".format(obj))
         return obj
 
     def remove_object(self, objID):
-        """Remove the given object from the map."""
-        for obj in self.objects:
-            if repr(obj) == objID:
-                break
+        """Remove the object whose ``repr`` is `objID` from the map."""
+        obj = self.objectIndex.with_repr(self.floor, objID)
+        if obj is None:
+            print("Object {} not found".format(objID))
+            return False
         self.remove_object_at(obj.objType, obj.location)
 
     def add_object(self, obj):
-        """Add the given object to the map. Does NOT pay attention to spacing rules."""
+        """
+        Add the given object to the map. Does NOT pay attention to spacing rules.
+
+        If a copy of the object (i.e. an object with the same serial) is already
+        on its tile, the copy is replaced, so the map holds the newer state.
+        """
         if not isinstance(obj, WorldObject):
             raise Exception("obj {} should be a WorldObject, but is {}".format(obj, type(obj)))
         objLoc = obj.location
+        self.own_tile(objLoc)
         if objLoc in self.floor:
-            if obj in self.floor[objLoc]:
-                return
-            self.floor[objLoc].append(obj)
+            contents = self.floor[objLoc]
+            if obj in contents:
+                index = contents.index(obj)
+                if contents[index].same_state(obj):
+                    return
+                contents[index] = obj
+            else:
+                contents.append(obj)
         else:
             self.floor[objLoc] = [obj]
+        self.tile_changed(objLoc)
         self.log.info("Added {}".format(obj))
 
     def remove_object_at(self, objType, loc):
@@ -868,9 +1111,10 @@ class World(object):
         if not self.loc_valid(loc):
             print("{} is not a valid location".format(loc))
             return False
-        if loc not in self.floor.keys():
+        if loc not in self.floor:
             print("There's no object at {}".format(loc))
             return False
+        self.own_tile(loc)
         remove_index = -1
         for obj in self.floor[loc]:
             if obj.objType == objType:
@@ -882,6 +1126,7 @@ class World(object):
         del self.floor[loc][remove_index]
         if len(self.floor[loc]) == 0:
             del self.floor[loc]
+        self.tile_changed(loc)
 
         self.log.info("Removed obj {}".format(obj))
         return True
@@ -896,9 +1141,11 @@ class World(object):
             print("Can't move the agent to {}".format(dest))
             return False
         user.at = dest
+        self.user_moved(user)
+        user.map.user_moved(user)
 
         self.log.info("Teleported agent {} to {}".format(user, dest))
-        self.eventLog += "Teleported agent {} to {}".format(user, dest)
+        self.events.record(self.tick, user.id, world_events.TELEPORT, dest, True)
         return True
 
     def move_agent(self, moveDir, userID):
@@ -924,14 +1171,16 @@ class World(object):
 
         self.take_damage(dest, userID)
         user.move(moveDir)
+        self.user_moved(user)
 
         self.log.info("Agent {} moved {} to {}".format(user, moveDir, dest))
-        self.eventLog += "Agent {} moved {} to {}\n".format(user, moveDir, dest)
+        self.events.record(self.tick, user.id, world_events.MOVE, moveDir, dest)
         return True
 
     def take_damage(self, loc, userID):
         damageDealt = 0
         if loc in self.floor:
+            self.own_tile(loc)
             for obj in self.floor[loc]:
                 try:
                     damageDealt += obj.damage
@@ -940,6 +1189,7 @@ class World(object):
 
                 if obj.objType == TRAP and obj.hidden:
                     obj.hidden = False
+                    self.tile_changed(loc)
         self.users[userID].take_damage(damageDealt)
 
     def agent_take_key(self, keyLoc, userID):
@@ -947,7 +1197,7 @@ class World(object):
         if not self.loc_valid(keyLoc):
             raise ValueError("{} is not a valid location".format(keyLoc))
 
-        if keyLoc not in self.floor.keys():
+        if keyLoc not in self.floor:
             print("Key location {} not in floor.keys()".format(keyLoc))
             return False
 
@@ -957,6 +1207,7 @@ class World(object):
             print("Agent at {} not adjacent or on key location {}".format(user.at, keyLoc))
             return False
 
+        self.own_tile(keyLoc)
         key = self.get_item_at(keyLoc, KEY)
         if key:
             self.remove_object_at(KEY, keyLoc)
@@ -973,7 +1224,7 @@ class World(object):
         if not self.loc_valid(coinLoc):
             raise ValueError("{} is not a valid location".format(coinLoc))
 
-        if coinLoc not in self.floor.keys():
+        if coinLoc not in self.floor:
             print("Coin location {} not in floor.keys()".format(coinLoc))
             return False
 
@@ -1002,7 +1253,7 @@ class World(object):
         if not self.loc_valid(target):
             raise ValueError("{} is not a valid location".format(target))
 
-        if target not in self.floor.keys():
+        if target not in self.floor:
             print("Unlock target location {} not in floor.keys()".format(target))
             return False
 
@@ -1012,11 +1263,13 @@ class World(object):
             print("Agent at {} not adjacent to target location {}".format(user.at, target))
             return False
 
+        self.own_tile(target)
         for obj in self.floor[target]:
             if obj.locked and user.can_unlock(obj):
                 obj.locked = False
                 if obj.objType == DOOR:
                     obj.passable = True
+                self.tile_changed(target)
                 user.unlock(target)
                 self.log.info("Agent {} unlocked {}".format(user, obj))
                 return True
@@ -1032,23 +1285,78 @@ class World(object):
         killed = self.bombed_at(target)
         user.bomb()
         self.log.info("Agent {} bombed {}, killing {}".format(user, target, killed))
-        self.eventLog += "Agent {} bombed {}, killing {}\n".format(user, target, killed)
+        self.events.record(self.tick, user.id, world_events.BOMB, target, killed)
         return killed
 
     def bombed_at(self, target):
-        """Detonate a bomb at the target location."""
+        """
+        Detonate a bomb at the target location.
+
+        If the occupancy grid (see :py:class:`~world_grids.OccupancyGrid`) has
+        been built, the tiles in the blast with living NPCs on them are read
+        from it; otherwise, the grid isn't built just for one bomb, and every
+        tile in the blast is looked at to find them. Either way, only those
+        tiles are changed, and they are visited in order of x and then y.
+        """
         killed = 0
-        surroundingObjs = self.get_objects_around(target, self.bombRange, makeCopy=False)
-        for loc in surroundingObjs:
-            for obj in surroundingObjs[loc]:
+        if self.occupancy.stale:
+            tiles = [loc for loc in world_vision.window_tiles(target, self.bombRange, self.dim)
+                     if any(obj.objType == NPC and obj.alive for obj in self.floor.get(loc, ()))]
+        else:
+            tiles = self.occupancy.npc_tiles(self.floor, target, self.bombRange)
+        for loc in tiles:
+            self.own_tile(loc)
+            for obj in self.floor[loc]:
                 if obj.objType == NPC and obj.alive:
                     killed += 1
                     obj.alive = False
                     obj.passable = True
                     self.log.info("Bomb at {} killed {}".format(target, obj))
-                    self.eventLog += "\tBomb at {} killed {}\n".format(target, obj)
+                    self.events.record(self.tick, None, world_events.KILL, target, repr(obj))
+            self.tile_changed(loc)
         return killed
 
+    def npcs_in_blast(self, loc, civi=None):
+        """
+        Return a list of the living NPCs a bomb at `loc` would kill.
+
+        Arguments:
+            ``loc``, *tuple*:
+                Where the bomb would go off.
+
+            ``civi``, *bool*:
+                If given, only civilians (True) or enemies (False) are
+                returned.
+
+            ``return``, *list*:
+                The NPCs themselves, not copies, in order of their tiles.
+        """
+        layer = {None: 'objects', True: 'civilians', False: 'enemies'}[civi]
+        npcs = []
+        for objLoc in self.occupancy.tiles_in(self.floor, layer, loc, self.bombRange):
+            npcs.extend(obj for obj in self.floor[objLoc]
+                        if obj.objType == NPC and obj.alive and (civi is None or obj.civi == civi))
+        return npcs
+
+    def blast_preview(self, centres=None):
+        """
+        Return how many NPCs, and how many civilians, bombs at `centres` would kill.
+
+        Every centre is worked out at once from the occupancy grid (see
+        :py:meth:`~world_grids.OccupancyGrid.blast_counts`), so hundreds of
+        candidate tiles cost little more than one.
+
+        Arguments:
+            ``centres``, *list*:
+                The tiles to consider bombing, or None for every tile.
+
+            ``return``, *tuple*:
+                A pair of integer arrays, ``(kills, civilians)``: 1D arrays in
+                the order of `centres`, or ``dim`` x ``dim`` arrays indexed
+                ``[x, y]`` if `centres` is None.
+        """
+        return self.occupancy.blast_counts(self.floor, self.bombRange, centres)
+
     def unlock(self, target, key=None):
         """Unlock anything locked at the target location."""
         if not self.loc_valid(target):
@@ -1058,34 +1366,92 @@ class World(object):
             print("Nothing to unlock at {}".format(target))
             return False
 
+        self.own_tile(target)
         for obj in self.floor[target]:
             if obj.objType in [DOOR, CHEST]:
                 if key:
                     obj.passable = key.unlocks == obj
                 else:
                     obj.passable = True
+        self.tile_changed(target)
 
     def get_objects_around(self, loc, vRange, includeHidden=False, makeCopy=True):
-        """Return the objects and their properties around a location."""
+        """
+        Return the objects and their properties around a location.
+
+        If the ``World`` is in line-of-sight mode (``lineOfSight`` is True),
+        only the tiles which can be seen from `loc` are included (see
+        :py:meth:`visible_tiles`); otherwise every tile within `vRange` is.
+        """
         objects = {}
         if vRange == -1:
             return self.floor
-        northBound = max(loc[1] - vRange, 0)
-        southBound = min(loc[1] + vRange, self.dim)
-        westBound = max(loc[0] - vRange, 0)
-        eastBound = min(loc[0] + vRange, self.dim)
+        if self.lineOfSight:
+            tiles = self.visible_tiles(loc, vRange)
+        else:
+            tiles = world_vision.window_tiles(loc, vRange, self.dim)
 
-        for x in range(westBound, eastBound+1):
-            for y in range(northBound, southBound+1):
-                vLoc = (x, y)
-                if vLoc in self.floor.keys():
-                    viewedObjs = [obj for obj in self.floor[vLoc] if not (obj.objType == TRAP and obj.hidden and not includeHidden)]
-                    if makeCopy:
-                        objects[vLoc] = deepcopy(viewedObjs)
-                    else:
-                        objects[vLoc] = viewedObjs
+        for vLoc in tiles:
+            if vLoc in self.floor:
+                viewedObjs = [obj for obj in self.floor[vLoc] if not (obj.objType == TRAP and obj.hidden and not includeHidden)]
+                if makeCopy:
+                    objects[vLoc] = deepcopy(viewedObjs)
+                else:
+                    objects[vLoc] = viewedObjs
+        return objects
+
+    def visible_tiles(self, loc, vRange):
+        """
+        Return the set of tiles which can be seen from `loc`, in line-of-sight mode.
+
+        Walls and closed doors block sight, and can themselves be seen. The
+        field of view is found by shadowcasting (see
+        :py:func:`~world_vision.shadowcast`) and cached per `loc` and `vRange`
+        until a tile starts or stops blocking sight (see
+        :py:class:`~world_vision.FieldOfView`).
+
+        Arguments:
+            ``loc``, *tuple*:
+                The tile looked from.
+
+            ``vRange``, *int*:
+                How far can be seen, in x and y.
+
+            ``return``, *frozenset*:
+                The tiles seen, including `loc`. Don't change it, since it is
+                shared with the cache.
+        """
+        grid = self.occupancy.layers(self.floor)
+        return self.fieldOfView.visible(loc, vRange, grid.opaque, grid.sightVersion)
+
+    def view_objects(self, loc, vRange, includeHidden=False):
+        """
+        Return the objects around a location, as they are now, without copying them.
+
+        This is ``get_objects_around`` without the deep copy: the objects
+        returned are the ``World``'s own, and the tiles they are on are marked
+        as shared (see :py:meth:`share_tiles`), so the ``World`` copies a
+        tile's objects before it next changes them and the objects returned
+        keep the state they were seen in. Whoever keeps them has to do the
+        same before changing them, as :py:meth:`WorldMap.update_map` does. The
+        cost is proportional to the number of objects seen.
+        """
+        objects = self.get_objects_around(loc, vRange, includeHidden, makeCopy=False)
+        if objects is self.floor:
+            objects = dict(self.floor)
+        self.share_tiles(objects)
         return objects
 
+    def share_tiles(self, tiles):
+        """
+        Mark `tiles` as shared with another ``World`` or ``WorldMap``.
+
+        The objects on a shared tile are copied by :py:meth:`own_tile` before
+        they are next changed, so whoever they are shared with doesn't see the
+        change.
+        """
+        self.sharedTiles.update(tiles)
+
     def get_users_around(self, loc, vRange):
         """Return the users around a location."""
         users = {}
@@ -1099,9 +1465,10 @@ class World(object):
         for x in range(westBound, eastBound+1):
             for y in range(northBound, southBound+1):
                 vLoc = (x, y)
-                if self.user_at(vLoc):
-                    user = self.get_user_at(vLoc)
-                    users[user.__name__] = user
+                for userID in self.userLocs.get(vLoc, ()):
+                    user = self.users.get(userID)
+                    if user is not None and user.at == vLoc:
+                        users[user.__name__] = user
 
         return users
 
@@ -1109,7 +1476,7 @@ class World(object):
         """Return the item of `objType` at `loc`, if there is one."""
         if not self.loc_valid(loc):
             raise ValueError("{} is not a valid location".format(loc))
-        if loc not in self.floor.keys():
+        if loc not in self.floor:
             return False
         for obj in self.floor[loc]:
             if obj.objType == objType:
@@ -1121,7 +1488,7 @@ class World(object):
         if self.user_at(loc):
             return True
 
-        if loc not in self.floor.keys():
+        if loc not in self.floor:
             return True
 
         contents = self.floor[loc]
@@ -1132,13 +1499,129 @@ class World(object):
                 return False
         return True
 
+    def tile_blocked(self, loc, doorsOpen=False):
+        """
+        Indicate whether the objects on `loc` make it impassable.
+
+        This is the same test as ``check_passable``, except that users are
+        ignored: it only looks at the objects on the floor.
+        """
+        for obj in self.floor.get(loc, []):
+            if not obj.passable:
+                return not (obj.objType == DOOR and doorsOpen)
+        return False
+
+    def tile_changed(self, loc):
+        """
+        Update the ``World``'s bookkeeping after the contents of `loc` changed.
+
+        Every method which adds, removes, or alters objects on a tile calls
+        this afterwards, so that anything derived from the floor can be kept
+        up to date without rescanning it. Here, that means the change journal,
+        the object index, the :py:attr:`fingerprint`, the sets of blocked tiles
+        (one with doors closed, one with doors open), the connected components
+        used by ``reachable``, the civilian counts used by
+        ``civilians_in_blast``, the occupancy grid used by ``passable_mask``
+        and ``obstacles_in``, and ``passVersion``, which counts how many times
+        the passability of a tile has changed.
+
+        Each of these indexes is built from the floor the first time it is
+        needed, rather than when the ``World`` is made or loaded, and is then
+        kept up to date here (and, for the fingerprint, in
+        :py:meth:`user_moved`). Their data is dropped when the ``World`` is
+        pickled or copied, so it never travels between the server and the
+        agents, and is rebuilt on the other side if it is used there.
+
+        Arguments:
+            ``loc``, *tuple*:
+                The location whose contents changed.
+
+            ``return``, *list*:
+                A ``(doorsOpen, blocked)`` pair for each door setting under
+                which the passability of `loc` changed, where ``blocked``
+                indicates whether the tile is now impassable.
+        """
+        contents = self.floor.get(loc, [])
+        self.journal.tile_changed(loc, contents, self.tick)
+        self.objectIndex.tile_changed(loc, contents)
+        self.zobrist.tile_changed(loc, contents)
+        self.civilianGrid.tile_changed(loc, contents)
+        self.occupancy.tile_changed(loc, contents)
+        changes = []
+        for doorsOpen in (False, True):
+            blocked = self.tile_blocked(loc, doorsOpen)
+            blockedSet = self.blockedTiles[doorsOpen]
+            if blocked == (loc in blockedSet):
+                continue
+            if blocked:
+                blockedSet.add(loc)
+            else:
+                blockedSet.discard(loc)
+            self.components[doorsOpen].tile_changed(loc, blocked, blockedSet)
+            changes.append((doorsOpen, blocked))
+        if changes:
+            self.passVersion += 1
+        return changes
+
+    def civilians_in_blast(self, loc):
+        """
+        Return the number of living civilians a bomb at `loc` would kill.
+
+        This is read from a grid of blast counts which is kept up to date as
+        tiles change (see :py:class:`~world_grids.CivilianGrid`), so it doesn't
+        look at the tiles around `loc` at all.
+        """
+        return self.civilianGrid.civilians_in_blast(self.floor, loc)
+
+    def safe_bomb_tiles(self):
+        """
+        Return a mask of the tiles where a bomb wouldn't kill any civilians.
+
+        Arguments:
+            ``return``, *numpy.ndarray*:
+                A ``dim`` x ``dim`` boolean array indexed ``[x, y]``. It is
+                updated in place as the world changes, so copy it if it needs
+                to be kept.
+        """
+        return self.civilianGrid.safe_tiles(self.floor)
+
+    def reachable(self, origin, dest, doorsOpen=False, adjacent=False):
+        """
+        Indicate whether a path exists from `origin` to `dest`.
+
+        This gives the same answer as checking whether ``navigate_to`` finds a
+        path, but looks it up in a labelling of the connected components of the
+        map (see :py:class:`~world_paths.Components`) instead of searching, so
+        it is cheap even when there is no path.
+
+        Arguments:
+            ``origin``, *tuple*:
+                Where the path would start.
+
+            ``dest``, *tuple*:
+                Where the path would end.
+
+            ``doorsOpen``, *bool*:
+                If True, doors are not treated as obstacles.
+
+            ``adjacent``, *bool*:
+                If True, it is enough to reach a tile next to `dest`, so `dest`
+                may hold something impassable, like an NPC or a locked door.
+
+            ``return``, *bool*:
+                Whether `dest` (or a tile next to it) can be reached.
+        """
+        return self.components[doorsOpen].connected(origin, dest,
+                                                    self.blockedTiles[doorsOpen],
+                                                    adjacent)
+
     def loc_is_free(self, loc):
         """
         Indicate whether the location can hold non-trivial object.
 
         Trivial objects as yet are coins and keys
         """
-        if loc not in self.floor.keys():
+        if loc not in self.floor:
             return True
 
         for obj in self.floor[loc]:
@@ -1154,7 +1637,7 @@ class World(object):
         """Indicate whether there is an unlocked object at the given location."""
         if not self.loc_valid(loc):
             raise Exception("{} is not a valid location".format(loc))
-        if loc not in self.floor.keys():
+        if loc not in self.floor:
             return True
         unlocked = True
         for obj in self.floor[loc]:
@@ -1170,7 +1653,7 @@ class World(object):
             tileStr += self.get_user_at(loc).ascii_rep
 
         # If the tile has contents, draw them
-        if loc in self.floor.keys():
+        if loc in self.floor:
             for obj in self.floor[loc]:
                 tileStr += obj.ascii_rep
 
@@ -1216,7 +1699,7 @@ class World(object):
             agent = self.get_user(userID)
             agent.arm()
             self.log.info("Agent {} armed to {}".format(userID, agent.armed))
-            self.eventLog += "Agent {} armed to {}\n".format(userID, agent.armed)
+            self.events.record(self.tick, userID, world_events.ARM, None, agent.armed)
             return True
 
         else:
@@ -1311,37 +1794,111 @@ class World(object):
 
     def get_object(self, objID):
         """Return the object with the given ID, if there is one."""
-        for obj in self.objects:
-            if obj.id == objID:
-                return obj
-
-        print("Item with objID {} not found".format(objID))
-        return None
+        obj = self.objectIndex.with_id(self.floor, objID)
+        if obj is None:
+            print("Item with objID {} not found".format(objID))
+        return obj
 
     def obstacles_in(self, path, doorsOpen=False):
-        """Calculate and return number of obstacles in a given path."""
-        obstacles = 0
-        for tile in path:
-            if not self.check_passable(tile, doorsOpen):
-                obstacles += 1
-        return obstacles
+        """
+        Calculate and return number of obstacles in a given path.
+
+        Only the tiles in the set of blocked tiles are checked for users, which
+        make a tile passable. (For a path, looking tiles up in this set is
+        cheaper than indexing the occupancy grid; the grid pays off for
+        questions about whole regions, see ``passable_mask``.)
+        """
+        blocked = self.blockedTiles[doorsOpen]
+        return sum(1 for tile in path if tile in blocked and not self.user_at(tile))
+
+    def user_tiles(self):
+        """Return a list of the tiles with users on them."""
+        return [user.at for user in self.users.values()]
+
+    def passable_mask(self, doorsOpen=False):
+        """
+        Return a mask of the passable tiles, as ``check_passable`` sees them.
+
+        Arguments:
+            ``doorsOpen``, *bool*:
+                If True, doors are not treated as obstacles.
+
+            ``return``, *numpy.ndarray*:
+                A new ``dim`` x ``dim`` boolean array indexed ``[x, y]``.
+        """
+        return self.occupancy.passable(self.floor, self.user_tiles(), doorsOpen)
+
+    def free_mask(self):
+        """
+        Return a mask of the tiles which ``loc_is_free`` would accept.
+
+        Arguments:
+            ``return``, *numpy.ndarray*:
+                A new ``dim`` x ``dim`` boolean array indexed ``[x, y]``.
+        """
+        mask = ~self.occupancy.layers(self.floor).occupied
+        for loc in self.user_tiles():
+            # loc_is_free only looks for users on tiles in the floor dict
+            if loc in self.floor:
+                mask[loc] = False
+        return mask
+
+    def occupied_tiles_near(self, loc, radius):
+        """Return a list of the tiles within `radius` of `loc` (in both x and y) which hold objects."""
+        return self.occupancy.occupied_tiles(self.floor, loc, radius)
+
+    def count_near(self, layer, loc, radius):
+        """
+        Count something on the tiles within `radius` of `loc`, in both x and y.
+
+        Arguments:
+            ``layer``, *str*:
+                The layer of the occupancy grid to sum (see
+                :py:data:`~world_grids.LAYERS`), e.g. ``'enemies'`` for the
+                number of living enemies or ``'walls'`` for the number of
+                walls.
+
+            ``loc``, *tuple*:
+                The centre of the square of tiles.
+
+            ``radius``, *int*:
+                How far the square extends from `loc`.
+
+            ``return``, *int*:
+                The sum of ``layer`` over the square, clipped to the map.
+        """
+        return self.occupancy.count_in(self.floor, layer, loc, radius)
 
     def diff(self, other):
-        """Return a dict of tiles which have changed."""
+        """
+        Return a dict of tiles which have changed.
+
+        If one world is a copy of the other, only the tiles changed in either
+        since the copy was made are compared (see :py:mod:`world_journal`).
+        Otherwise, only the tiles whose keys in the two worlds' fingerprints
+        differ (see :py:mod:`world_hashing`) are compared, rather than every
+        tile.
+        """
         if self == other:
             return None
 
         diffs = {}
-
-        for tile in self.all_locations:
-            if tile in self.floor.keys():
-                if tile in other.floor.keys():
-                    if self.floor[tile] != other.floor[tile]:
+        changed = self.journal.tiles_differing(other.journal)
+        if changed is None:
+            tileKeys = self.zobrist.tile_keys(self.floor, self.users)
+            otherKeys = other.zobrist.tile_keys(other.floor, other.users)
+            changed = set(tile for tile in tileKeys if tileKeys[tile] != otherKeys.get(tile))
+            changed.update(tile for tile in otherKeys if tile not in tileKeys)
+
+        for tile in changed:
+            if tile in self.floor:
+                if tile in other.floor:
+                    if not same_contents(self.floor[tile], other.floor[tile]):
                         diffs[tile] = (self.floor[tile], other.floor[tile])
                 else:
                     diffs[tile] = (self.floor[tile], None)
             else:
-                if tile in other.floor.keys():
+                if tile in other.floor:
                     diffs[tile] = (None, other.floor[tile])
 
         return diffs
@@ -1474,120 +2031,119 @@ class World(object):
         return True
 
     def midca_state_str(self):
-        """Return a string which MIDCA can interpret as a state."""
-
-        def gen_user_decls(self):
-            retStr = ""
-            for agt in self.agents:
-                retStr += "AGENT({}:{})\n".format(agt.id, agt.vision)
-
-            for opr in self.operators:
-                retStr += "OPERATOR({}:{})\n".format(opr.id, opr.vision)
-            return retStr
-
-        def gen_object_decls(self):
-            """Return a string declaring the objects in domain language."""
-            retStr = ""
-            for obj in self.objects:
-                retStr += "{}({})\n".format(obj.objType, obj.id)
-            return retStr
-
-        def gen_tile_decls(self):
-            """Return a string declaring all tiles."""
-            retStr = ""
-            for loc in self.all_locations:
-                retStr += "TILE(Tx{}y{})\n".format(loc[0], loc[1])
-            return retStr
-
-        def gen_tile_adjs(self):
-            """Return a string declaring all tile adjacencies."""
-            retStr = ""
-            for loc in self.all_locations:
-                nborDict = self.get_adjacent(loc)
-                for nborDir in nborDict:
-                    fullDir = DIRECTON_EXPANSIONS[nborDir]
-                    nborLoc = nborDict[nborDir]
-                    retStr += "adjacent-{}(Tx{}y{}, Tx{}y{})\n".format(fullDir,
-                                                                       loc[0], loc[1],
-                                                                       nborLoc[0], nborLoc[1])
-                    retStr += "adjacent(Tx{}y{}, Tx{}y{})\n".format(loc[0], loc[1],
-                                                                    nborLoc[0], nborLoc[1])
-            return retStr
-
-        def gen_obj_location_preds(self):
-            """Return a string of predicates which indicate where objects are."""
-            retStr = ""
-            for obj in self.objects:
-                retStr += "{}-at({}, Tx{}y{})\n".format(obj.objType.lower(),
-                                                        obj.id,
-                                                        obj.location[0],
-                                                        obj.location[1])
-            return retStr
-
-        def gen_tile_preds(self):
-            """Return a string with status predicates for each tile."""
-            retStr = ""
-            for loc in self.all_locations:
-                if self.check_passable(loc):
-                    retStr += "passable(Tx{}y{})\n".format(loc[0], loc[1])
-                # if self.agent.can_see(loc):
-                #     retStr += "visible(Tx{}y{})\n".format(loc[0], loc[1])
-            return retStr
-
-        def gen_object_preds(self):
-            """Return a string with all appropriate predicates relation to objects."""
-            retStr = ""
-            for obj in self.objects:
-                retStr += obj.predicates
-            return retStr
-
-        def gen_user_preds(self):
-            retStr = ""
-            for user in self.all_users:
-                usrType = "operator" if user.userType == OPERATOR else "agent"
-            retStr += "{}-at({}:{}, Tx{}y{})".format(usrType, user.id, user.vision,
-                                                     user.at[0], user.at[1])
-            return retStr
-
-        retStr = "DIM({})\n".format(self.dim)
-
-        retStr += "\n# User declarations\n"
-        retStr += gen_user_decls(self)
-
-        retStr += "\n# Tile declarations\n"
-        retStr += gen_tile_decls(self)
-
-        retStr += "\n# Object declarations\n"
-        retStr += gen_object_decls(self)
-
-        retStr += "\n# Tile adjacency predicates\n"
-        retStr += gen_tile_adjs(self)
-
-        retStr += "\n# Object location predicates\n"
-        retStr += gen_obj_location_preds(self)
-
-        retStr += "\n# Tile status predicates\n"
-        retStr += gen_tile_preds(self)
-
-        retStr += "\n# User predicates\n"
-        retStr += gen_user_preds(self)
-
-        retStr += "\n# Other object predicates\n"
-        retStr += gen_object_preds(self)
+        """
+        Return a string which MIDCA can interpret as a state.
 
-        return retStr
+        The string is built by joining the pieces yielded by
+        :py:func:`world_state.state_chunks`, which caches the parts of the state
+        which only depend on ``dim``. Use :py:meth:`write_midca_state` to write
+        the state to a file without building the string.
+        """
+        return "".join(world_state.state_chunks(self))
+
+    def write_midca_state(self, stateFile):
+        """Write the MIDCA state of the ``World`` to the open file ``stateFile``."""
+        world_state.write_state(self, stateFile)
+
+    def predicate_feed(self):
+        """
+        Return a feed of the changes to the ``World``'s MIDCA state from now on.
+
+        Each call to the feed's :py:meth:`~world_state.PredicateFeed.delta`
+        returns the predicates added to and deleted from the state since the
+        last call (or since the feed was made), so a planner can keep its copy
+        of the state up to date without the whole state being generated again.
+        See :py:class:`world_state.PredicateFeed`.
+        """
+        return world_state.PredicateFeed(self)
 
     def random_loc(self):
         x = randint(0, self.dim-1)
         y = randint(0, self.dim-1)
         return (x, y)
 
-    def copy(self):
-        """Return a new ``World`` object identical to this one."""
-        newWorld = build_World_from_str(repr(self))
-        newWorld.log = self.log
+    def copy(self, copyOnWrite=False):
+        """
+        Return a new ``World`` object identical to this one.
+
+        The floor, users and objects are cloned directly (see
+        :py:meth:`WorldObject.clone`), so references between objects, the
+        users' keys and maps, and state which ``repr`` doesn't include, such as
+        ``bombRange`` and ``scoreSeries``, are all kept. The indexes are not
+        copied; the new ``World`` rebuilds them when they are first needed.
+        The users are cloned separately from the floor, and each map's objects
+        separately from the rest (see :py:meth:`WorldMap.clone`), so objects
+        an agent has seen, which may be shared with the ``World`` (see
+        :py:meth:`view_objects`), don't become the same objects in the copy.
+
+        If ``copyOnWrite`` is True, the objects on the floor aren't cloned.
+        Instead both worlds share each tile's list of objects until one of them
+        changes the tile, at which point that world takes its own copy of the
+        tile first (see :py:meth:`own_tile`). This makes copying a large world
+        cheap when each copy only changes a few tiles. Objects on different
+        tiles may then refer to different copies of each other, which is
+        harmless since objects are compared by ``serial``.
+
+        Arguments:
+            ``copyOnWrite``, *bool*:
+                Whether to share the floor's tiles until they are changed.
+
+            ``return``, *World*:
+                The copy.
+        """
+        # Making a World resets the user numbering, which copying shouldn't
+        counts = (Agent.agentCount, Agent.operatorCount)
+        newWorld = World(self.dim, self.bombRange, self.log)
+        Agent.agentCount, Agent.operatorCount = counts
+        if copyOnWrite:
+            newWorld.floor = dict(self.floor)
+            self.sharedTiles.update(self.floor)
+            newWorld.sharedTiles = set(self.floor)
+        else:
+            newWorld.floor = clone_floor(self.floor, {})
+        self.copy_state_into(newWorld, {})
         return newWorld
 
+    def copy_state_into(self, other, memo):
+        """
+        Copy everything but the floor and the indexes into ``other``.
+
+        The users are cloned with ``memo``, and the records of where they are,
+        which tiles are blocked, the event log and the score series are copied.
+        ``other`` is given a journal forked from this one, so that the two can
+        be diffed by what changed since. Used by :py:meth:`copy` and
+        :py:meth:`WorldMap.clone`.
+        """
+        other.users = dict((name, user.clone(memo))
+                           for name, user in self.users.items())
+        other.userLocs = dict((loc, list(ids)) for loc, ids in self.userLocs.items())
+        other.userTiles = dict(self.userTiles)
+        other.blockedTiles = {False: set(self.blockedTiles[False]),
+                              True: set(self.blockedTiles[True])}
+        other.passVersion = self.passVersion
+        other.lineOfSight = self.lineOfSight
+        other.events = self.events.copy()
+        other.scoreSeries = list(self.scoreSeries)
+        other.journal = self.journal.fork()
+
+    def own_tile(self, loc):
+        """
+        Make sure the objects on ``loc`` belong to this ``World`` alone.
+
+        After a copy-on-write :py:meth:`copy`, a tile's list of objects is
+        shared by the two worlds. Every method which changes the objects on a
+        tile calls this first, and if the tile is still shared, it is replaced
+        by a copy of its objects, so the change is not seen by the other world.
+        This is also when the change journal notes what was on the tile before
+        the change.
+        """
+        self.journal.tile_touched(loc, self.floor.get(loc, ()))
+        if loc in self.sharedTiles:
+            self.sharedTiles.discard(loc)
+            if loc in self.floor:
+                self.floor[loc] = [copy(obj) for obj in self.floor[loc]]
+                self.objectIndex.tile_changed(loc, self.floor[loc])
+
     def save(self, filename):
         """
         Save the current world as a file.
@@ -1611,7 +2167,7 @@ class World(object):
         with open(filename, 'w') as saveFile:
             saveFile.write(repr(self))
         with open(filename+".state", 'w') as saveFile:
-            saveFile.write(self.MIDCA_state_str())
+            self.write_midca_state(saveFile)
         return True
 
     def __str__(self):
@@ -1638,15 +2194,31 @@ class World(object):
             ascii_board += "\n"
         return ascii_board
 
+    @property
+    def fingerprint(self):
+        """
+        Return a 64-bit fingerprint of the objects and users in the ``World``.
+
+        Two worlds with the same ``repr`` have the same fingerprint, and two
+        with different ``repr``\ s almost certainly don't, so the fingerprint
+        can be used as a cheap key for caches of plans or other results which
+        depend on the state of the ``World``. It is kept up to date as tiles
+        change and users move (see :py:mod:`world_hashing`), so it takes
+        constant time, apart from the first call after the ``World`` is made,
+        loaded or copied.
+        """
+        return self.zobrist.fingerprint(self.floor, self.users)
+
     def __eq__(self, other):
         """
         Check if two ``World`` objects are the equivalent.
 
         Since the string representation of a ``World`` encodes all relevant
         information concerning its status, if the representations of two ``World``
-        objects are equivalent, then the ``World`` objects are too. Thus, this
-        function compares the representations of this and another ``World`` for
-        equality and returns the result of that comparison.
+        objects are equivalent, then the ``World`` objects are too. Rather than
+        build and compare the representations, this function compares the
+        dimensions and :py:attr:`fingerprint`\ s of this and another ``World``,
+        which gives the same result in constant time.
 
         Arguments:
             ``other``, *World*:
@@ -1654,9 +2226,15 @@ class World(object):
 
             ``return``, *bool*:
                 A boolean value indicating whether this and the other ``World``
-                are equivalent.
+                are equivalent. Anything which isn't a ``World`` is never
+                equivalent to one.
         """
-        return repr(self) == repr(other)
+        return (isinstance(other, World) and self.dim == other.dim
+                and self.fingerprint == other.fingerprint)
+
+    def __ne__(self, other):
+        """Indicate whether this and another ``World`` are not equivalent."""
+        return not self == other
 
     def __repr__(self):
         """
@@ -1676,15 +2254,17 @@ class World(object):
 
         thereby encoding the size of the ``World``. Each line after that will
         contain the string representation (``repr``) of an object on the board.
+        Users are listed in order of their names and objects in order of their
+        serials, so the string for a given state is always the same.
 
         Arguments:
             ``return``, *str*:
                 A string representation of the ``World``.
         """
         retStr = "dim:{}\n".format(self.dim)
-        for user in self.all_users:
-            retStr += repr(user) + '\n'
-        for obj in self.objects:
+        for name in sorted(self.users):
+            retStr += repr(self.users[name]) + '\n'
+        for obj in sorted(self.objects, key=attrgetter('serial')):
             retStr += repr(obj) + '\n'
         return retStr
 
@@ -1705,9 +2285,49 @@ class WorldMap(World):
         self.bombRange = bombRange
         self.floor = {}
         self.users = {agent.id: agent}
+        self.userLocs = {agent.at: [agent.id]}
+        self.userTiles = {agent.id: agent.at}
         self.agent = agent
-        self.eventLog = ""
+        self.events = world_events.EventLog()
         self.log = DummyLog()
+        self.blockedTiles = {False: set(), True: set()}
+        self.passVersion = 0
+        self.components = {False: world_paths.Components(dim),
+                           True: world_paths.Components(dim)}
+        self.civilianGrid = world_grids.CivilianGrid(dim, bombRange)
+        self.occupancy = world_grids.OccupancyGrid(dim)
+        self.lineOfSight = False
+        self.fieldOfView = world_vision.FieldOfView()
+        self.objectIndex = world_index.ObjectIndex()
+        self.zobrist = world_hashing.ZobristHash()
+        self.journal = world_journal.ChangeJournal()
+        self.scoreSeries = []
+        self.sharedTiles = set()
+        self.pathCache = {}
+        self.pathCacheTiles = {}
+        self.pathCacheHits = 0
+        self.pathCacheMisses = 0
+        self.incremental = False
+        self.planners = OrderedDict()
+        self.distanceFields = {}
+        self.fieldsVersion = 0
+
+    def clone(self, agent, memo):
+        """
+        Return a copy of the map for ``agent``, which is a clone of its owner.
+
+        The users on the map are cloned with ``memo`` (see
+        :py:meth:`Agent.clone`), so they are the clones of the ``World``'s
+        users. The objects on the map are cloned on their own, since they may
+        be shared with the ``World`` and other maps (see
+        :py:meth:`World.view_objects`), and the clones mustn't be. As with
+        :py:meth:`World.copy`, the indexes and caches are not copied.
+        """
+        newMap = WorldMap(self.dim, self.bombRange, agent)
+        newMap.floor = clone_floor(self.floor, {})
+        self.copy_state_into(newMap, memo)
+        newMap.incremental = self.incremental
+        return newMap
 
     def teleport_agent(self, dest):
         """Override a method the map shouldn't do."""
@@ -1717,80 +2337,242 @@ class WorldMap(World):
         """Override a method the map shouldn't do."""
         raise NotImplementedError("A WorldMap can't generate itself!")
 
-    def update_map(self, viewedObjs, viewedUsrs, center, vRange, operator=False):
-        """Update the map based on what the Agent sees."""
-        northBound = max(center[1] - vRange, 0)
-        southBound = min(center[1] + vRange, self.dim)
-        westBound = max(center[0] - vRange, 0)
-        eastBound = min(center[0] + vRange, self.dim)
+    def update_map(self, viewedObjs, viewedUsrs, center, vRange, operator=False, visible=None):
+        """
+        Update the map based on what the Agent sees.
 
-        for x in range(westBound, eastBound+1):
-            for y in range(northBound, southBound+1):
-                vLoc = (x, y)
-                if vLoc in viewedObjs.keys():
-                    self.floor[vLoc] = viewedObjs[vLoc]
-                    del viewedObjs[vLoc]
-                else:
-                    if vLoc in self.floor.keys():
-                        del self.floor[vLoc]
+        The objects in ``viewedObjs`` may be shared with the ``World`` (see
+        :py:meth:`World.view_objects`), so the tiles they are put on are
+        marked as shared, and are copied before the map changes them.
+
+        If ``visible`` is given, it is the set of tiles the agent sees (in
+        line-of-sight mode, see :py:meth:`World.visible_tiles`), and only those
+        tiles are updated; tiles in range but out of sight are left as they
+        were last seen. Otherwise every tile within ``vRange`` is updated.
+        """
+        if visible is None:
+            visible = world_vision.window_tiles(center, vRange, self.dim)
+
+        for vLoc in visible:
+            if vLoc in viewedObjs:
+                # The old objects are replaced, not changed, so needn't be copied
+                self.sharedTiles.discard(vLoc)
+                self.own_tile(vLoc)
+                self.floor[vLoc] = viewedObjs[vLoc]
+                self.sharedTiles.add(vLoc)
+                del viewedObjs[vLoc]
+                self.tile_changed(vLoc)
+            else:
+                if vLoc in self.floor:
+                    self.sharedTiles.discard(vLoc)
+                    self.own_tile(vLoc)
+                    del self.floor[vLoc]
+                    self.tile_changed(vLoc)
 
         if operator:
             for objLoc in viewedObjs:
                 objs = viewedObjs[objLoc]
                 for obj in objs:
                     if obj.objType == NPC and not obj.civi:
+                        self.sharedTiles.discard(objLoc)
+                        self.own_tile(objLoc)
                         self.floor[objLoc] = viewedObjs[objLoc]
+                        self.sharedTiles.add(objLoc)
+                        self.tile_changed(objLoc)
 
         for user in viewedUsrs:
             self.users[user.id] = user
+            self.user_moved(user)
 
     def navigate_to(self, origin, dest, doorsOpen=False):
         """
-        Return a list of tiles which forms a path.
+        Return a path from ``origin`` to ``dest`` as a string of directions.
 
-        The returned path should be a sequence of locations such that each
-        location is adjacent to the last and is passable, the first location is
-        adjacent to the origin, and the last location is the destination. Uses
-        A* search. If doorsBlock is False, then doors are not treated as
+        The returned path is a string which starts with ``'o'`` (the origin)
+        followed by one of ``'n'``, ``'s'``, ``'e'`` or ``'w'`` for each step,
+        such that every tile stepped on is passable and the last one is the
+        destination. If there is no such path, ``None`` is returned. Uses A*
+        search (see :py:func:`~world_paths.astar_path`), so the path is always
+        a shortest one. If ``doorsOpen`` is True, then doors are not treated as
         obstacles.
+
+        Results are kept in ``pathCache``, so asking for the same path again
+        is free until a tile which could affect it changes (see
+        :py:meth:`tile_changed`). If ``incremental`` is True, paths which
+        aren't cached are found with :py:meth:`incremental_path` instead of
+        a fresh A* search.
+        """
+        key = (origin, dest, doorsOpen)
+        if key in self.pathCache:
+            self.pathCacheHits += 1
+            return self.pathCache[key]
+        self.pathCacheMisses += 1
+
+        if self.incremental:
+            path = self.incremental_path(origin, dest, doorsOpen)
+        else:
+            path = world_paths.astar_path(self, origin, dest, doorsOpen)
+        if len(self.pathCache) >= PATH_CACHE_SIZE:
+            self.clear_path_cache()
+        self.pathCache[key] = path
+        if path:
+            for tile in world_paths.path_tiles(origin, path):
+                self.pathCacheTiles.setdefault(tile, set()).add(key)
+        return path
+
+    def incremental_path(self, origin, dest, doorsOpen=False):
         """
-        explored = []
-        activeTiles = [('o', origin, 0)]  # priority queue of tiles to explore
+        Return a path like ``navigate_to``, repairing an earlier search if possible.
 
-        while len(activeTiles) > 0:
-            currNode = activeTiles.pop(0)
-            currPath = currNode[0]
-            currTile = currNode[1]
+        The map keeps a :py:class:`~world_paths.DStarLite` planner for each of
+        the last ``INCREMENTAL_PLANNERS`` destinations it was asked about. A
+        planner is told about every tile whose passability changes, so when
+        the agent asks for a path to the same destination again (usually from
+        a slightly different origin, after seeing a few new tiles) only the
+        part of the previous search those tiles affect is redone.
+        """
+        key = (dest, doorsOpen)
+        planner = self.planners.pop(key, None)
+        if planner is None:
+            planner = world_paths.DStarLite(dest, self.dim, doorsOpen)
+        self.planners[key] = planner
+        while len(self.planners) > INCREMENTAL_PLANNERS:
+            self.planners.popitem(last=False)
+        return planner.path(self, origin)
 
-            if currTile == dest:
-                return currPath
+    def distance_field(self, origin, doorsOpen=False):
+        """
+        Return the walking distance from ``origin`` to every reachable tile.
 
-            nbors = self.get_adjacent(currTile)
-            for nborDir in nbors:
-                nbor = nbors[nborDir]
-                if not self.check_passable(nbor, doorsOpen):
-                    continue
-                linPath = self.get_path_to(nbor, dest)
-                obstacles = self.obstacles_in(linPath, doorsOpen)
-                weight = len(linPath) + 2 * obstacles
-                newNode = (currPath+nborDir, nbor, weight)
-
-                exploredYet = False
-                for node in explored:
-                    if nbor == node[1]:
-                        exploredYet = True
-                        break
-                if not exploredYet:
-                    insertIndex = 0
-                    for tile in activeTiles:
-                        if tile[2] < weight:
-                            insertIndex += 1
-                        else:
-                            break
-                    activeTiles.insert(insertIndex, newNode)
-
-            explored.append(currNode)
-        return None
+        This lets many destinations be compared by their true distance from
+        one place at the cost of a single search, rather than one
+        ``navigate_to`` call each. Fields are cached until the passability of
+        any tile changes (i.e. until ``passVersion`` changes), so the caller
+        should not modify the returned dict.
+
+        Arguments:
+            ``origin``, *tuple*:
+                The location to measure distances from.
+
+            ``doorsOpen``, *bool*:
+                If True, doors are not treated as obstacles.
+
+            ``return``, *dict*:
+                A dict from each reachable location to the number of steps
+                needed to reach it. See :py:func:`~world_paths.distance_field`.
+        """
+        if self.fieldsVersion != self.passVersion:
+            self.distanceFields = {}
+            self.fieldsVersion = self.passVersion
+        key = (origin, doorsOpen)
+        if key not in self.distanceFields:
+            self.distanceFields[key] = world_paths.distance_field(self, origin, doorsOpen)
+        return self.distanceFields[key]
+
+    @property
+    def path_cache_stats(self):
+        """Return a dict with the hits, misses, and size of the path cache."""
+        return {'hits': self.pathCacheHits,
+                'misses': self.pathCacheMisses,
+                'size': len(self.pathCache)}
+
+    def clear_path_cache(self):
+        """Forget every cached path. The hit and miss counters are kept."""
+        self.pathCache = {}
+        self.pathCacheTiles = {}
+
+    def uncache_path(self, key):
+        """Remove a single ``(origin, dest, doorsOpen)`` entry from the path cache."""
+        path = self.pathCache.pop(key)
+        if not path:
+            return
+        for tile in world_paths.path_tiles(key[0], path):
+            keys = self.pathCacheTiles[tile]
+            keys.discard(key)
+            if not keys:
+                del self.pathCacheTiles[tile]
+
+    def invalidate_paths(self, loc, doorsOpen, blocked):
+        """
+        Drop the cached paths which a change in passability at `loc` affects.
+
+        If `loc` became blocked, only the paths which step on it are dropped.
+        If it became passable, a cached path can only be beaten by a new path
+        through `loc` if going via `loc` is shorter as the crow flies, so only
+        those paths (and cached failures to find a path) are dropped.
+        """
+        if blocked:
+            for key in list(self.pathCacheTiles.get(loc, [])):
+                if key[2] == doorsOpen:
+                    self.uncache_path(key)
+            return
+
+        for key in self.pathCache.keys():
+            origin, dest, keyDoorsOpen = key
+            if keyDoorsOpen != doorsOpen:
+                continue
+            path = self.pathCache[key]
+            viaLoc = world_paths.manhattan(origin, loc) + world_paths.manhattan(loc, dest)
+            if path is None or viaLoc < len(path) - 1:
+                self.uncache_path(key)
+
+    def tile_changed(self, loc):
+        """
+        Update the map's bookkeeping, including the path cache, after `loc` changed.
+
+        See :py:meth:`World.tile_changed`.
+        """
+        changes = super(WorldMap, self).tile_changed(loc)
+        for doorsOpen, blocked in changes:
+            self.invalidate_paths(loc, doorsOpen, blocked)
+            self.notify_planners(loc, doorsOpen)
+        return changes
+
+    def notify_planners(self, loc, doorsOpen):
+        """Tell the incremental planners using ``doorsOpen`` that `loc` changed."""
+        for key in self.planners:
+            if key[1] == doorsOpen:
+                self.planners[key].tile_changed(loc)
+
+    def adopt_path_cache(self, other):
+        """
+        Take over the path cache and planners of another map of the same agent.
+
+        Agents receive a fresh ``WorldMap`` every cycle, so without this the
+        cache would start empty each time. The cached paths are copied over,
+        the incremental planners (and the ``incremental`` setting) and the
+        connected components used by ``reachable`` are handed over, and then
+        every tile whose passability differs between the two
+        maps is treated as having just changed.
+
+        Arguments:
+            ``other``, *WorldMap*:
+                The map whose cache should be reused, usually the one from the
+                previous cycle.
+        """
+        self.pathCache = dict(other.pathCache)
+        self.pathCacheTiles = dict((tile, set(keys)) for tile, keys
+                                   in other.pathCacheTiles.items())
+        self.pathCacheHits = other.pathCacheHits
+        self.pathCacheMisses = other.pathCacheMisses
+        self.incremental = other.incremental
+        self.planners = other.planners
+        for doorsOpen in (False, True):
+            ours = self.blockedTiles[doorsOpen]
+            theirs = other.blockedTiles[doorsOpen]
+            components = other.components[doorsOpen]
+            newlyBlocked = ours - theirs
+            for loc in newlyBlocked:
+                self.invalidate_paths(loc, doorsOpen, True)
+                self.notify_planners(loc, doorsOpen)
+            if newlyBlocked:
+                # Several tiles changing at once can't be checked one by one
+                components.stale = True
+            for loc in theirs - ours:
+                self.invalidate_paths(loc, doorsOpen, False)
+                self.notify_planners(loc, doorsOpen)
+                components.tile_changed(loc, False, ours)
+            self.components[doorsOpen] = components
 
     def valid_goal(self, goal):
         """Indicate whether a goal is valid."""
@@ -1801,7 +2583,7 @@ class WorldMap(World):
             goalLoc = goal.args[0]
             if not self.check_passable(goalLoc):
                 return (False, 'unpassable')
-            if not self.navigate_to(user.at, goalLoc):
+            if not self.reachable(user.at, goalLoc):
                 return (False, 'no-access')
 
         if goalPred == 'open':
@@ -1818,11 +2600,8 @@ class WorldMap(World):
             bombLoc = self.get_closest_adjacent(target.location, self.agent.at)
             if bombLoc is None:
                 return (False, 'no-access')
-            objsAroundTarget = self.get_objects_around(bombLoc, self.bombRange)
-            for loc in objsAroundTarget:
-                for obj in objsAroundTarget[loc]:
-                    if obj.objType == NPC and obj.civi:
-                        return (False, 'civi-killed')
+            if self.civilians_in_blast(bombLoc):
+                return (False, 'civi-killed')
 
         return (True, 'none')
 
@@ -1833,7 +2612,12 @@ class Agent(object):
 
     Used for PyHop planning in conjunction with fog-of-war and limited knowledge
     scenarios.
+
+    Like ``WorldObject``, an ``Agent`` keeps its attributes in ``__slots__``,
+    since agents are copied every time an action is forecast.
     """
+    __slots__ = ('__name__', 'id', 'at', 'vision', 'map', 'keys', 'coins',
+                 'health', 'userType', 'armed', 'bombRange', 'number')
     agentCount = 0
     operatorCount = 0
 
@@ -1857,6 +2641,35 @@ class Agent(object):
             self.number = Agent.operatorCount
             Agent.operatorCount += 1
 
+    def __getstate__(self):
+        """Return the agent's attributes as a dict, for pickling and copying."""
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        """Restore the attributes returned by ``__getstate__``."""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def clone(self, memo):
+        """
+        Return a copy of the agent, its keys and its map.
+
+        ``memo`` works as it does for :py:meth:`WorldObject.clone`, and is
+        shared with the users on the agent's map, so a user seen on the map is
+        replaced by that user's clone.
+        """
+        key = id(self)
+        if key in memo:
+            return memo[key]
+        new = Agent.__new__(Agent)
+        memo[key] = new
+        for name in self.__slots__:
+            if name not in ('keys', 'map'):
+                setattr(new, name, getattr(self, name))
+        new.keys = [k.clone(memo) for k in self.keys]
+        new.map = self.map.clone(new, memo)
+        return new
+
     @property
     def damage(self):
         """Indicate the level of damage the bot has taken."""
@@ -1878,39 +2691,54 @@ class Agent(object):
 
     @property
     def enemies(self):
-        return self.filter_objects(civi=False, alive=True)
+        return self.map.get_npcs(civi=False, alive=True)
 
     def filter_objects(self, **kwargs):
         """Return a list of known objects whose attributes fit the filters."""
-        knownObjs = self.known_objects
-        filteredObjs = []
-        for obj in knownObjs:
-            for attrib in kwargs:
-                try:
-                    valid = eval("obj.{}".format(attrib)) == kwargs[attrib]
-                except AttributeError:
-                    valid = False
-                if not valid:
-                    break
-            if valid:
-                filteredObjs.append(obj)
-        return filteredObjs
-
-    def view(self, world):
-        viewedObjs = world.get_objects_around(self.at, self.vision)
+        return self.map.filter_objects(**kwargs)
+
+    def iter_objects(self, **kwargs):
+        """Yield the known objects whose attributes fit the filters."""
+        return self.map.iter_objects(**kwargs)
+
+    def view(self, world, viewedObjs=None, visible=None):
+        """
+        Update the agent's map with what it can see of ``world``.
+
+        ``viewedObjs`` and ``visible``, if given, are what the agent sees, as
+        worked out by a :py:class:`~world_vision.VisionPass`; otherwise they
+        are worked out here (see :py:meth:`objects_seen`). ``visible`` is the
+        set of tiles seen if ``world`` is in line-of-sight mode, and None if
+        the agent sees the whole square around it. The map takes on the
+        ``world``'s mode, which :py:meth:`can_see` follows.
+        """
+        if viewedObjs is None:
+            viewedObjs = self.objects_seen(world)
+            if world.lineOfSight and self.vision != -1:
+                visible = world.visible_tiles(self.at, self.vision)
         usrs = world.all_users
 
+        self.map.lineOfSight = world.lineOfSight
+        self.map.update_map(viewedObjs, usrs, self.at, self.vision, operator=True,
+                            visible=visible)
+
+    def objects_seen(self, world):
+        """Return the objects the agent can see in ``world``, by tile (see ``World.view_objects``)."""
+        viewedObjs = world.view_objects(self.at, self.vision)
+
         if self.userType == OPERATOR:
-            enemies = [e for e in world.objects if e.objType == NPC and not e.civi]
+            enemies = world.get_npcs(civi=False)
             for e in enemies:
                 viewedObjs[e.location] = [e]
+            world.share_tiles(e.location for e in enemies)
 
-        self.map.update_map(viewedObjs, usrs, self.at, self.vision, operator=True)
+        return viewedObjs
 
     def update_knowledge(self, objOrAgent):
         """Add the given object or agent to the Agent's knowledge-base."""
         if isinstance(objOrAgent, Agent):
             self.map.users[objOrAgent.__name__] = objOrAgent
+            self.map.user_moved(objOrAgent)
 
         elif isinstance(objOrAgent, WorldObject):
             self.map.add_object(objOrAgent)
@@ -1957,6 +2785,7 @@ class Agent(object):
         if self.can_move(moveDir):
             self.at = dest
             self.map.agentLoc = dest
+            self.map.user_moved(self)
             self.armed = UNARMED
             return True
         else:
@@ -1973,11 +2802,12 @@ class Agent(object):
         """
         if not self.map.loc_valid(keyLoc):
             raise ValueError("{} is not a valid location".format(keyLoc))
-        if keyLoc not in self.map.floor.keys():
+        if keyLoc not in self.map.floor:
             return False
         if not (self.map.adjacent(self.at, keyLoc) or self.at == keyLoc):
             return False
 
+        self.map.own_tile(keyLoc)
         key = self.map.get_item_at(keyLoc, KEY)
         if key:
             self.map.remove_object_at(KEY, keyLoc)
@@ -1997,7 +2827,7 @@ class Agent(object):
         """
         if not self.map.loc_valid(coinLoc):
             raise ValueError("{} is not a valid location".format(coinLoc))
-        if coinLoc not in self.map.floor.keys():
+        if coinLoc not in self.map.floor:
             return False
         if not (self.map.adjacent(self.at, coinLoc) or self.at == coinLoc):
             return False
@@ -2019,16 +2849,18 @@ class Agent(object):
         """
         if not self.map.loc_valid(target):
             raise ValueError("{} is not a valid location".format(target))
-        if target not in self.map.floor.keys():
+        if target not in self.map.floor:
             return False
         if not self.map.adjacent(self.at, target):
             return False
 
+        self.map.own_tile(target)
         for obj in self.map.floor[target]:
             if obj.locked and self.can_unlock(obj):
                 obj.locked = False
                 if obj.objType == DOOR:
                     obj.passable = True
+                self.map.tile_changed(target)
                 return True
         return False
 
@@ -2119,18 +2951,29 @@ class Agent(object):
 
     def get_objects_at(self, loc):
         """Quickly retrieve location information from the Map."""
-        return self.map.floor[loc] if loc in self.map.floor.keys() else None
+        return self.map.floor[loc] if loc in self.map.floor else None
 
-    def can_reach(self, loc):
-        """Indicate whether the agent can reach the location."""
-        attemptedPath = self.navigate_to(loc)
-        if attemptedPath is None or attemptedPath == []:
-            return False
-        return True
+    def can_reach(self, loc, adjacent=False):
+        """
+        Indicate whether the agent can reach the location.
+
+        If ``adjacent`` is True, reaching a tile next to `loc` is enough. See
+        :py:meth:`World.reachable`.
+        """
+        return self.map.reachable(self.at, loc, adjacent=adjacent)
 
     def can_see(self, loc):
-        """Indicate whether the agent can see that location."""
-        return abs(loc[0]-self.at[0]) <= self.vision and abs(loc[1]-self.at[1]) <= self.vision
+        """
+        Indicate whether the agent can see that location.
+
+        In line-of-sight mode, the walls and closed doors on the agent's map
+        can hide a location in range (see :py:meth:`World.visible_tiles`).
+        """
+        if not (abs(loc[0]-self.at[0]) <= self.vision and abs(loc[1]-self.at[1]) <= self.vision):
+            return False
+        if not self.map.lineOfSight:
+            return True
+        return loc in self.map.visible_tiles(self.at, self.vision)
 
     def take_damage(self, damage):
         """Reduce the agent's health by the given amount."""
@@ -2152,20 +2995,13 @@ class Agent(object):
         return self.map.bombed_at(self.at)
 
     def get_civs_in_blast(self, loc=None):
-        """Return a list of civilians in the potential bomb blast."""
+        """Return a list of living civilians in the potential bomb blast."""
         civs = []
-        if loc:
-            objs = self.map.get_objects_around(loc, self.bombRange)
-        else:
-            objs = self.map.get_objects_around(self.at, self.bombRange)
-        print(objs)
-        for objLoc in objs:
-            objList = objs[objLoc]
-            for obj in objList:
-                if obj.objType == NPC and obj.civi:
-                    civs.append(obj)
-
-        return civs
+        if not loc:
+            loc = self.at
+        if not self.map.civilians_in_blast(loc):
+            return civs
+        return deepcopy(self.map.npcs_in_blast(loc, civi=True))
 
     def arm(self):
         """Arm the agent's bomb to be detonated."""
@@ -2250,6 +3086,7 @@ def generate_random_drone_demo(dim, civilians, enemies, operators, agents,
             actors.
     """
     dng = World(dim, bombRange, log)
+    dng.journal.recording = False
     for _ in range(civilians):
         while not dng.place_object(NPC, dng.random_loc(), civi=True):
             pass
@@ -2270,9 +3107,54 @@ def generate_random_drone_demo(dim, civilians, enemies, operators, agents,
         while not dng.add_user(agnName, dng.random_loc(), vision, AGENT):
             pass
 
+    dng.journal.recording = True
     return dng
 
 
+def make_object(objType, location, **kwargs):
+    """
+    Make a new ``WorldObject`` of the given type, without placing it anywhere.
+
+    Arguments:
+        ``objType``, *str*:
+            The type of object, one of ``OBJECT_LIST`` other than the users.
+
+        ``location``, *tuple*:
+            Where the object is.
+
+        ``kwargs``:
+            The attributes of the object, as taken by the object's class: e.g.
+            ``value`` for a coin, ``damage`` (and ``hidden``) for a fire or
+            trap, ``civi`` (and ``living``) for an NPC, ``locked`` for a door
+            or chest, ``contains`` for a chest and ``unlocks`` for a key.
+            Every type accepts ``serial``.
+
+        ``return``, *WorldObject*:
+            The new object.
+    """
+    serial = kwargs.get('serial')
+    if objType == WALL:
+        return Wall(location, serial=serial)
+    elif objType == CHEST:
+        return Chest(location, kwargs.get('contains'), kwargs.get('locked', True),
+                     serial=serial)
+    elif objType == DOOR:
+        return Door(location, kwargs.get('locked', True), serial=serial)
+    elif objType == KEY:
+        return Key(location, kwargs.get('unlocks'), serial=serial)
+    elif objType == COIN:
+        return Coin(location, kwargs['value'], serial=serial)
+    elif objType == FIRE:
+        return Fire(location, kwargs['damage'], serial=serial)
+    elif objType == TRAP:
+        return Trap(location, kwargs['damage'], kwargs.get('hidden', True),
+                    serial=serial)
+    elif objType == NPC:
+        return Npc(location, kwargs['civi'], kwargs.get('living', True),
+                   serial=serial)
+    raise NotImplementedError(objType)
+
+
 def build_World_from_str(worldStr):
     """
     Take in a string and create a new ``World`` from it.
@@ -2281,11 +3163,11 @@ def build_World_from_str(worldStr):
     ``World`` object. As described in the documentation for the ``World`` object,
     each line of the string will be the representation of an individual object,
     NPC, or actor in the world, with the exception of the first line, which will
-    indicate the dimensions of the world. This function reads that string line by
-    line, adding the object represented on each line to the world. This results
-    in a new ``World`` with identical objects and actors. Since the MIDCA cycles
-    of the actors are decoupled from the ``World``, this method does *not* restore
-    a simulation, just a ``World``.
+    indicate the dimensions of the world. The lines are read by
+    :py:func:`build_World_from_stream`. This results in a new ``World`` with
+    identical objects and actors. Since the MIDCA cycles of the actors are
+    decoupled from the ``World``, this method does *not* restore a simulation,
+    just a ``World``.
 
     Arguments:
         ``worldStr``, *str*:
@@ -2296,13 +3178,47 @@ def build_World_from_str(worldStr):
             A ``World`` object such that calling ``repr`` on it would return a
             string equivalent to ``worldStr``.
     """
-    lines = worldStr.split('\n')
-    dim = int(lines[0][4:])
+    return build_World_from_stream(worldStr.splitlines())
+
+
+def build_World_from_stream(lines):
+    """
+    Create a new ``World`` from the lines of its ``repr``, read one at a time.
+
+    ``lines`` may be any iterable of lines, such as an open ``.dng`` file, so a
+    file is never read into memory as a whole. Loading takes two passes, so
+    it takes time linear in the number of lines:
+
+    1. Each line is turned into an object (or a user), and the objects are
+       indexed by serial and by the line they came from.
+    2. References between objects (what a chest contains, what a key unlocks)
+       are looked up in those indexes, and then everything is placed on the
+       new ``World`` in the order it was read.
+
+    A reference is looked up by its serial if it has one, or else (in files
+    written before objects had serials) by its whole ``repr``. A reference to
+    ``None`` means the chest is empty or the key unlocks nothing.
+
+    Arguments:
+        ``lines``, *iterable*:
+            The lines of a ``World``'s ``repr``, with or without line endings.
+
+        ``return``, *World*:
+            The ``World`` which the lines describe.
+
+    Raises ``ValueError`` if an object refers to an object which isn't there.
+    """
+    lines = iter(lines)
+    dim = int(next(lines).strip()[4:])
     dng = World(dim=dim)
-    lines = lines[1:]
-    objsMade = []
-    while len(lines) > 0:
-        line = lines.pop(0)
+    dng.journal.recording = False
+    things = []
+    references = []
+    bySerial = {}
+    byRepr = {}
+
+    for line in lines:
+        line = line.rstrip('\r\n')
         if len(line) == 0:
             continue
         objCode = line[0]
@@ -2313,64 +3229,56 @@ def build_World_from_str(worldStr):
         location = get_point_from_str(line[locIndex:miscIndex-1])
         miscData = line[miscIndex:]
 
-        if objType == WALL:
-            objsMade.append(dng.place_object(WALL, location))
-
-        elif objType == DOOR:
-            locked = False if miscData.lower() == 'false' else True
-            objsMade.append(dng.place_object(DOOR, location, locked=locked))
+        if objType in [AGENT, OPERATOR]:
+            miscData = miscData.split(":")
+            things.append((objType, location, int(miscData[0]), miscData[1]))
+            continue
 
+        serial = get_serial_from_str(line)
+        if objType == DOOR:
+            obj = Door(location, locked=objCode == 'D', serial=serial)
         elif objType == CHEST:
-            if miscData == '':
-                objsMade.append(dng.place_object(CHEST, location))
-            else:
-                contains = None
-                for obj in objsMade:
-                    if repr(obj) == miscData:
-                        contains = obj
-                        break
-                if contains:
-                    objsMade.append(dng.place_object(CHEST, location,
-                                                     contains=contains))
-                else:
-                    lines.append(line)
-
+            obj = Chest(location, locked=objCode == 'C', serial=serial)
+            references.append((obj, 'contains', miscData, line))
         elif objType == KEY:
-            unlocks = None
-            for obj in objsMade:
-                if repr(obj) == miscData:
-                    unlocks = obj
-                    break
-            if unlocks:
-                objsMade.append(dng.place_object(KEY, location, unlocks=unlocks))
-            else:
-                # print("Couldn't find object reference {}".format(miscData))
-                lines.append(line)
-
+            obj = Key(location, serial=serial)
+            references.append((obj, 'unlocks', miscData, line))
         elif objType == COIN:
-            value = int(miscData)
-            objsMade.append(dng.place_object(COIN, location, value=value))
-
+            obj = Coin(location, int(miscData), serial=serial)
         elif objType == FIRE:
-            dmg = int(miscData)
-            objsMade.append(dng.place_object(FIRE, location, damage=dmg))
-
+            obj = Fire(location, int(miscData), serial=serial)
         elif objType == TRAP:
-            dmg = int(miscData)
-            objsMade.append(dng.place_object(TRAP, location, damage=dmg))
-
+            obj = Trap(location, int(miscData), hidden=line[1] != 's', serial=serial)
         elif objType == NPC:
-            living = miscData == "L"
-            civi = line[1] == "C"
-            objsMade.append(dng.place_object(NPC, location, civi=civi, living=living))
-
-        elif objType in [AGENT, OPERATOR]:
-            miscData = miscData.split(":")
-            vision = int(miscData[0])
-            name = miscData[1]
-            objsMade.append(dng.add_user(name, location, vision, objType))
+            obj = Npc(location, civi=line[1] == "C", living=miscData == "L",
+                      serial=serial)
+        elif objType == WALL:
+            obj = Wall(location, serial=serial)
         else:
             raise NotImplementedError(objType)
+        things.append(obj)
+        bySerial[obj.serial] = obj
+        byRepr[line] = obj
+
+    for obj, attrib, refStr, line in references:
+        target = None
+        if refStr not in ('', 'None'):
+            refSerial = get_serial_from_str(refStr)
+            if refSerial is None:
+                target = byRepr.get(refStr)
+            else:
+                target = bySerial.get(refSerial)
+            if target is None:
+                raise ValueError("{} refers to {}, which isn't in the world".format(line, refStr))
+        setattr(obj, attrib, target)
+
+    for thing in things:
+        if isinstance(thing, WorldObject):
+            dng.put_object(thing)
+        else:
+            userType, location, vision, name = thing
+            dng.add_user(name, location, vision, userType)
+    dng.journal.recording = True
     return dng
 
 
@@ -2378,9 +3286,10 @@ def build_World_from_file(filename, MIDCA=False):
     """
     Take in a text file and create a new World from it.
 
-    Passes the text of the file into build_World_from_str. The file should use
-    our own representation of a ``World`` (generated by calling ``repr``), not
-    a MIDCA state, unless specified.
+    Passes the file, line by line, into :py:func:`build_World_from_stream`. The
+    file should use our own representation of a ``World`` (generated by calling
+    ``repr``), not a MIDCA state, unless specified. A ``.dngb`` file is loaded
+    as a binary snapshot instead (see :py:mod:`world_snapshot`).
 
     *Note*: MIDCA state strings have not been updated in a while, and cannot
     account for everything now included in a ``World``.
@@ -2397,10 +3306,12 @@ def build_World_from_file(filename, MIDCA=False):
         ``return``, *World*:
             The ``World`` object whose representation is stored in the file.
     """
+    if filename.endswith('.dngb'):
+        # world_snapshot imports this module, so it can't be imported above
+        import world_snapshot
+        return world_snapshot.load_snapshot(filename)
     with open(filename, 'r') as dngFile:
-        dngStr = dngFile.read()
-
-    return build_World_from_str(dngStr)
+        return build_World_from_stream(dngFile)
 
 
 def interactive_World_maker():
@@ -2486,18 +3397,18 @@ def interactive_World_maker():
             target.location = val
             return True
         elif attrib in ['contains', 'unlocks']:
-            if val in objsMade.keys():
+            if val in objsMade:
                 val = objsMade[val]
             else:
                 print("Object code {} not made yet".format(val))
                 return False
-            target.__dict__[attrib] = val
+            setattr(target, attrib, val)
             return True
         else:
-            attribType = type(target.__dict__[attrib])
+            attribType = type(getattr(target, attrib))
             if attribType is bool:
                 val = False if val in ['None', 'f', 'F', 'false', 'False', '0'] else True
-            target.__dict__[attrib] = attribType(val)
+            setattr(target, attrib, attribType(val))
             return True
 
     def parse_command(cmd, dng, objsMade):
@@ -2507,11 +3418,18 @@ def interactive_World_maker():
 
         if cmdAction == 'set':
             data = cmdData[1].lower()
-            if data in objsMade.keys():
+            if data in objsMade:
                 objTarget = objsMade[data]
                 attrib = cmdData[2].lower()
                 value = cmdData[3]
-                return set_obj_attrib(objTarget, attrib, value, objsMade)
+                oldLoc = getattr(objTarget, 'location', None)
+                if oldLoc in dng.floor:
+                    dng.own_tile(oldLoc)
+                succeeded = set_obj_attrib(objTarget, attrib, value, objsMade)
+                for loc in set([oldLoc, getattr(objTarget, 'location', None)]):
+                    if loc in dng.floor:
+                        dng.tile_changed(loc)
+                return succeeded
             else:
                 print("Unknown data {} for set command".format(data))
                 return False
@@ -2558,7 +3476,7 @@ def interactive_World_maker():
                     objsMade[repr(newObj)] = newObj
                     return True
                 miscData = " ".join(miscData)
-                if miscData in objsMade.keys():
+                if miscData in objsMade:
                     contains = objsMade[miscData]
                     if contains.objType not in [KEY, COIN]:
                         print("A chest can't hold a {}".format(contains.objType))
@@ -2575,7 +3493,7 @@ def interactive_World_maker():
                     objsMade[repr(newObj)] = newObj
                     return True
                 miscData = " ".join(miscData)
-                if miscData in objsMade.keys():
+                if miscData in objsMade:
                     unlocks = objsMade[miscData]
                     if unlocks.objType not in [CHEST, DOOR]:
                         print("Object type {} can't be unlocked".format(unlocks.objType))
@@ -2648,7 +3566,7 @@ def interactive_World_maker():
 
         elif cmdAction == 'rem':
             targetID = " ".join(cmdData[1:])
-            if targetID not in objsMade.keys():
+            if targetID not in objsMade:
                 print("Can't remove object {}, doesn't exist".format(targetID))
                 return False
             dng.remove_object(targetID)
@@ -2700,6 +3618,72 @@ def interactive_World_maker():
             raw_input("Hit enter to continue...")
 
 
+def clone_floor(floor, memo):
+    """
+    Return a copy of a floor dict, with every object on it cloned.
+
+    See :py:meth:`WorldObject.clone` for ``memo``.
+    """
+    return dict((loc, [obj.clone(memo) for obj in objs])
+                for loc, objs in floor.items())
+
+
+def same_contents(objs, others):
+    """
+    Indicate whether two lists of objects hold objects in the same states.
+
+    The lists are compared pairwise with :py:meth:`WorldObject.same_state`, so
+    a tile on which an NPC has died differs from a copy taken before it died.
+    """
+    if len(objs) != len(others):
+        return False
+    for obj, other in zip(objs, others):
+        if not obj.same_state(other):
+            return False
+    return True
+
+
+def get_serial_from_str(string):
+    """
+    Return the serial in an object's ``repr``, or None if it has none.
+
+    Object representations written before objects had serials (e.g. older
+    ``.dng`` files) have no ``#serial`` before the ``@``, in which case the
+    object will be given a new serial when it is loaded.
+
+    Arguments:
+
+    ``string``, *str*:
+        The ``repr`` of a ``WorldObject``, e.g. ``'&E#12@(3, 4):L'``.
+
+    ``return``, *int*:
+        The serial, or None.
+    """
+    header = string[:string.index('@')]
+    if '#' not in header:
+        return None
+    return int(header[header.index('#') + 1:])
+
+
+def migrate_dng_file(filename):
+    """
+    Rewrite a ``.dng`` file so that every object in it has a serial.
+
+    Files written before objects had serials can still be loaded, but their
+    objects get new serials every time they are. This loads such a file and
+    saves it again, so the serials it is given are kept from then on. Files
+    which already have serials are rewritten unchanged.
+
+    Arguments:
+
+    ``filename``, *str*:
+        The name of the ``.dng`` file to rewrite.
+    """
+    world = build_World_from_file(filename)
+    with open(filename, 'w') as dngFile:
+        dngFile.write(repr(world))
+
+
 def get_point_from_str(string):
     """
     Convert a string of form '(x, y)' into a pair of ints.
@@ -0,0 +1,306 @@
+"""
+Contains the vision pass used by the world server to answer requests for state.
+
+Every ``WORLD_STATE_REQ`` used to have the requesting user look around the
+``World`` from scratch (see ``Agent.view``), even though, between two actions,
+the world doesn't change and many users ask more than once. With many agents
+polling, the same windows of tiles were filtered over and over.
+
+A :py:class:`VisionPass` instead works out what every user sees in one sweep,
+the first time anyone asks after the ``World`` changes. Each tile is filtered
+(hidden traps are removed) once, however many users' windows it is in, and the
+enemies every operator sees are looked up once. Until the ``World`` changes
+again, requests are served from the result, and a user whose map is already up
+to date isn't updated again.
+
+Whether the ``World`` has changed is judged by its version (see
+:py:mod:`world_journal`) and its fingerprint (see :py:mod:`world_hashing`),
+which between them cover every change to a tile and every move of a user.
+
+A ``World`` can also be put in line-of-sight mode (see
+``World.lineOfSight``), in which walls and closed doors block vision, rather
+than users seeing the whole square around them. What can be seen from a tile
+is worked out by recursive shadowcasting (see :py:func:`shadowcast`), and
+cached by each ``World`` in a :py:class:`FieldOfView` until a tile starts or
+stops blocking sight.
+"""
+
+from collections import namedtuple
+from world_types import TRAP, OPERATOR
+
+#: How many fields of view a :py:class:`FieldOfView` keeps by default
+MAX_FIELDS = 4096
+
+#: The transformations from the first octant to each of the eight, as
+#: ``(xx, xy, yx, yy)`` (see :py:func:`shadowcast`)
+OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+           (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+#: What a user sees: the objects on the tiles it sees, by tile, and the set of
+#: those tiles, or None if it sees the whole square around it
+View = namedtuple('View', ['objects', 'tiles'])
+
+
+def window_tiles(loc, vRange, dim):
+    """
+    Yield the tiles within ``vRange`` of ``loc``, as ``World.get_objects_around`` visits them.
+
+    The window is clipped to the map, except that (like ``get_objects_around``)
+    it may run one tile past its far edges, where there is never anything.
+    """
+    westBound = max(loc[0] - vRange, 0)
+    eastBound = min(loc[0] + vRange, dim)
+    northBound = max(loc[1] - vRange, 0)
+    southBound = min(loc[1] + vRange, dim)
+    for x in range(westBound, eastBound + 1):
+        for y in range(northBound, southBound + 1):
+            yield (x, y)
+
+
+def visible_objects(contents):
+    """Return a list of the objects in ``contents`` which can be seen, i.e. not hidden traps."""
+    return [obj for obj in contents if not (obj.objType == TRAP and obj.hidden)]
+
+
+def shadowcast(origin, radius, opaque):
+    """
+    Return the set of tiles which can be seen from ``origin``.
+
+    Uses recursive shadowcasting: each of the eight octants around
+    ``origin`` is scanned row by row, moving outwards, keeping track of the
+    range of slopes which isn't yet in the shadow of an opaque tile. An opaque
+    tile can itself be seen, but hides what is behind it. Vision reaches
+    ``radius`` tiles in x and y, like the square ``World.get_objects_around``
+    looks in, so a tile seen is always in that square.
+
+    Arguments:
+        ``origin``, *tuple*:
+            The tile looked from.
+
+        ``radius``, *int*:
+            How far can be seen.
+
+        ``opaque``, *numpy.ndarray*:
+            A square boolean array, indexed ``[x, y]``, of the tiles which
+            block sight.
+
+        ``return``, *set*:
+            The tiles seen, including ``origin``.
+    """
+    dim = opaque.shape[0]
+    seen = set([origin])
+    ox, oy = origin
+
+    def cast(row, start, end, xx, xy, yx, yy):
+        if start < end:
+            return
+        newStart = start
+        for depth in range(row, radius + 1):
+            blocked = False
+            for dx in range(-depth, 1):
+                dy = -depth
+                # The slopes of the edges of the tile, seen from the origin
+                leftSlope = (dx - 0.5) / (dy + 0.5)
+                rightSlope = (dx + 0.5) / (dy - 0.5)
+                if start < rightSlope:
+                    continue
+                if end > leftSlope:
+                    break
+                x = ox + dx * xx + dy * xy
+                y = oy + dx * yx + dy * yy
+                onMap = 0 <= x < dim and 0 <= y < dim
+                if onMap:
+                    seen.add((x, y))
+                wall = not onMap or opaque[x, y]
+                if blocked:
+                    if wall:
+                        newStart = rightSlope
+                    else:
+                        blocked = False
+                        start = newStart
+                elif wall and depth < radius:
+                    blocked = True
+                    cast(depth + 1, start, leftSlope, xx, xy, yx, yy)
+                    newStart = rightSlope
+            if blocked:
+                break
+
+    for xx, xy, yx, yy in OCTANTS:
+        cast(1, 1.0, 0.0, xx, xy, yx, yy)
+    return seen
+
+
+class FieldOfView(object):
+    """
+    The cached fields of view of a ``World`` in line-of-sight mode.
+
+    ``fields`` maps ``(origin, radius)`` to the set of tiles seen (see
+    :py:func:`shadowcast`), as of ``version``, the ``sightVersion`` of the
+    ``World``'s occupancy grid (see :py:class:`~world_grids.OccupancyGrid`).
+    Since a field of view only depends on which tiles block sight, the cache
+    holds until a wall or closed door is added, removed, or opened, at which
+    point it is emptied. At most ``maxFields`` fields are kept.
+
+    Instantiation::
+
+        fov = FieldOfView([maxFields])
+    """
+
+    def __init__(self, maxFields=MAX_FIELDS):
+        """Create an empty cache."""
+        self.maxFields = maxFields
+        self.fields = {}
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        return {'maxFields': self.maxFields, 'fields': {}, 'version': None,
+                'hits': 0, 'misses': 0}
+
+    def visible(self, origin, radius, opaque, version):
+        """
+        Return the set of tiles which can be seen from ``origin``.
+
+        Arguments:
+            ``origin``, *tuple*:
+                The tile looked from.
+
+            ``radius``, *int*:
+                How far can be seen.
+
+            ``opaque``, *numpy.ndarray*:
+                The tiles which block sight (see :py:func:`shadowcast`).
+
+            ``version``, *int*:
+                The version of ``opaque``, which changes whenever it does.
+
+            ``return``, *frozenset*:
+                The tiles seen, including ``origin``.
+        """
+        if version != self.version:
+            self.fields = {}
+            self.version = version
+        key = (origin, radius)
+        field = self.fields.get(key)
+        if field is not None:
+            self.hits += 1
+            return field
+        self.misses += 1
+        field = frozenset(shadowcast(origin, radius, opaque))
+        if len(self.fields) >= self.maxFields:
+            self.fields = {}
+        self.fields[key] = field
+        return field
+
+
+class VisionPass(object):
+    """
+    What every user of a ``World`` sees, worked out once per state of the world.
+
+    ``views`` maps each user's ID to the :py:data:`View` it has, in the form
+    ``Agent.view`` expects (a dict of tiles to lists of objects, and the
+    tiles seen in line-of-sight mode), as of the state of the ``World``
+    identified by ``key``. As well as the ``World``'s version and fingerprint,
+    the key includes whether it is in line-of-sight mode, since switching the
+    mode changes what users see without changing any tile. The objects are the
+    ``World``'s own, shared copy-on-write (see ``World.view_objects``), and the
+    lists are shared between the views of users whose windows overlap.
+    ``applied`` maps the ID of each user whose map has been updated from
+    ``views`` to the ``key`` it was updated at. ``sweeps`` counts the sweeps
+    made and ``served`` the requests answered without one.
+
+    Instantiation::
+
+        vision = VisionPass(world)
+    """
+
+    def __init__(self, world):
+        """Create a vision pass for ``world``, which sweeps when first asked."""
+        self.world = world
+        self.key = None
+        self.views = {}
+        self.applied = {}
+        self.sweeps = 0
+        self.served = 0
+
+    def current_key(self):
+        """Return the key of the ``World``'s current state."""
+        world = self.world
+        return (world.version, world.fingerprint, world.lineOfSight)
+
+    def refresh(self):
+        """
+        Sweep the ``World`` if it has changed since the last sweep.
+
+        Arguments:
+            ``return``, *bool*:
+                Whether a sweep was made.
+        """
+        key = self.current_key()
+        if key == self.key:
+            return False
+        self.sweep()
+        self.key = key
+        return True
+
+    def sweep(self):
+        """Work out what every user sees, looking at each tile once."""
+        world = self.world
+        floor = world.floor
+        seen = {}
+        views = {}
+        enemies = None
+        for user in world.users.values():
+            tiles = None
+            if user.vision == -1:
+                # As in get_objects_around, a user who sees everything sees it all
+                objects = dict(floor)
+                world.share_tiles(objects)
+            else:
+                objects = {}
+                if world.lineOfSight:
+                    tiles = world.visible_tiles(user.at, user.vision)
+                    window = tiles
+                else:
+                    window = window_tiles(user.at, user.vision, world.dim)
+                for loc in window:
+                    contents = seen.get(loc)
+                    if contents is None:
+                        contents = floor.get(loc)
+                        if contents is None:
+                            continue
+                        contents = seen[loc] = visible_objects(contents)
+                    objects[loc] = contents
+            if user.userType == OPERATOR:
+                if enemies is None:
+                    enemies = world.get_npcs(civi=False)
+                    world.share_tiles(enemy.location for enemy in enemies)
+                for enemy in enemies:
+                    objects[enemy.location] = [enemy]
+            views[user.id] = View(objects, tiles)
+        world.share_tiles(seen)
+        self.views = views
+        self.applied = {}
+        self.sweeps += 1
+
+    def view(self, user):
+        """
+        Update the map of ``user`` with what it currently sees.
+
+        Arguments:
+            ``user``, *Agent*:
+                The user, which must be one of the ``World``'s.
+
+            ``return``, *bool*:
+                Whether the map was updated, rather than already up to date.
+        """
+        if not self.refresh():
+            self.served += 1
+            if self.applied.get(user.id) == self.key:
+                return False
+        objects, tiles = self.views[user.id]
+        # update_map takes tiles out of the dict it is given as it goes
+        user.view(self.world, dict(objects), tiles)
+        self.applied[user.id] = self.key
+        return True